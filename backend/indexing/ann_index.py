@@ -0,0 +1,128 @@
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+from backend.indexing.growable import GrowableArray
+from backend.indexing.kmeans import assign, kmeans
+from backend.indexing.vector_store import VectorStore
+
+
+class IVFIndex:
+    
+    def __init__(
+        self,
+        n_lists: Optional[int] = None,
+        nprobe: int = 16,
+        iterations: int = 10,
+        sample_size: int = 100_000,
+        seed: int = 0
+    ):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.sample_size = sample_size
+        self.seed = seed
+        self.centroids = None
+        self.lists: List[GrowableArray] = []
+    
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+    
+    def __len__(self) -> int:
+        return sum(len(inverted_list) for inverted_list in self.lists)
+    
+    def train(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > self.sample_size:
+            sample = vectors[rng.choice(len(vectors), self.sample_size, replace=False)]
+        else:
+            sample = vectors
+        
+        self.centroids = kmeans(sample, n_lists, iterations=self.iterations, spherical=True, seed=self.seed)
+        self.lists = [GrowableArray(np.int64, capacity=16) for _ in range(len(self.centroids))]
+    
+    def add(self, start: int, vectors: np.ndarray):
+        assignment = assign(np.asarray(vectors, dtype=np.float32), self.centroids)
+        ids = np.arange(start, start + len(assignment), dtype=np.int64)
+        
+        order = np.argsort(assignment, kind='stable')
+        boundaries = np.flatnonzero(np.diff(assignment[order])) + 1
+        for group in np.split(order, boundaries):
+            if len(group):
+                self.lists[assignment[group[0]]].extend(ids[group])
+    
+    def build(self, vectors: np.ndarray):
+        self.train(vectors)
+        self.add(0, vectors)
+    
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        nprobe = min(nprobe or self.nprobe, len(self.lists))
+        centroid_scores = self.centroids @ query
+        if nprobe < len(self.lists):
+            probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probed = np.arange(len(self.lists))
+        
+        return np.concatenate([self.lists[i].view for i in probed])
+    
+    def search(
+        self,
+        store: VectorStore,
+        query_embedding: Sequence[float],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        exclude: Optional[np.ndarray] = None,
+        allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        query = VectorStore.normalize(np.asarray(query_embedding, dtype=np.float32).ravel())
+        ids = self.candidates(query, nprobe)
+        if exclude is not None and len(exclude):
+            ids = ids[~np.isin(ids, exclude)]
+        if allowed is not None:
+            ids = ids[allowed[ids]]
+        if not len(ids):
+            return []
+        
+        return store.rank_candidates(query, store.score_rows(query, ids), ids, top_k)
+    
+    def save(self, path: str):
+        sizes = np.array([len(inverted_list) for inverted_list in self.lists], dtype=np.int64)
+        ids = np.concatenate([np.empty(0, dtype=np.int64)] + [inverted_list.view for inverted_list in self.lists])
+        
+        np.savez(
+            self._npz_path(path),
+            centroids=self.centroids,
+            list_sizes=sizes,
+            ids=ids,
+            nprobe=np.array(self.nprobe)
+        )
+    
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(cls._npz_path(path)) as data:
+            centroids = data["centroids"]
+            list_sizes = data["list_sizes"]
+            ids = data["ids"]
+            nprobe = int(data["nprobe"])
+        
+        index = cls(n_lists=len(centroids), nprobe=nprobe)
+        index.centroids = centroids
+        index.lists = []
+        
+        offsets = np.concatenate([[0], np.cumsum(list_sizes)])
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            inverted_list = GrowableArray(np.int64, capacity=max(16, int(end - start)))
+            inverted_list.extend(ids[start:end])
+            index.lists.append(inverted_list)
+        
+        return index
+    
+    @staticmethod
+    def _npz_path(path: str) -> Path:
+        path = Path(path)
+        return path if path.suffix == ".npz" else path.with_suffix(".npz")
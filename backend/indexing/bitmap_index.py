@@ -0,0 +1,240 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+import numpy as np
+
+
+ARRAY_CONTAINER_LIMIT = 4096
+CONTAINER_SIZE = 1 << 16
+
+FILTER_FIELDS = ("file_type", "doc_id", "file_name", "chunk_index")
+
+
+def _dense(container: np.ndarray) -> np.ndarray:
+    if container.dtype == np.uint16:
+        bits = np.zeros(CONTAINER_SIZE, dtype=bool)
+        bits[container] = True
+        return bits
+    return np.unpackbits(container).astype(bool)
+
+
+def _pack(bits: np.ndarray) -> Optional[np.ndarray]:
+    count = int(np.count_nonzero(bits))
+    if not count:
+        return None
+    if count <= ARRAY_CONTAINER_LIMIT:
+        return np.flatnonzero(bits).astype(np.uint16)
+    return np.packbits(bits)
+
+
+def _combine(left: np.ndarray, right: np.ndarray, operation: str) -> Optional[np.ndarray]:
+    if left.dtype == np.uint16 and right.dtype == np.uint16:
+        if operation == "and":
+            values = np.intersect1d(left, right, assume_unique=True)
+        elif operation == "or":
+            values = np.union1d(left, right)
+        else:
+            values = np.setdiff1d(left, right, assume_unique=True)
+        
+        if len(values) > ARRAY_CONTAINER_LIMIT:
+            return _pack(_dense(values))
+        return values if len(values) else None
+    
+    left_bits, right_bits = _dense(left), _dense(right)
+    if operation == "and":
+        return _pack(left_bits & right_bits)
+    if operation == "or":
+        return _pack(left_bits | right_bits)
+    return _pack(left_bits & ~right_bits)
+
+
+class Bitmap:
+    
+    __slots__ = ("containers",)
+    
+    def __init__(self, values: Optional[Iterable[int]] = None):
+        self.containers: Dict[int, np.ndarray] = {}
+        if values is not None:
+            self.update(values)
+    
+    def __len__(self) -> int:
+        return sum(
+            len(container) if container.dtype == np.uint16 else int(np.unpackbits(container).sum())
+            for container in self.containers.values()
+        )
+    
+    def __bool__(self) -> bool:
+        return bool(self.containers)
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(container.nbytes for container in self.containers.values())
+    
+    def update(self, values: Iterable[int]):
+        values = np.unique(np.asarray(values if isinstance(values, np.ndarray) else list(values), dtype=np.int64))
+        if not len(values):
+            return
+        
+        keys = values >> 16
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        for group in np.split(values, boundaries):
+            key = int(group[0] >> 16)
+            container = (group & 0xFFFF).astype(np.uint16)
+            if len(container) > ARRAY_CONTAINER_LIMIT:
+                container = _pack(_dense(container))
+            
+            existing = self.containers.get(key)
+            self.containers[key] = container if existing is None else _combine(existing, container, "or")
+    
+    def add(self, value: int):
+        self.update(np.array([value], dtype=np.int64))
+    
+    def copy(self) -> "Bitmap":
+        copied = Bitmap()
+        copied.containers = dict(self.containers)
+        return copied
+    
+    def _merge(self, other: "Bitmap", operation: str) -> "Bitmap":
+        result = Bitmap()
+        if operation == "and":
+            keys = self.containers.keys() & other.containers.keys()
+        elif operation == "or":
+            keys = self.containers.keys() | other.containers.keys()
+        else:
+            keys = self.containers.keys()
+        
+        for key in keys:
+            left = self.containers.get(key)
+            right = other.containers.get(key)
+            if left is None or right is None:
+                container = left if right is None else (right if operation == "or" else None)
+            else:
+                container = _combine(left, right, operation)
+            if container is not None:
+                result.containers[key] = container
+        
+        return result
+    
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        return self._merge(other, "and")
+    
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        return self._merge(other, "or")
+    
+    def __sub__(self, other: "Bitmap") -> "Bitmap":
+        return self._merge(other, "sub")
+    
+    def __contains__(self, value: int) -> bool:
+        container = self.containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if container.dtype == np.uint16:
+            position = np.searchsorted(container, low)
+            return position < len(container) and container[position] == low
+        return bool(container[low >> 3] & (0x80 >> (low & 7)))
+    
+    def to_array(self) -> np.ndarray:
+        parts = []
+        for key in sorted(self.containers):
+            container = self.containers[key]
+            low = container if container.dtype == np.uint16 else np.flatnonzero(np.unpackbits(container))
+            parts.append((key << 16) + low.astype(np.int64))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+def field_value(chunk: Dict, field: str) -> Any:
+    value = chunk.get(field)
+    if value is None:
+        value = chunk.get("metadata", {}).get(field)
+    return value
+
+
+def filter_fields(filters: Optional[Union[Dict, List[Dict]]]) -> List[str]:
+    if not filters:
+        return []
+    clauses = filters if isinstance(filters, list) else [filters]
+    return sorted({field for clause in clauses for field in clause})
+
+
+class MetadataIndex:
+    
+    def __init__(self, fields: Sequence[str] = FILTER_FIELDS):
+        self.fields = tuple(fields)
+        self.bitmaps: Dict[str, Dict[Any, Bitmap]] = {field: {} for field in self.fields}
+    
+    def add(self, start: int, chunks: List[Dict]):
+        for field in self.fields:
+            groups: Dict[Any, List[int]] = {}
+            for slot, chunk in enumerate(chunks, start=start):
+                value = field_value(chunk, field)
+                if value is not None:
+                    groups.setdefault(value, []).append(slot)
+            
+            for value, slots in groups.items():
+                bitmap = self.bitmaps[field].get(value)
+                if bitmap is None:
+                    bitmap = self.bitmaps[field][value] = Bitmap()
+                bitmap.update(np.array(slots, dtype=np.int64))
+    
+    def add_codes(self, start: int, field: str, codes: np.ndarray, values: List):
+        order = np.argsort(codes, kind='stable')
+        boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+        for group in np.split(order, boundaries):
+            if not len(group) or codes[group[0]] < 0:
+                continue
+            value = values[codes[group[0]]]
+            bitmap = self.bitmaps[field].get(value)
+            if bitmap is None:
+                bitmap = self.bitmaps[field][value] = Bitmap()
+            bitmap.update(group + start)
+    
+    def add_store(self, store):
+        for field in self.fields:
+            self.add_codes(0, field, *store.field_codes(field))
+    
+    def values(self, field: str) -> List:
+        return list(self.bitmaps.get(field, {}))
+    
+    def lookup(self, filters: Union[Dict, List[Dict]]) -> Bitmap:
+        if isinstance(filters, list):
+            result = Bitmap()
+            for clause in filters:
+                result = result | self.lookup(clause)
+            return result
+        
+        result = None
+        for field, values in filters.items():
+            if field not in self.bitmaps:
+                raise ValueError(f"Cannot filter on field: {field}")
+            if not isinstance(values, (list, tuple, set, frozenset)):
+                values = [values]
+            
+            matched = Bitmap()
+            for value in values:
+                bitmap = self.bitmaps[field].get(value)
+                if bitmap is not None:
+                    matched = matched | bitmap
+            
+            result = matched if result is None else result & matched
+        
+        return result if result is not None else Bitmap()
+    
+    def snapshot(self, fields: Optional[Iterable[str]] = None) -> "MetadataIndex":
+        frozen = MetadataIndex(self.fields)
+        for field in self.fields if fields is None else [field for field in fields if field in self.bitmaps]:
+            frozen.bitmaps[field] = {value: bitmap.copy() for value, bitmap in self.bitmaps[field].items()}
+        return frozen
+    
+    def take(self, slots: np.ndarray) -> "MetadataIndex":
+        slots = np.asarray(slots, dtype=np.int64)
+        subset = MetadataIndex(self.fields)
+        for field, bitmaps in self.bitmaps.items():
+            for value, bitmap in bitmaps.items():
+                ids = bitmap.to_array()
+                positions = np.searchsorted(slots, ids)
+                kept = positions[slots[np.minimum(positions, len(slots) - 1)] == ids] if len(slots) else positions[:0]
+                if len(kept):
+                    subset.bitmaps[field][value] = Bitmap(kept)
+        return subset
+    
+    def clear(self):
+        self.bitmaps = {field: {} for field in self.fields}
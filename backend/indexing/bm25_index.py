@@ -0,0 +1,391 @@
+from collections import Counter
+import math
+from pathlib import Path
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import copy
+import numpy as np
+
+from backend.indexing.growable import GrowableArray
+from backend.indexing.persistence import load_array, read_json, save_array, write_json
+from backend.indexing.vector_store import top_k_indices
+
+
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+_stop_words = None
+
+
+def stop_words() -> frozenset:
+    global _stop_words
+    if _stop_words is None:
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+        _stop_words = ENGLISH_STOP_WORDS
+    return _stop_words
+
+
+def tokenize(text: str) -> List[str]:
+    excluded = _stop_words or stop_words()
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in excluded
+    ]
+
+
+def bm25_idf(document_count: int, df: int) -> float:
+    return math.log(1 + (document_count - df + 0.5) / (df + 0.5))
+
+
+def combined_term_stats(indexes: Sequence["BM25Index"], query: str) -> Dict:
+    document_count = sum(len(index) for index in indexes)
+    total_length = sum(index.total_length for index in indexes)
+    idf = {}
+    for term in set(tokenize(query)):
+        df = sum(len(index.postings[term]) for index in indexes if term in index.postings)
+        if df:
+            idf[term] = bm25_idf(document_count, df)
+    
+    return {
+        "idf": idf,
+        "average_length": total_length / document_count if document_count else 0.0
+    }
+
+
+class PostingList:
+    
+    __slots__ = ("ids", "tfs", "max_tf", "min_length")
+    
+    def __init__(self):
+        self.ids = GrowableArray(np.int64, capacity=4)
+        self.tfs = GrowableArray(np.float32, capacity=4)
+        self.max_tf = 0.0
+        self.min_length = math.inf
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    @classmethod
+    def from_arrays(cls, ids: np.ndarray, tfs: np.ndarray, max_tf: float, min_length: float) -> "PostingList":
+        posting_list = cls.__new__(cls)
+        posting_list.ids = GrowableArray.from_array(ids)
+        posting_list.tfs = GrowableArray.from_array(tfs)
+        posting_list.max_tf = max_tf
+        posting_list.min_length = min_length
+        return posting_list
+    
+    def snapshot(self) -> "PostingList":
+        return PostingList.from_arrays(self.ids.view, self.tfs.view, self.max_tf, self.min_length)
+    
+    def add(self, slot: int, tf: int, length: int):
+        self.ids.append(slot)
+        self.tfs.append(tf)
+        self.max_tf = max(self.max_tf, tf)
+        self.min_length = min(self.min_length, length)
+
+
+class CorpusStatistics:
+    
+    def __init__(self):
+        self.document_frequency: Counter = Counter()
+        self.document_count = 0
+        self.total_length = 0
+    
+    def add(self, texts: Sequence[str]):
+        for text in texts:
+            tokens = tokenize(text)
+            self.document_frequency.update(set(tokens))
+            self.document_count += 1
+            self.total_length += len(tokens)
+    
+    @classmethod
+    def from_index(cls, index: "BM25Index") -> "CorpusStatistics":
+        statistics = cls()
+        statistics.document_frequency = Counter({term: len(posting_list) for term, posting_list in index.postings.items()})
+        statistics.document_count = len(index)
+        statistics.total_length = index.total_length
+        return statistics
+    
+    def merge(self, other: "CorpusStatistics"):
+        self.document_frequency.update(other.document_frequency)
+        self.document_count += other.document_count
+        self.total_length += other.total_length
+    
+    def term_stats(self, query: str) -> Dict:
+        idf = {}
+        for term in set(tokenize(query)):
+            df = self.document_frequency.get(term, 0)
+            if df:
+                idf[term] = bm25_idf(self.document_count, df)
+        
+        return {
+            "idf": idf,
+            "average_length": self.total_length / self.document_count if self.document_count else 0.0
+        }
+    
+    def save(self, directory: Path):
+        write_json(Path(directory) / "statistics.json", {
+            "document_frequency": dict(self.document_frequency),
+            "document_count": self.document_count,
+            "total_length": self.total_length
+        })
+    
+    @classmethod
+    def load(cls, directory: Path) -> "CorpusStatistics":
+        params = read_json(Path(directory) / "statistics.json")
+        statistics = cls()
+        statistics.document_frequency = Counter(params["document_frequency"])
+        statistics.document_count = params["document_count"]
+        statistics.total_length = params["total_length"]
+        return statistics
+    
+    def clear(self):
+        self.document_frequency = Counter()
+        self.document_count = 0
+        self.total_length = 0
+
+
+class BM25Index:
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, PostingList] = {}
+        self.doc_lengths = GrowableArray(np.float32)
+        self.total_length = 0
+    
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+    
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self.postings)
+    
+    @property
+    def average_length(self) -> float:
+        return self.total_length / len(self.doc_lengths) if len(self.doc_lengths) else 0.0
+    
+    def add(self, start: int, texts: Sequence[str]):
+        if start > len(self.doc_lengths):
+            self.doc_lengths.extend(np.zeros(start - len(self.doc_lengths), dtype=np.float32))
+        
+        for slot, text in enumerate(texts, start=start):
+            counts = Counter(tokenize(text))
+            length = sum(counts.values())
+            self.doc_lengths.append(length)
+            self.total_length += length
+            
+            for term, tf in counts.items():
+                posting_list = self.postings.get(term)
+                if posting_list is None:
+                    posting_list = self.postings[term] = PostingList()
+                posting_list.add(slot, tf, length)
+    
+    def idf(self, term: str) -> float:
+        return bm25_idf(len(self.doc_lengths), len(self.postings[term]))
+    
+    def _term_scores(self, idf: float, ids: np.ndarray, tfs: np.ndarray, average_length: float) -> np.ndarray:
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths.view[ids] / average_length)
+        return idf * tfs * (self.k1 + 1) / (tfs + norm)
+    
+    def _upper_bound(self, idf: float, posting_list: PostingList, average_length: float) -> float:
+        tf = posting_list.max_tf
+        norm = self.k1 * (1 - self.b + self.b * posting_list.min_length / average_length)
+        return idf * tf * (self.k1 + 1) / (tf + norm)
+    
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        exclude: Optional[np.ndarray] = None,
+        term_stats: Optional[Dict] = None,
+        allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        average_length = term_stats["average_length"] if term_stats else self.average_length
+        terms = []
+        for term in set(tokenize(query)):
+            posting_list = self.postings.get(term)
+            if posting_list is not None:
+                idf = term_stats["idf"][term] if term_stats else self.idf(term)
+                terms.append((self._upper_bound(idf, posting_list, average_length), idf, posting_list))
+        
+        if not terms or top_k <= 0:
+            return []
+        
+        terms.sort(key=lambda entry: entry[0], reverse=True)
+        remaining = np.cumsum([entry[0] for entry in terms][::-1])[::-1].tolist() + [0.0]
+        
+        candidate_ids = np.empty(0, dtype=np.int64)
+        candidate_scores = np.empty(0, dtype=np.float64)
+        pruning = False
+        
+        for position, (_, idf, posting_list) in enumerate(terms):
+            ids = posting_list.ids.view
+            tfs = posting_list.tfs.view
+            if allowed is not None:
+                keep = allowed[ids]
+                ids = ids[keep]
+                tfs = tfs[keep]
+            if not len(ids):
+                continue
+            
+            if not pruning:
+                merged_ids = np.concatenate([candidate_ids, ids])
+                merged_scores = np.concatenate([candidate_scores, self._term_scores(idf, ids, tfs, average_length)])
+                candidate_ids, inverse = np.unique(merged_ids, return_inverse=True)
+                candidate_scores = np.bincount(inverse, weights=merged_scores)
+                if exclude is not None and len(exclude):
+                    keep = ~np.isin(candidate_ids, exclude)
+                    candidate_ids = candidate_ids[keep]
+                    candidate_scores = candidate_scores[keep]
+            else:
+                positions = np.minimum(np.searchsorted(ids, candidate_ids), len(ids) - 1)
+                hits = ids[positions] == candidate_ids
+                candidate_scores[hits] += self._term_scores(idf, candidate_ids[hits], tfs[positions[hits]], average_length)
+            
+            if len(candidate_ids) >= top_k:
+                threshold = np.partition(candidate_scores, -top_k)[-top_k]
+                if threshold > remaining[position + 1]:
+                    pruning = True
+                    keep = candidate_scores + remaining[position + 1] >= threshold
+                    candidate_ids = candidate_ids[keep]
+                    candidate_scores = candidate_scores[keep]
+        
+        return [
+            (int(candidate_ids[idx]), score)
+            for idx, score in top_k_indices(candidate_scores, top_k)
+            if score > 0
+        ]
+    
+    def search_batch(
+        self,
+        queries: Sequence[str],
+        top_k: int = 5,
+        exclude: Optional[np.ndarray] = None,
+        term_stats: Optional[Dict] = None,
+        allowed: Optional[np.ndarray] = None
+    ) -> List[List[Tuple[int, float]]]:
+        average_length = term_stats["average_length"] if term_stats else self.average_length
+        query_terms = [[term for term in set(tokenize(query)) if term in self.postings] for query in queries]
+        terms = sorted({term for current in query_terms for term in current})
+        if not terms or top_k <= 0:
+            return [[] for _ in queries]
+        
+        from scipy.sparse import csr_matrix
+        
+        columns, bounds, ids, weights = {}, {}, [], []
+        for column, term in enumerate(terms):
+            posting_list = self.postings[term]
+            idf = term_stats["idf"][term] if term_stats else self.idf(term)
+            columns[term] = column
+            bounds[term] = self._upper_bound(idf, posting_list, average_length)
+            term_ids = posting_list.ids.view
+            tfs = posting_list.tfs.view
+            if allowed is not None:
+                keep = allowed[term_ids]
+                term_ids = term_ids[keep]
+                tfs = tfs[keep]
+            ids.append(term_ids)
+            weights.append(self._term_scores(idf, term_ids, tfs, average_length).astype(np.float64))
+        
+        postings = csr_matrix(
+            (np.concatenate(weights), np.concatenate(ids), np.cumsum([0] + [len(term_ids) for term_ids in ids])),
+            shape=(len(terms), len(self.doc_lengths))
+        )
+        query_columns = [
+            columns[term]
+            for current in query_terms
+            for term in sorted(current, key=bounds.__getitem__, reverse=True)
+        ]
+        selection = csr_matrix(
+            (np.ones(len(query_columns)), query_columns, np.cumsum([0] + [len(current) for current in query_terms])),
+            shape=(len(queries), len(terms))
+        )
+        scores = (selection @ postings).tocsr()
+        scores.sort_indices()
+        
+        results = []
+        for row in range(len(queries)):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            candidate_ids = scores.indices[start:end]
+            candidate_scores = scores.data[start:end]
+            if exclude is not None and len(exclude):
+                keep = ~np.isin(candidate_ids, exclude)
+                candidate_ids = candidate_ids[keep]
+                candidate_scores = candidate_scores[keep]
+            results.append([
+                (int(candidate_ids[idx]), score)
+                for idx, score in top_k_indices(candidate_scores, top_k)
+                if score > 0
+            ])
+        return results
+    
+    def snapshot(self, terms: Optional[Iterable[str]] = None) -> "BM25Index":
+        frozen = copy.copy(self)
+        terms = self.postings if terms is None else [term for term in terms if term in self.postings]
+        frozen.postings = {term: self.postings[term].snapshot() for term in terms}
+        frozen.doc_lengths = self.doc_lengths.snapshot()
+        return frozen
+    
+    def take(self, slots: np.ndarray) -> "BM25Index":
+        slots = np.asarray(slots, dtype=np.int64)
+        subset = BM25Index(k1=self.k1, b=self.b)
+        lengths = self.doc_lengths.view[slots]
+        subset.doc_lengths.extend(lengths)
+        subset.total_length = int(lengths.sum())
+        
+        for term, posting_list in self.postings.items():
+            ids = posting_list.ids.view
+            positions = np.minimum(np.searchsorted(slots, ids), max(len(slots) - 1, 0))
+            keep = slots[positions] == ids if len(slots) else np.zeros(len(ids), dtype=bool)
+            if keep.any():
+                tfs = posting_list.tfs.view[keep]
+                subset.postings[term] = PostingList.from_arrays(
+                    positions[keep].astype(np.int64), tfs, float(tfs.max()), float(lengths[positions[keep]].min())
+                )
+        
+        return subset
+    
+    def save(self, directory: Path):
+        terms = list(self.postings)
+        posting_lists = [self.postings[term] for term in terms]
+        sizes = np.array([len(posting_list) for posting_list in posting_lists], dtype=np.int64)
+        
+        save_array(directory, "keyword_offsets", np.concatenate([[0], np.cumsum(sizes)]))
+        save_array(directory, "keyword_ids", np.concatenate(
+            [np.empty(0, dtype=np.int64)] + [posting_list.ids.view for posting_list in posting_lists]
+        ))
+        save_array(directory, "keyword_tfs", np.concatenate(
+            [np.empty(0, dtype=np.float32)] + [posting_list.tfs.view for posting_list in posting_lists]
+        ))
+        save_array(directory, "keyword_bounds", np.array(
+            [(posting_list.max_tf, posting_list.min_length) for posting_list in posting_lists], dtype=np.float64
+        ).reshape(-1, 2))
+        save_array(directory, "keyword_doc_lengths", self.doc_lengths.view)
+        write_json(Path(directory) / "keyword.json", {
+            "k1": self.k1,
+            "b": self.b,
+            "total_length": self.total_length,
+            "terms": terms
+        })
+    
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "BM25Index":
+        params = read_json(Path(directory) / "keyword.json")
+        index = cls(k1=params["k1"], b=params["b"])
+        index.total_length = params["total_length"]
+        index.doc_lengths = GrowableArray.from_array(load_array(directory, "keyword_doc_lengths", mmap))
+        
+        offsets = load_array(directory, "keyword_offsets", mmap=False).tolist()
+        bounds = load_array(directory, "keyword_bounds", mmap=False).tolist()
+        ids = load_array(directory, "keyword_ids", mmap)
+        tfs = load_array(directory, "keyword_tfs", mmap)
+        for position, term in enumerate(params["terms"]):
+            start, end = offsets[position], offsets[position + 1]
+            max_tf, min_length = bounds[position]
+            index.postings[term] = PostingList.from_arrays(ids[start:end], tfs[start:end], max_tf, min_length)
+        
+        return index
+    
+    def clear(self):
+        self.postings = {}
+        self.doc_lengths = GrowableArray(np.float32)
+        self.total_length = 0
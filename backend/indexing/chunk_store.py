@@ -0,0 +1,425 @@
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import copy
+import os
+import tempfile
+import weakref
+import numpy as np
+
+from backend.indexing.growable import GrowableArray
+from backend.indexing.persistence import load_array, read_json, save_array, write_json
+
+
+INT_MISSING = np.iinfo(np.int64).min
+RESULT_FIELDS = ("score", "rank")
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+
+
+def _runs(slots: np.ndarray) -> Iterator[Tuple[int, int]]:
+    if not len(slots):
+        return
+    breaks = np.flatnonzero(np.diff(slots) != 1)
+    firsts = slots[np.concatenate([[0], breaks + 1])]
+    lasts = slots[np.concatenate([breaks, [len(slots) - 1]])]
+    for first, last in zip(firsts.tolist(), lasts.tolist()):
+        yield first, last
+
+
+class InternTable:
+    
+    def __init__(self):
+        self.values: List[Any] = []
+        self.ids: Dict[Any, int] = {}
+    
+    @classmethod
+    def from_values(cls, values: List[Any]) -> "InternTable":
+        table = cls()
+        table.values = list(values)
+        for value_id, value in enumerate(table.values):
+            table.ids.setdefault((type(value).__name__, _freeze(value)), value_id)
+        return table
+    
+    def __len__(self) -> int:
+        return len(self.values)
+    
+    def intern(self, value: Any) -> int:
+        key = (type(value).__name__, _freeze(value))
+        value_id = self.ids.get(key)
+        if value_id is None:
+            value_id = self.ids[key] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+
+class TextArena:
+    
+    def __init__(self, path: str, base: Optional[np.ndarray] = None):
+        self.prefix = Path(path)
+        self.base = base if base is not None else np.empty(0, dtype=np.uint8)
+        self.path: Optional[Path] = None
+        self._file = None
+        self._size = 0
+        self._map = None
+    
+    @property
+    def dtype(self):
+        return np.dtype(np.uint8)
+    
+    def __len__(self) -> int:
+        return len(self.base) + self._size
+    
+    def _open(self):
+        self.prefix.parent.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.prefix.parent, prefix=f"{self.prefix.stem}.", suffix=self.prefix.suffix)
+        self.path = Path(path)
+        self._file = os.fdopen(fd, "w+b")
+        weakref.finalize(self, TextArena._release, self._file, self.path)
+    
+    @staticmethod
+    def _release(file, path: Path):
+        file.close()
+        try:
+            path.unlink()
+        except OSError:
+            pass
+    
+    def extend(self, values) -> int:
+        values = np.ascontiguousarray(values, dtype=np.uint8)
+        start = len(self)
+        if self._file is None:
+            self._open()
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(memoryview(values))
+        self._file.flush()
+        self._size += len(values)
+        self._map = None
+        return start
+    
+    @property
+    def tail(self) -> np.ndarray:
+        if self._map is None:
+            if not self._size:
+                return np.empty(0, dtype=np.uint8)
+            self._map = np.memmap(self._file, dtype=np.uint8, mode="r", shape=(self._size,))
+        return self._map
+    
+    def slice(self, start: int, end: int) -> np.ndarray:
+        base_size = len(self.base)
+        if end <= base_size:
+            return self.base[start:end]
+        if start >= base_size:
+            return self.tail[start - base_size:end - base_size]
+        return np.concatenate([self.base[start:], self.tail[:end - base_size]])
+    
+    def save(self, directory: Path, name: str):
+        if not len(self):
+            save_array(directory, name, np.empty(0, dtype=np.uint8))
+            return
+        
+        target = np.lib.format.open_memmap(Path(directory) / f"{name}.npy", mode="w+", dtype=np.uint8, shape=(len(self),))
+        target[:len(self.base)] = self.base
+        target[len(self.base):] = self.tail
+        target.flush()
+        del target
+
+
+class ChunkStore:
+    
+    def __init__(self, capacity: int = 1024, text_path: Optional[str] = None):
+        self.capacity = capacity
+        self.text_path = text_path
+        if text_path:
+            self.text_bytes = TextArena(text_path)
+        else:
+            self.text_bytes = GrowableArray(np.uint8, capacity=capacity * 256)
+        self.text_offsets = GrowableArray(np.int64, capacity=capacity + 1)
+        self.text_offsets.append(0)
+        self.int_columns: Dict[str, GrowableArray] = {}
+        self.interned_columns: Dict[str, GrowableArray] = {}
+        self.tables: Dict[str, InternTable] = {}
+        self.fields: List[str] = ["text"]
+        self._size = 0
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def nbytes(self) -> int:
+        columns = list(self.int_columns.values()) + list(self.interned_columns.values())
+        return (
+            len(self.text_bytes) + len(self.text_offsets) * 8
+            + sum(len(column) * column.dtype.itemsize for column in columns)
+        )
+    
+    def add(self, chunks: Sequence[Dict]) -> int:
+        start = self._size
+        if not chunks:
+            return start
+        
+        encoded = [chunk.get("text", "").encode("utf-8") for chunk in chunks]
+        self.text_bytes.extend(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        lengths = np.fromiter((len(text) for text in encoded), dtype=np.int64, count=len(encoded))
+        self.text_offsets.extend(self.text_offsets.view[-1] + np.cumsum(lengths))
+        
+        keys = {}
+        for chunk in chunks:
+            keys.update(dict.fromkeys(chunk))
+        for key in ("text", "embedding"):
+            keys.pop(key, None)
+        
+        for key in list(keys) + [field for field in self.fields[1:] if field not in keys]:
+            self._add_column_values(key, [chunk.get(key) for chunk in chunks], start)
+        
+        self._size += len(chunks)
+        return start
+    
+    def _add_column_values(self, key: str, values: List[Any], start: int):
+        present = [value for value in values if value is not None]
+        if key not in self.int_columns and key not in self.interned_columns:
+            self.fields.append(key)
+            if present and all(_is_int(value) for value in present):
+                self.int_columns[key] = GrowableArray(np.int64, capacity=self.capacity)
+                self.int_columns[key].extend(np.full(start, INT_MISSING, dtype=np.int64))
+            else:
+                self.tables[key] = InternTable()
+                self.interned_columns[key] = GrowableArray(np.int32, capacity=self.capacity)
+                self.interned_columns[key].extend(np.full(start, -1, dtype=np.int32))
+        elif key in self.int_columns and not all(_is_int(value) for value in present):
+            self._convert_to_interned(key)
+        
+        if key in self.int_columns:
+            self.int_columns[key].extend(np.array(
+                [INT_MISSING if value is None else value for value in values], dtype=np.int64
+            ))
+        else:
+            table = self.tables[key]
+            self.interned_columns[key].extend(np.array(
+                [-1 if value is None else table.intern(value) for value in values], dtype=np.int32
+            ))
+    
+    def _convert_to_interned(self, key: str):
+        values = self.int_columns.pop(key).view
+        table = self.tables[key] = InternTable()
+        column = self.interned_columns[key] = GrowableArray(np.int32, capacity=max(len(values), self.capacity))
+        column.extend(np.array([-1 if value == INT_MISSING else table.intern(int(value)) for value in values], dtype=np.int32))
+    
+    def _text_slice(self, start: int, end: int) -> np.ndarray:
+        if isinstance(self.text_bytes, TextArena):
+            return self.text_bytes.slice(start, end)
+        return self.text_bytes.view[start:end]
+    
+    def text(self, slot: int) -> str:
+        offsets = self.text_offsets.view
+        return self._text_slice(offsets[slot], offsets[slot + 1]).tobytes().decode("utf-8")
+    
+    def texts(self) -> Iterator[str]:
+        for slot in range(self._size):
+            yield self.text(slot)
+    
+    def value(self, slot: int, field: str) -> Any:
+        if field == "text":
+            return self.text(slot)
+        
+        column = self.int_columns.get(field)
+        if column is not None:
+            value = column.view[slot]
+            return None if value == INT_MISSING else int(value)
+        
+        column = self.interned_columns.get(field)
+        if column is not None:
+            value_id = column.view[slot]
+            return None if value_id < 0 else self.tables[field].values[value_id]
+        
+        return None
+    
+    def field_codes(self, field: str) -> Tuple[np.ndarray, List[Any]]:
+        if field in self.int_columns:
+            column = self.int_columns[field].view
+            values, codes = np.unique(column, return_inverse=True)
+            values = values.tolist()
+            codes = codes.astype(np.int64)
+            codes[column == INT_MISSING] = -1
+        elif field in self.interned_columns:
+            codes = self.interned_columns[field].view.astype(np.int64)
+            values = list(self.tables[field].values)
+        else:
+            codes = np.full(self._size, -1, dtype=np.int64)
+            values = []
+        
+        metadata = self.interned_columns.get("metadata")
+        missing = codes < 0
+        if field != "metadata" and metadata is not None and missing.any():
+            nested = np.full(len(self.tables["metadata"]) + 1, -1, dtype=np.int64)
+            for metadata_id, entry in enumerate(self.tables["metadata"].values):
+                if isinstance(entry, dict) and entry.get(field) is not None:
+                    nested[metadata_id] = len(values)
+                    values.append(entry[field])
+            codes[missing] = nested[metadata.view[missing]]
+        
+        return codes, values
+    
+    def group_by(self, field: str, exclude: Optional[np.ndarray] = None) -> Dict[Any, List[int]]:
+        codes, values = self.field_codes(field)
+        if exclude is not None and len(exclude):
+            codes[exclude] = -1
+        
+        groups = {}
+        order = np.argsort(codes, kind='stable')
+        boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+        for group in np.split(order, boundaries):
+            if len(group) and codes[group[0]] >= 0:
+                groups.setdefault(values[codes[group[0]]], []).extend(group.tolist())
+        return groups
+    
+    def record(self, slot: int, fields: Optional[Sequence[str]] = None) -> Dict:
+        record = {}
+        for field in self.fields if fields is None else fields:
+            value = self.value(slot, field)
+            if value is not None:
+                record[field] = dict(value) if isinstance(value, dict) else value
+        return record
+    
+    def view(self, slot: int, score: Optional[float] = None, rank: Optional[int] = None) -> "ChunkView":
+        return ChunkView(self, slot, score, rank)
+    
+    def __getitem__(self, slot: int) -> "ChunkView":
+        if not 0 <= slot < self._size:
+            raise IndexError(slot)
+        return ChunkView(self, slot)
+    
+    def save(self, directory: Path):
+        if isinstance(self.text_bytes, TextArena):
+            self.text_bytes.save(directory, "chunk_text")
+        else:
+            save_array(directory, "chunk_text", self.text_bytes.view)
+        save_array(directory, "chunk_offsets", self.text_offsets.view)
+        
+        columns = []
+        for position, field in enumerate(self.fields[1:]):
+            if field in self.int_columns:
+                save_array(directory, f"chunk_column_{position}", self.int_columns[field].view)
+                columns.append({"field": field, "kind": "int"})
+            else:
+                save_array(directory, f"chunk_column_{position}", self.interned_columns[field].view)
+                columns.append({"field": field, "kind": "interned", "values": self.tables[field].values})
+        
+        write_json(Path(directory) / "chunks.json", {"size": self._size, "columns": columns})
+    
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True, text_path: Optional[str] = None) -> "ChunkStore":
+        params = read_json(Path(directory) / "chunks.json")
+        store = cls(capacity=1, text_path=text_path)
+        store._size = params["size"]
+        if text_path:
+            store.text_bytes = TextArena(text_path, base=load_array(directory, "chunk_text", mmap=True))
+        else:
+            store.text_bytes = GrowableArray.from_array(load_array(directory, "chunk_text", mmap))
+        store.text_offsets = GrowableArray.from_array(load_array(directory, "chunk_offsets", mmap))
+        
+        for position, column in enumerate(params["columns"]):
+            field = column["field"]
+            store.fields.append(field)
+            values = GrowableArray.from_array(load_array(directory, f"chunk_column_{position}", mmap))
+            if column["kind"] == "int":
+                store.int_columns[field] = values
+            else:
+                store.interned_columns[field] = values
+                store.tables[field] = InternTable.from_values(column["values"])
+        
+        return store
+    
+    def snapshot(self) -> "ChunkStore":
+        frozen = copy.copy(self)
+        if isinstance(self.text_bytes, GrowableArray):
+            frozen.text_bytes = self.text_bytes.snapshot()
+        frozen.text_offsets = self.text_offsets.snapshot()
+        frozen.int_columns = {key: column.snapshot() for key, column in self.int_columns.items()}
+        frozen.interned_columns = {key: column.snapshot() for key, column in self.interned_columns.items()}
+        frozen.tables = dict(self.tables)
+        frozen.fields = list(self.fields)
+        return frozen
+    
+    def take(self, slots: np.ndarray) -> "ChunkStore":
+        slots = np.asarray(slots, dtype=np.int64)
+        offsets = self.text_offsets.view
+        lengths = offsets[slots + 1] - offsets[slots]
+        
+        subset = ChunkStore(capacity=max(len(slots), 1), text_path=self.text_path)
+        subset.fields = list(self.fields)
+        subset._size = len(slots)
+        for first, last in _runs(slots):
+            subset.text_bytes.extend(self._text_slice(offsets[first], offsets[last + 1]))
+        subset.text_offsets.extend(np.cumsum(lengths))
+        
+        for key, column in self.int_columns.items():
+            subset.int_columns[key] = GrowableArray(np.int64, capacity=max(len(slots), 1))
+            subset.int_columns[key].extend(column.view[slots])
+        for key, column in self.interned_columns.items():
+            codes = column.view[slots]
+            present = codes >= 0
+            used, remapped = np.unique(codes[present], return_inverse=True)
+            codes = np.full(len(slots), -1, dtype=np.int32)
+            codes[present] = remapped
+            values = self.tables[key].values
+            subset.tables[key] = InternTable.from_values([values[value_id] for value_id in used.tolist()])
+            subset.interned_columns[key] = GrowableArray(np.int32, capacity=max(len(slots), 1))
+            subset.interned_columns[key].extend(codes)
+        
+        return subset
+
+
+class ChunkView(Mapping):
+    
+    __slots__ = ("store", "slot", "score", "rank")
+    
+    def __init__(self, store: ChunkStore, slot: int, score: Optional[float] = None, rank: Optional[int] = None):
+        self.store = store
+        self.slot = slot
+        self.score = score
+        self.rank = rank
+    
+    def _fields(self) -> List[str]:
+        fields = [field for field in self.store.fields if self.store.value(self.slot, field) is not None]
+        return fields + [field for field in RESULT_FIELDS if getattr(self, field) is not None]
+    
+    def __getitem__(self, key: str) -> Any:
+        if key in RESULT_FIELDS:
+            value = getattr(self, key)
+        else:
+            value = self.store.value(self.slot, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields())
+    
+    def __len__(self) -> int:
+        return len(self._fields())
+    
+    def __repr__(self) -> str:
+        return f"ChunkView(slot={self.slot}, score={self.score}, rank={self.rank})"
+    
+    def to_dict(self, fields: Optional[Sequence[str]] = None) -> Dict:
+        stored = None if fields is None else [field for field in fields if field not in RESULT_FIELDS]
+        record = self.store.record(self.slot, stored)
+        for field in RESULT_FIELDS:
+            value = getattr(self, field)
+            if value is not None and (fields is None or field in fields):
+                record[field] = value
+        return record
+    
+    def copy(self) -> Dict:
+        return self.to_dict()
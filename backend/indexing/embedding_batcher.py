@@ -0,0 +1,101 @@
+from concurrent.futures import Future
+import asyncio
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class EmbeddingBatcher:
+    
+    def __init__(self, embedder, max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        self.embedder = embedder
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = 0
+        self.batches = 0
+        self._last_batch_size = 0
+        
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+    
+    def submit(self, text: str) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            self._queue.put((text, future))
+        return future
+    
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        return self.submit(text).result(timeout)
+    
+    async def embed_async(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+    
+    def _collect(self) -> Optional[List[Tuple[str, Future]]]:
+        item = self._queue.get()
+        if item is None:
+            return None
+        
+        batch = [item]
+        if self._queue.empty() and self._last_batch_size <= 1:
+            self._last_batch_size = len(batch)
+            return batch
+        
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        self._last_batch_size = len(batch)
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                embeddings = dict(zip(texts, self.embedder.generate_batch(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            
+            self.requests += len(batch)
+            self.batches += 1
+            for text, future in batch:
+                future.set_result(embeddings[text])
+    
+    def get_stats(self) -> Dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0
+        }
+    
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,172 @@
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+import weakref
+import numpy as np
+import xxhash
+
+
+EVICTION_TARGET = 0.9
+SQL_BATCH_SIZE = 500
+RECENCY_BATCH_SIZE = 4096
+RECENCY_FLUSH_SECONDS = 30.0
+
+
+def _write_recency(connection: sqlite3.Connection, recent: Dict[bytes, int]):
+    if not recent:
+        return
+    connection.executemany(
+        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+        [(clock, key) for key, clock in recent.items()]
+    )
+    recent.clear()
+
+
+class EmbeddingCache:
+    
+    def __init__(
+        self,
+        path: str,
+        model_name: str,
+        max_bytes: int = 512 * 1024 * 1024,
+        recency_interval: float = RECENCY_FLUSH_SECONDS
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.recency_interval = recency_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self._recent: Dict[bytes, int] = {}
+        self._recency_flushed = time.monotonic()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+        """)
+        self._clock = self._connection.execute("SELECT COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()[0]
+        self._bytes = self._connection.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        self._finalizer = weakref.finalize(self, EmbeddingCache._release, self._connection, self._recent, self._lock)
+    
+    @staticmethod
+    def _release(connection: sqlite3.Connection, recent: Dict[bytes, int], lock: threading.Lock):
+        with lock:
+            _write_recency(connection, recent)
+            connection.commit()
+            connection.close()
+    
+    def key(self, text: str) -> bytes:
+        hasher = xxhash.xxh3_128(self.model_name.encode("utf-8"))
+        hasher.update(b"\0")
+        hasher.update(text.encode("utf-8"))
+        return hasher.digest()
+    
+    def _select(self, columns: str, keys: List[bytes]) -> List:
+        rows = []
+        for start in range(0, len(keys), SQL_BATCH_SIZE):
+            batch = keys[start:start + SQL_BATCH_SIZE]
+            rows.extend(self._connection.execute(
+                f"SELECT key, {columns} FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+        return rows
+    
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        keys = [self.key(text) for text in texts]
+        
+        with self._lock:
+            found = {
+                key: np.frombuffer(vector, dtype=np.float32)
+                for key, vector in self._select("vector", list(dict.fromkeys(keys)))
+            }
+            if found:
+                self._clock += 1
+                self._recent.update(dict.fromkeys(found, self._clock))
+                stale = time.monotonic() - self._recency_flushed >= self.recency_interval
+                if stale or len(self._recent) >= RECENCY_BATCH_SIZE:
+                    self._flush_recency()
+                    self._connection.commit()
+            
+            results = [found.get(key) for key in keys]
+            hits = sum(result is not None for result in results)
+            self.hits += hits
+            self.misses += len(results) - hits
+        
+        return results
+    
+    def put_many(self, texts: Sequence[str], vectors: Sequence):
+        if not len(texts):
+            return
+        
+        rows = {
+            self.key(text): np.asarray(vector, dtype=np.float32).tobytes()
+            for text, vector in zip(texts, vectors)
+        }
+        with self._lock:
+            self._flush_recency()
+            existing = dict(self._select("LENGTH(vector)", list(rows)))
+            self._clock += 1
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, vector, self._clock) for key, vector in rows.items()]
+            )
+            self._bytes += sum(len(vector) - existing.get(key, 0) for key, vector in rows.items())
+            if self._bytes > self.max_bytes:
+                self._evict()
+            self._connection.commit()
+    
+    def _flush_recency(self):
+        _write_recency(self._connection, self._recent)
+        self._recency_flushed = time.monotonic()
+    
+    def _evict(self):
+        target = self.max_bytes * EVICTION_TARGET
+        evicted = []
+        freed = 0
+        for key, size in self._connection.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"):
+            if self._bytes - freed <= target:
+                break
+            evicted.append((key,))
+            freed += size
+        
+        self._connection.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+        self._bytes -= freed
+        self.evictions += len(evicted)
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "model_name": self.model_name,
+            "entries": len(self),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions
+        }
+    
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._connection.execute("DELETE FROM embeddings")
+            self._connection.commit()
+            self._bytes = 0
+    
+    def close(self):
+        self._finalizer()
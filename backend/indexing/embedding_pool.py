@@ -0,0 +1,155 @@
+from collections import deque
+from itertools import count
+import multiprocessing
+import os
+import queue
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+POLL_INTERVAL = 1.0
+
+
+def _embedding_worker(tasks, results, generator_options: Dict, threads: int):
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    
+    try:
+        from backend.indexing.embeddings import EmbeddingGenerator
+        generator = EmbeddingGenerator(**{**generator_options, "threads": threads})
+        generator.warmup()
+    except Exception as e:
+        results.put((None, False, f"{type(e).__name__}: {e}"))
+        return
+    results.put((None, True, generator.get_dimension()))
+    
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        
+        batch_id, inputs = task
+        try:
+            results.put((batch_id, True, generator.generate_inputs(inputs)))
+        except Exception as e:
+            results.put((batch_id, False, f"{type(e).__name__}: {e}"))
+
+
+class EmbeddingPool:
+    
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        workers: Optional[int] = None,
+        threads_per_worker: int = 1,
+        batch_size: int = 128,
+        max_pending: Optional[int] = None,
+        generator_options: Optional[Dict] = None,
+        start_method: str = "spawn"
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.max_pending = max_pending or 2 * self.workers
+        
+        context = multiprocessing.get_context(start_method)
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._batch_ids = count()
+        self._in_flight = 0
+        self._closed = False
+        self.processes = [
+            context.Process(
+                target=_embedding_worker,
+                args=(self._tasks, self._results, {"model_name": model_name, **(generator_options or {})}, threads_per_worker),
+                daemon=True
+            )
+            for _ in range(self.workers)
+        ]
+        for process in self.processes:
+            process.start()
+        
+        dimensions = [self._receive() for _ in self.processes]
+        self.dimension = dimensions[0][1]
+    
+    def _receive(self) -> Tuple[Optional[int], Any]:
+        while True:
+            try:
+                batch_id, ok, payload = self._results.get(timeout=POLL_INTERVAL)
+                break
+            except queue.Empty:
+                if not all(process.is_alive() for process in self.processes):
+                    self.close()
+                    raise RuntimeError("Embedding worker exited")
+        
+        if not ok:
+            self.close()
+            raise RuntimeError(payload)
+        return batch_id, payload
+    
+    def _submit(self, inputs: List) -> int:
+        batch_id = next(self._batch_ids)
+        self._tasks.put((batch_id, inputs))
+        self._in_flight += 1
+        return batch_id
+    
+    def map(self, items: Iterable[Tuple[Any, List]]) -> Iterator[Tuple[Any, np.ndarray]]:
+        items = iter(items)
+        order = deque()
+        finished: Dict[int, np.ndarray] = {}
+        current = None
+        exhausted = False
+        
+        while True:
+            while not exhausted and self._in_flight < self.max_pending:
+                if current is None:
+                    try:
+                        tag, texts = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    current = {"tag": tag, "texts": texts, "offset": 0, "batch_ids": []}
+                    order.append(current)
+                
+                if current["offset"] >= len(current["texts"]):
+                    current = None
+                    continue
+                
+                offset = current["offset"]
+                current["batch_ids"].append(self._submit(current["texts"][offset:offset + self.batch_size]))
+                current["offset"] = offset + self.batch_size
+            
+            if not order:
+                return
+            
+            head = order[0]
+            if head is current or any(batch_id not in finished for batch_id in head["batch_ids"]):
+                batch_id, embeddings = self._receive()
+                self._in_flight -= 1
+                finished[batch_id] = embeddings
+                continue
+            
+            order.popleft()
+            blocks = [finished.pop(batch_id) for batch_id in head["batch_ids"]]
+            yield head["tag"], np.concatenate(blocks) if blocks else np.empty((0, self.dimension), dtype=np.float32)
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return next(self.map([(None, texts)]))[1]
+    
+    def close(self, timeout: float = 5.0):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self.processes:
+            self._tasks.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+    
+    def __enter__(self) -> "EmbeddingPool":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,57 +1,407 @@
-from typing import List, Dict
+from collections import deque
+from pathlib import Path
+import re
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from backend.indexing.persistence import read_json, write_json
+
+
+CHARS_PER_TOKEN = 4
+EMBEDDING_BACKENDS = ("torch", "onnx")
+ONNX_CONFIG_FILE = "onnx_embedding.json"
+WORD_PATTERN = re.compile(r"\S+")
+
+
+class OnnxEmbeddingModel:
+    
+    def __init__(self, model_dir: str, threads: Optional[int] = None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        
+        self.model_dir = Path(model_dir)
+        config = read_json(self.model_dir / ONNX_CONFIG_FILE)
+        self.max_seq_length = config["max_seq_length"]
+        self.dimension = config["dimension"]
+        self.pooling = config["pooling"]
+        self.normalize = config["normalize"]
+        self.pad_token_id = config["pad_token_id"]
+        
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=config["pad_token_id"], pad_token=config["pad_token"])
+        
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            str(self.model_dir / config["onnx_file"]), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+    
+    @staticmethod
+    def is_exported(model_dir: str) -> bool:
+        return (Path(model_dir) / ONNX_CONFIG_FILE).exists()
+    
+    @staticmethod
+    def export(model_name: str, model_dir: str, quantization: str = "avx2") -> Path:
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+        from sentence_transformers.models import Normalize, Pooling
+        
+        model_dir = Path(model_dir)
+        model = SentenceTransformer(model_name, backend="onnx")
+        pooling = next(module for module in model if isinstance(module, Pooling)).get_pooling_mode_str()
+        if pooling not in ("mean", "cls"):
+            raise ValueError(f"Unsupported pooling mode for ONNX export: {pooling}")
+        
+        model.save(str(model_dir))
+        export_dynamic_quantized_onnx_model(model, quantization, str(model_dir))
+        onnx_file = next((model_dir / "onnx").glob(f"model*qint8_{quantization}*.onnx"))
+        
+        write_json(model_dir / ONNX_CONFIG_FILE, {
+            "model_name": model_name,
+            "onnx_file": str(onnx_file.relative_to(model_dir)),
+            "quantization": quantization,
+            "max_seq_length": model.max_seq_length,
+            "dimension": model.get_sentence_embedding_dimension(),
+            "pooling": pooling,
+            "normalize": any(isinstance(module, Normalize) for module in model),
+            "pad_token_id": model.tokenizer.pad_token_id,
+            "pad_token": model.tokenizer.pad_token
+        })
+        return model_dir
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+    
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            embeddings[start:start + len(encodings)] = self.run(
+                np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+                np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+            )
+        
+        return embeddings[0] if single else embeddings
+    
+    def run(self, input_ids: np.ndarray, attention_mask: np.ndarray, token_type_ids: Optional[np.ndarray] = None) -> np.ndarray:
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids) if token_type_ids is None else token_type_ids
+        }
+        hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+        
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        else:
+            weights = attention_mask[..., None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        if self.normalize:
+            pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled
 
 
 class EmbeddingGenerator:
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
-        self.dimension = self.model.get_sentence_embedding_dimension()
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        batch_size: int = 64,
+        max_batch_tokens: int = 16384,
+        backend: str = "torch",
+        onnx_dir: Optional[str] = None,
+        quantization: str = "avx2",
+        threads: Optional[int] = None
+    ):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend}")
+        
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.backend = backend
+        self.onnx_dir = Path(onnx_dir) if onnx_dir else Path.home() / ".cache" / "finbud" / f"{model_name.replace('/', '--')}-onnx-{quantization}"
+        self.quantization = quantization
+        self.threads = threads
+        self._model = None
+        self._tokenizer = None
+        self._special_tokens = None
+        self._lock = threading.Lock()
+    
+    @property
+    def fingerprint(self) -> str:
+        if self.backend == "onnx":
+            return f"{self.model_name}:onnx-qint8-{self.quantization}"
+        return self.model_name
+    
+    def options(self) -> Dict:
+        return {
+            "batch_size": self.batch_size,
+            "max_batch_tokens": self.max_batch_tokens,
+            "backend": self.backend,
+            "onnx_dir": str(self.onnx_dir),
+            "quantization": self.quantization,
+            "threads": self.threads
+        }
+    
+    def prepare(self):
+        if self.backend == "onnx" and not OnnxEmbeddingModel.is_exported(self.onnx_dir):
+            OnnxEmbeddingModel.export(self.model_name, self.onnx_dir, self.quantization)
+    
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    if self.backend == "onnx":
+                        self.prepare()
+                        self._model = OnnxEmbeddingModel(self.onnx_dir, threads=self.threads)
+                    else:
+                        from sentence_transformers import SentenceTransformer
+                        if self.threads:
+                            import torch
+                            torch.set_num_threads(self.threads)
+                        self._model = SentenceTransformer(self.model_name)
+        return self._model
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+    
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+    
+    def warmup(self):
+        self.model.encode(["warmup"], convert_to_numpy=True)
     
     def generate(self, text: str) -> List[float]:
         embedding = self.model.encode(text, convert_to_numpy=True)
         return embedding.tolist()
     
-    def generate_batch(self, texts: List[str]) -> List[List[float]]:
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings.tolist()
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from tokenizers import Tokenizer
+            source = getattr(self.model.tokenizer, "backend_tokenizer", self.model.tokenizer)
+            tokenizer = Tokenizer.from_str(source.to_str())
+            tokenizer.no_truncation()
+            tokenizer.no_padding()
+            self._tokenizer = tokenizer
+        return self._tokenizer
+    
+    @property
+    def special_tokens(self) -> Tuple[List[int], List[int]]:
+        if self._special_tokens is None:
+            plain = self.tokenizer.encode("a", add_special_tokens=False).ids
+            wrapped = self.tokenizer.encode("a").ids
+            position = next(i for i in range(len(wrapped)) if wrapped[i:i + len(plain)] == plain)
+            self._special_tokens = (wrapped[:position], wrapped[position + len(plain):])
+        return self._special_tokens
+    
+    @property
+    def max_chunk_tokens(self) -> int:
+        prefix, suffix = self.special_tokens
+        return self.model.max_seq_length - len(prefix) - len(suffix)
+    
+    @property
+    def pad_token_id(self) -> int:
+        if self.backend == "onnx":
+            return self.model.pad_token_id
+        return self.model.tokenizer.pad_token_id or 0
+    
+    def estimate_tokens(self, text: str) -> int:
+        return min(len(text) // CHARS_PER_TOKEN + 2, self.model.max_seq_length)
+    
+    def _buckets(self, lengths: np.ndarray) -> Iterator[np.ndarray]:
+        order = np.argsort(-lengths, kind="stable")
+        
+        start = 0
+        while start < len(order):
+            end = start + 1
+            while (
+                end < len(order)
+                and end - start < self.batch_size
+                and (end - start + 1) * lengths[order[start]] <= self.max_batch_tokens
+            ):
+                end += 1
+            
+            yield order[start:end]
+            start = end
+    
+    def embed_iter(self, texts: List[str]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        lengths = np.array([self.estimate_tokens(text) for text in texts], dtype=np.int64)
+        for positions in self._buckets(lengths):
+            block = self.model.encode(
+                [texts[i] for i in positions], batch_size=len(positions), convert_to_numpy=True
+            )
+            yield positions, np.ascontiguousarray(block, dtype=np.float32)
+    
+    def _encode_sequences(self, sequences: List[List[int]]) -> np.ndarray:
+        input_ids = np.full((len(sequences), max(map(len, sequences))), self.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros_like(input_ids)
+        for row, ids in enumerate(sequences):
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+        
+        if self.backend == "onnx":
+            return self.model.run(input_ids, attention_mask)
+        
+        import torch
+        features = {
+            name: torch.from_numpy(values).to(self.model.device)
+            for name, values in (
+                ("input_ids", input_ids), ("attention_mask", attention_mask), ("token_type_ids", np.zeros_like(input_ids))
+            )
+        }
+        with torch.inference_mode():
+            return self.model(features)["sentence_embedding"].float().cpu().numpy()
+    
+    def embed_token_ids(self, token_ids: List[List[int]]) -> np.ndarray:
+        prefix, suffix = self.special_tokens
+        limit = self.max_chunk_tokens
+        sequences = [prefix + list(ids[:limit]) + suffix for ids in token_ids]
+        
+        embeddings = np.empty((len(sequences), self.dimension), dtype=np.float32)
+        lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        for positions in self._buckets(lengths):
+            embeddings[positions] = self._encode_sequences([sequences[i] for i in positions])
+        return embeddings
+    
+    def generate_inputs(self, inputs: List) -> np.ndarray:
+        if inputs and not isinstance(inputs[0], str):
+            return self.embed_token_ids(inputs)
+        return self.generate_batch(inputs)
+    
+    def generate_batch(self, texts: List[str]) -> np.ndarray:
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for positions, block in self.embed_iter(texts):
+            embeddings[positions] = block
+        return embeddings
     
     def get_dimension(self) -> int:
         return self.dimension
 
 
-class TextChunker:
+class TokenTextChunker:
     
-    def __init__(self, chunk_size: int = 500, overlap: int = 50):
+    def __init__(self, embedder: EmbeddingGenerator, chunk_size: Optional[int] = None, overlap: int = 32):
+        self.embedder = embedder
         self.chunk_size = chunk_size
         self.overlap = overlap
     
-    def chunk_text(self, text: str, metadata: Dict = None) -> List[Dict]:
+    @property
+    def max_tokens(self) -> int:
+        limit = self.embedder.max_chunk_tokens
+        return min(self.chunk_size, limit) if self.chunk_size else limit
+    
+    def iter_chunks(self, text: str, metadata: Dict = None) -> Iterator[Dict]:
         if not text or not text.strip():
-            return []
+            return
         
-        words = text.split()
-        chunks = []
+        encoding = self.embedder.tokenizer.encode(text, add_special_tokens=False)
+        ids, offsets, words = encoding.ids, encoding.offsets, encoding.word_ids
+        max_tokens = self.max_tokens
+        chunk_index = 0
         
-        for i in range(0, len(words), self.chunk_size - self.overlap):
-            chunk_words = words[i:i + self.chunk_size]
-            chunk_text = " ".join(chunk_words)
+        start = 0
+        while start < len(ids):
+            end = min(start + max_tokens, len(ids))
+            if end < len(ids):
+                boundary = self._word_start(words, end)
+                if boundary > start:
+                    end = boundary
             
+            start_char, end_char = offsets[start][0], offsets[end - 1][1]
             chunk_data = {
-                "text": chunk_text,
-                "chunk_index": len(chunks),
-                "start_word": i,
-                "end_word": i + len(chunk_words),
-                "word_count": len(chunk_words)
+                "text": text[start_char:end_char],
+                "chunk_index": chunk_index,
+                "start_char": start_char,
+                "end_char": end_char,
+                "start_token": start,
+                "end_token": end,
+                "token_count": end - start,
+                "token_ids": ids[start:end]
             }
             
             if metadata:
                 chunk_data["metadata"] = metadata
             
-            chunks.append(chunk_data)
+            yield chunk_data
+            chunk_index += 1
+            if end == len(ids):
+                break
+            
+            next_start = max(end - self.overlap, start + 1)
+            boundary = self._word_start(words, next_start)
+            start = boundary if boundary > start else next_start
+    
+    def chunk_text(self, text: str, metadata: Dict = None) -> List[Dict]:
+        return list(self.iter_chunks(text, metadata))
+    
+    @staticmethod
+    def _word_start(words: List[Optional[int]], position: int) -> int:
+        while position > 0 and words[position] is not None and words[position] == words[position - 1]:
+            position -= 1
+        return position
+
+
+class TextChunker:
+    
+    def __init__(self, chunk_size: int = 500, overlap: int = 50):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+    
+    def iter_chunks(self, text: str, metadata: Dict = None) -> Iterator[Dict]:
+        step = self.chunk_size - self.overlap
+        if step < 1:
+            raise ValueError("overlap must be smaller than chunk_size")
+        if not text:
+            return
         
-        return chunks
+        chunk_index = 0
+        window = deque()
+        for match in WORD_PATTERN.finditer(text):
+            window.append(match.span())
+            if len(window) == self.chunk_size:
+                yield self._chunk(text, window, chunk_index, metadata)
+                chunk_index += 1
+                for _ in range(step):
+                    window.popleft()
+        
+        while window:
+            yield self._chunk(text, window, chunk_index, metadata)
+            chunk_index += 1
+            for _ in range(min(step, len(window))):
+                window.popleft()
+    
+    @staticmethod
+    def _chunk(text: str, window: deque, chunk_index: int, metadata: Optional[Dict]) -> Dict:
+        start_char, end_char = window[0][0], window[-1][1]
+        chunk_data = {
+            "text": text[start_char:end_char],
+            "chunk_index": chunk_index,
+            "start_char": start_char,
+            "end_char": end_char,
+            "word_count": len(window)
+        }
+        
+        if metadata:
+            chunk_data["metadata"] = metadata
+        
+        return chunk_data
+    
+    def chunk_text(self, text: str, metadata: Dict = None) -> List[Dict]:
+        return list(self.iter_chunks(text, metadata))
     
     def chunk_by_sentences(self, text: str, max_sentences: int = 5) -> List[str]:
         sentences = text.replace('!', '.').replace('?', '.').split('.')
@@ -0,0 +1,67 @@
+from typing import Optional
+import numpy as np
+
+
+class GrowableArray:
+    
+    def __init__(self, dtype, width: Optional[int] = None, capacity: int = 1024):
+        self.width = width
+        shape = (capacity,) if width is None else (capacity, width)
+        self._data = np.empty(shape, dtype=dtype)
+        self._size = 0
+    
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "GrowableArray":
+        grown = cls.__new__(cls)
+        grown.width = None if array.ndim == 1 else array.shape[1]
+        grown._data = np.asarray(array)
+        grown._size = len(array)
+        return grown
+    
+    @property
+    def dtype(self):
+        return self._data.dtype
+    
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+    
+    @property
+    def view(self) -> np.ndarray:
+        return self._data[:self._size]
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def reserve(self, needed: int):
+        if needed <= len(self._data) and self._data.flags.writeable:
+            return
+        
+        new_capacity = max(needed, 2 * len(self._data), 1)
+        shape = (new_capacity,) + self._data.shape[1:]
+        grown = np.empty(shape, dtype=self._data.dtype)
+        grown[:self._size] = self._data[:self._size]
+        self._data = grown
+    
+    def extend(self, values) -> int:
+        values = np.asarray(values, dtype=self._data.dtype)
+        if self.width is not None:
+            values = values.reshape(-1, self.width)
+        
+        start = self._size
+        self.reserve(start + len(values))
+        self._data[start:start + len(values)] = values
+        self._size += len(values)
+        return start
+    
+    def append(self, value) -> int:
+        self.reserve(self._size + 1)
+        self._data[self._size] = value
+        self._size += 1
+        return self._size - 1
+    
+    def snapshot(self) -> "GrowableArray":
+        return GrowableArray.from_array(self.view)
+    
+    def clear(self):
+        self._size = 0
@@ -1,93 +1,394 @@
-from typing import List, Dict, Tuple
+from pathlib import Path
+from typing import Iterable, List, Dict, Optional, Tuple
+import copy
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from backend.indexing.ann_index import IVFIndex
+from backend.indexing.bitmap_index import Bitmap, MetadataIndex
+from backend.indexing.bm25_index import BM25Index
+from backend.indexing.chunk_store import ChunkStore, ChunkView
+from backend.indexing.persistence import atomic_directory, load_array, read_manifest, save_array, write_manifest
+from backend.indexing.vector_store import VectorStore
+
+
+COMPACTION_BATCH_SIZE = 4096
 
 
 class HybridSearchEngine:
     
-    def __init__(self):
-        self.tfidf_vectorizer = TfidfVectorizer(
-            max_features=5000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
-        self.documents = []
-        self.document_vectors = None
-        self.embeddings = []
-        self.is_fitted = False
+    def __init__(
+        self,
+        vector_index: str = "exact",
+        nprobe: int = 16,
+        vector_storage: str = "float32",
+        rescore_path: Optional[str] = None,
+        text_path: Optional[str] = None
+    ):
+        if vector_index not in ("exact", "ivf"):
+            raise ValueError(f"Unknown vector index: {vector_index}")
+        
+        self.vector_index = vector_index
+        self.nprobe = nprobe
+        self.vector_storage = vector_storage
+        self.rescore_path = rescore_path
+        self.text_path = text_path
+        self._reset()
+    
+    def _reset(self):
+        self.keyword_index = BM25Index()
+        self.metadata_index = MetadataIndex()
+        self.documents = ChunkStore(text_path=self.text_path)
+        self.vectors = VectorStore(storage=self.vector_storage, rescore_path=self.rescore_path)
+        self.ann_index = None
+        self.doc_chunks: Dict[int, List[int]] = {}
+        self.deleted = Bitmap()
+        self._pending_removals: Optional[List[int]] = None
     
     def index_documents(self, documents: List[Dict]):
-        self.documents = documents
-        texts = [doc['text'] for doc in documents]
+        self._reset()
+        self.add_chunks(documents)
+    
+    def add_chunks(self, chunks: List[Dict]) -> List[int]:
+        if not chunks:
+            return []
+        
+        start = len(self.documents)
+        self.keyword_index.add(start, [chunk['text'] for chunk in chunks])
+        self.metadata_index.add(start, chunks)
         
-        if texts:
-            self.document_vectors = self.tfidf_vectorizer.fit_transform(texts)
-            self.is_fitted = True
+        embeddings = [chunk.get('embedding') for chunk in chunks]
+        if any(embedding is not None for embedding in embeddings):
+            vector_start = self.vectors.add(start, embeddings)
+            if self.ann_index is not None:
+                self.ann_index.add(vector_start, self.vectors.decode(np.arange(vector_start, len(self.vectors))))
         
-        if 'embedding' in documents[0]:
-            self.embeddings = [doc['embedding'] for doc in documents]
+        return self._add_documents(chunks)
     
-    def keyword_search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
-        if not self.is_fitted or not self.documents:
-            return []
+    def _add_documents(self, chunks: List[Dict]) -> List[int]:
+        start = self.documents.add(chunks)
+        slots = list(range(start, start + len(chunks)))
+        for slot, chunk in zip(slots, chunks):
+            doc_id = chunk.get('doc_id')
+            if doc_id is not None:
+                self.doc_chunks.setdefault(doc_id, []).append(slot)
+        
+        return slots
+    
+    def document_chunks(self, doc_id: int) -> List[ChunkView]:
+        return [self.documents.view(slot) for slot in self.doc_chunks.get(doc_id, [])]
+    
+    def document_ids(self) -> List[int]:
+        return sorted(self.doc_chunks)
+    
+    def remove_doc(self, doc_id: int) -> int:
+        slots = self.doc_chunks.pop(doc_id, [])
+        self.deleted.update(slots)
+        if self._pending_removals is not None:
+            self._pending_removals.append(doc_id)
+        return len(slots)
+    
+    def records(self, slots: np.ndarray) -> List[Dict]:
+        chunks = [self.documents.record(int(slot)) for slot in slots]
+        with_vectors = slots[slots < len(self.vectors)]
+        if len(with_vectors):
+            for chunk, embedding in zip(chunks, self.vectors.rows(with_vectors)):
+                chunk['embedding'] = embedding
+        return chunks
+    
+    def compact(self):
+        snapshot = self.begin_compaction()
+        self.finish_compaction(snapshot, snapshot.compacted())
+    
+    def begin_compaction(self) -> "HybridSearchEngine":
+        self._pending_removals = []
+        snapshot = copy.copy(self)
+        snapshot.documents = self.documents.snapshot()
+        snapshot.vectors = self.vectors.snapshot()
+        snapshot.deleted = Bitmap(self.deleted.to_array())
+        return snapshot
+    
+    def search_snapshot(
+        self,
+        terms: Optional[Iterable[str]] = None,
+        fields: Optional[Iterable[str]] = None
+    ) -> "HybridSearchEngine":
+        frozen = copy.copy(self)
+        frozen.keyword_index = self.keyword_index.snapshot(terms)
+        frozen.metadata_index = self.metadata_index.snapshot(fields)
+        frozen.documents = self.documents.snapshot()
+        frozen.vectors = self.vectors.snapshot()
+        frozen.deleted = self.deleted.copy()
+        return frozen
+    
+    def compacted(self) -> "HybridSearchEngine":
+        live = np.setdiff1d(np.arange(len(self.documents)), self.deleted.to_array(), assume_unique=True)
+        staging = f"{self.rescore_path}.tmp" if self.rescore_path else None
+        engine = HybridSearchEngine(self.vector_index, self.nprobe, self.vector_storage, staging, self.text_path)
+        engine.vectors = self.vectors.take(live[live < len(self.vectors)], staging)
+        engine.documents = self.documents.take(live)
+        engine.keyword_index.add(0, list(engine.documents.texts()))
+        engine._index_store()
         
-        query_vector = self.tfidf_vectorizer.transform([query])
-        similarities = cosine_similarity(query_vector, self.document_vectors)[0]
+        if engine.vector_index == "ivf" and len(engine.vectors):
+            engine.build_ann_index()
+        return engine
+    
+    def abort_compaction(self):
+        self._pending_removals = None
+    
+    def finish_compaction(self, snapshot: "HybridSearchEngine", compacted: "HybridSearchEngine") -> bool:
+        if self._pending_removals is None:
+            return False
+        for doc_id in self._pending_removals:
+            compacted.remove_doc(doc_id)
+        self._pending_removals = None
         
-        top_indices = np.argsort(similarities)[::-1][:top_k]
-        results = [(int(idx), float(similarities[idx])) for idx in top_indices if similarities[idx] > 0]
+        added = np.arange(len(snapshot.documents), len(self.documents))
+        added = np.setdiff1d(added, self.deleted.to_array(), assume_unique=True)
+        for start in range(0, len(added), COMPACTION_BATCH_SIZE):
+            compacted.add_chunks(self.records(added[start:start + COMPACTION_BATCH_SIZE]))
+        compacted.vectors.relocate(self.rescore_path)
         
-        return results
+        self.keyword_index = compacted.keyword_index
+        self.metadata_index = compacted.metadata_index
+        self.documents = compacted.documents
+        self.vectors = compacted.vectors
+        self.ann_index = compacted.ann_index
+        self.doc_chunks = compacted.doc_chunks
+        self.deleted = compacted.deleted
+        return True
     
-    def vector_search(self, query_embedding: List[float], top_k: int = 5) -> List[Tuple[int, float]]:
-        if not self.embeddings:
-            return []
+    def _index_store(self):
+        self.metadata_index.add_store(self.documents)
+        self.doc_chunks = self.documents.group_by('doc_id', exclude=self.deleted.to_array())
+    
+    def save(self, directory: str):
+        with atomic_directory(directory) as staging:
+            self.documents.save(staging)
+            self.keyword_index.save(staging)
+            self.vectors.save(staging)
+            save_array(staging, "deleted", self.deleted.to_array())
+            if self.ann_index is not None:
+                self.ann_index.save(str(staging / "ivf.npz"))
+            
+            write_manifest(
+                staging,
+                vector_index=self.vector_index,
+                vector_storage=self.vector_storage,
+                nprobe=self.nprobe,
+                chunk_count=len(self.documents)
+            )
+    
+    def load(self, directory: str, mmap: bool = True) -> Dict:
+        directory = Path(directory)
+        manifest = read_manifest(directory)
         
-        query_vec = np.array(query_embedding).reshape(1, -1)
-        doc_vecs = np.array(self.embeddings)
+        self.vector_index = manifest["vector_index"]
+        self.vector_storage = manifest["vector_storage"]
+        self.nprobe = manifest["nprobe"]
+        self._reset()
         
-        similarities = cosine_similarity(query_vec, doc_vecs)[0]
+        self.documents = ChunkStore.load(directory, mmap, text_path=self.text_path)
+        self.keyword_index = BM25Index.load(directory, mmap)
+        self.vectors = VectorStore.load(directory, rescore_path=self.rescore_path, mmap=mmap)
+        self.deleted = Bitmap(load_array(directory, "deleted", mmap=False))
+        self._index_store()
+        if (directory / "ivf.npz").exists():
+            self.ann_index = IVFIndex.load(str(directory / "ivf.npz"))
         
-        top_indices = np.argsort(similarities)[::-1][:top_k]
-        results = [(int(idx), float(similarities[idx])) for idx in top_indices]
+        return manifest
+    
+    def build_ann_index(self, n_lists: Optional[int] = None):
+        self.ann_index = IVFIndex(n_lists=n_lists, nprobe=self.nprobe)
+        self.ann_index.build(self.vectors.decode())
+    
+    def ensure_ann_index(self) -> bool:
+        if self.vector_index != "ivf" or self.ann_index is not None or not len(self.vectors):
+            return False
+        self.build_ann_index()
+        return True
+    
+    def save_ann_index(self, path: str) -> bool:
+        if self.ann_index is None:
+            return False
+        self.ann_index.save(path)
+        return True
+    
+    def load_ann_index(self, path: str):
+        self.ann_index = IVFIndex.load(path)
+        self.nprobe = self.ann_index.nprobe
+    
+    def filter_ids(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        if not filters:
+            return None
         
-        return results
+        return (self.metadata_index.lookup(filters) - self.deleted).to_array()
     
-    def hybrid_search(
+    def _allowed_mask(self, ids: np.ndarray, size: int) -> np.ndarray:
+        allowed = np.zeros(size, dtype=bool)
+        allowed[ids[ids < size]] = True
+        return allowed
+    
+    def keyword_search(
         self,
         query: str,
+        top_k: int = 5,
+        term_stats: Optional[Dict] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Tuple[int, float]]:
+        if not len(self.keyword_index):
+            return []
+        
+        ids = self.filter_ids(filters)
+        if ids is not None:
+            if not len(ids):
+                return []
+            allowed = self._allowed_mask(ids, len(self.keyword_index))
+            return self.keyword_index.search(query, top_k, term_stats=term_stats, allowed=allowed)
+        
+        exclude = self.deleted.to_array() if self.deleted else None
+        return self.keyword_index.search(query, top_k, exclude=exclude, term_stats=term_stats)
+    
+    def vector_search(
+        self,
         query_embedding: List[float],
         top_k: int = 5,
-        keyword_weight: float = 0.3,
-        vector_weight: float = 0.7
-    ) -> List[Dict]:
-        keyword_results = self.keyword_search(query, top_k * 2)
-        vector_results = self.vector_search(query_embedding, top_k * 2)
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Tuple[int, float]]:
+        if not len(self.vectors):
+            return []
+        
+        ids = self.filter_ids(filters)
+        if ids is not None:
+            ids = ids[ids < len(self.vectors)]
+            if self.ann_index is not None and self._prefer_ivf(ids, nprobe):
+                return self.ann_index.search(
+                    self.vectors, query_embedding, top_k, nprobe=nprobe,
+                    allowed=self._allowed_mask(ids, len(self.vectors))
+                )
+            return self.vectors.search(query_embedding, top_k, ids=ids)
         
-        scores = {}
-        for idx, score in keyword_results:
-            scores[idx] = scores.get(idx, 0) + score * keyword_weight
+        exclude = self._vector_exclude()
+        if self.ann_index is not None:
+            return self.ann_index.search(
+                self.vectors, query_embedding, top_k,
+                nprobe=nprobe, exclude=exclude
+            )
+        return self.vectors.search(query_embedding, top_k, exclude=exclude)
+    
+    def _vector_exclude(self) -> Optional[np.ndarray]:
+        if not self.deleted:
+            return None
+        exclude = self.deleted.to_array()
+        return exclude[exclude < len(self.vectors)]
+    
+    def _prefer_ivf(self, ids: np.ndarray, nprobe: Optional[int]) -> bool:
+        n_lists = len(self.ann_index.lists)
+        probed_fraction = min(nprobe or self.ann_index.nprobe, n_lists) / n_lists
+        return len(ids) > len(self.vectors) * probed_fraction
+    
+    def keyword_search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filters: Optional[Dict] = None,
+        term_stats: Optional[Dict] = None
+    ) -> List[List[Tuple[int, float]]]:
+        if not len(self.keyword_index):
+            return [[] for _ in queries]
+        
+        ids = self.filter_ids(filters)
+        if ids is not None:
+            if not len(ids):
+                return [[] for _ in queries]
+            allowed = self._allowed_mask(ids, len(self.keyword_index))
+            return self.keyword_index.search_batch(queries, top_k, term_stats=term_stats, allowed=allowed)
+        
+        exclude = self.deleted.to_array() if self.deleted else None
+        return self.keyword_index.search_batch(queries, top_k, exclude=exclude, term_stats=term_stats)
+    
+    def vector_search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[List[Tuple[int, float]]]:
+        if not len(self.vectors):
+            return [[] for _ in query_embeddings]
         
-        for idx, score in vector_results:
-            scores[idx] = scores.get(idx, 0) + score * vector_weight
+        if self.ann_index is not None:
+            return [
+                self.vector_search(query_embedding, top_k, nprobe=nprobe, filters=filters)
+                for query_embedding in query_embeddings
+            ]
         
-        sorted_results = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        ids = self.filter_ids(filters)
+        if ids is not None:
+            return self.vectors.search_batch(query_embeddings, top_k, ids=ids[ids < len(self.vectors)])
+        return self.vectors.search_batch(query_embeddings, top_k, exclude=self._vector_exclude())
+    
+    def hybrid_search(
+        self,
+        query: str,
+        query_embedding: List[float],
+        top_k: int = 5,
+        keyword_weight: float = 0.3,
+        vector_weight: float = 0.7,
+        filters: Optional[Dict] = None
+    ) -> List[ChunkView]:
+        keyword_results = self.keyword_search(query, top_k * 2, filters=filters)
+        vector_results = self.vector_search(query_embedding, top_k * 2, filters=filters)
         
-        results = []
-        for idx, score in sorted_results:
-            result = self.documents[idx].copy()
-            result['score'] = float(score)
-            result['rank'] = len(results) + 1
-            results.append(result)
+        return fuse_results(self.documents, keyword_results, vector_results, top_k, keyword_weight, vector_weight)
+    
+    def hybrid_search_batch(
+        self,
+        queries: List[str],
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        keyword_weight: float = 0.3,
+        vector_weight: float = 0.7,
+        filters: Optional[Dict] = None
+    ) -> List[List[ChunkView]]:
+        keyword_batches = self.keyword_search_batch(queries, top_k * 2, filters=filters)
+        vector_batches = self.vector_search_batch(query_embeddings, top_k * 2, filters=filters)
         
-        return results
+        return [
+            fuse_results(self.documents, keyword_results, vector_results, top_k, keyword_weight, vector_weight)
+            for keyword_results, vector_results in zip(keyword_batches, vector_batches)
+        ]
+    
+    def tombstone_ratio(self) -> float:
+        return len(self.deleted) / len(self.documents) if self.documents else 0.0
     
     def get_document_count(self) -> int:
-        return len(self.documents)
+        return len(self.documents) - len(self.deleted)
     
     def clear_index(self):
-        self.documents = []
-        self.document_vectors = None
-        self.embeddings = []
-        self.is_fitted = False
+        self._reset()
+
+
+def fuse_results(
+    documents: ChunkStore,
+    keyword_results: List[Tuple[int, float]],
+    vector_results: List[Tuple[int, float]],
+    top_k: int,
+    keyword_weight: float,
+    vector_weight: float
+) -> List[ChunkView]:
+    scores = {}
+    max_keyword_score = keyword_results[0][1] if keyword_results else 1.0
+    for idx, score in keyword_results:
+        scores[idx] = scores.get(idx, 0) + score / max_keyword_score * keyword_weight
+    
+    for idx, score in vector_results:
+        scores[idx] = scores.get(idx, 0) + score * vector_weight
+    
+    sorted_results = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+    
+    return [
+        documents.view(idx, float(score), rank)
+        for rank, (idx, score) in enumerate(sorted_results, start=1)
+    ]
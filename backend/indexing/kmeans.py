@@ -0,0 +1,52 @@
+import numpy as np
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray, spherical: bool = True, batch_size: int = 8192) -> np.ndarray:
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    centroid_norms = None if spherical else np.einsum('ij,ij->i', centroids, centroids)
+    
+    for start in range(0, len(vectors), batch_size):
+        similarity = vectors[start:start + batch_size] @ centroids.T
+        if spherical:
+            assignment[start:start + batch_size] = np.argmax(similarity, axis=1)
+        else:
+            assignment[start:start + batch_size] = np.argmin(centroid_norms - 2 * similarity, axis=1)
+    
+    return assignment
+
+
+def kmeans(
+    vectors: np.ndarray,
+    k: int,
+    iterations: int = 10,
+    spherical: bool = True,
+    seed: int = 0
+) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = assign(vectors, centroids, spherical)
+        order = np.argsort(assignment, kind='stable')
+        counts = np.bincount(assignment, minlength=k)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts[filled])[:-1]])
+        
+        sums = np.zeros_like(centroids)
+        sums[filled] = np.add.reduceat(vectors[order], starts, axis=0)
+        
+        empty = np.flatnonzero(counts == 0)
+        if spherical:
+            if len(empty):
+                sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+        else:
+            centroids[filled] = sums[filled] / counts[filled, None]
+            if len(empty):
+                centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    
+    return centroids
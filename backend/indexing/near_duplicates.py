@@ -0,0 +1,171 @@
+from collections import defaultdict
+from pathlib import Path
+import re
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import xxhash
+
+from backend.indexing.persistence import load_array, read_json, save_array, write_json
+
+
+MERSENNE_PRIME = (1 << 31) - 1
+SHINGLE_PATTERN = re.compile(r"\w+")
+LOCATION_FIELDS = ("start_char", "end_char", "page_start", "page_end", "section")
+RECALL_MARGIN = 0.1
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    shapes = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    recall_first = [shape for shape in shapes if (1 / shape[0]) ** (1 / shape[1]) <= threshold - RECALL_MARGIN]
+    return max(recall_first, key=lambda shape: shape[1]) if recall_first else (num_perm, 1)
+
+
+class NearDuplicateIndex:
+    
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, shingle_size: int = 3, seed: int = 42):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        
+        self.signatures: Dict[Tuple[str, int], np.ndarray] = {}
+        self.references: Dict[Tuple[str, int], List[Dict]] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[Tuple[str, int]]] = defaultdict(list)
+        self._owned: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+        self._referenced: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+    
+    def signature(self, text: str) -> np.ndarray:
+        tokens = SHINGLE_PATTERN.findall(text.lower())
+        size = min(self.shingle_size, len(tokens)) or 1
+        shingles = {" ".join(tokens[i:i + size]) for i in range(max(len(tokens) - size + 1, 1))}
+        hashes = np.fromiter((xxhash.xxh32_intdigest(shingle) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+        hashes %= np.uint64(MERSENNE_PRIME)
+        
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % np.uint64(MERSENNE_PRIME)
+        return permuted.min(axis=1).astype(np.uint32)
+    
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+    
+    def find(self, signature: np.ndarray) -> Optional[Tuple[str, int]]:
+        candidates = sorted({key for band_key in self._band_keys(signature) for key in self._buckets.get(band_key, ())})
+        if not candidates:
+            return None
+        
+        similarities = (np.stack([self.signatures[key] for key in candidates]) == signature).mean(axis=1)
+        best = int(np.argmax(similarities))
+        return candidates[best] if similarities[best] >= self.threshold else None
+    
+    def add(self, key: Tuple[str, int], signature: np.ndarray, references: Optional[List[Dict]] = None):
+        self.signatures[key] = signature
+        self.references[key] = []
+        self._owned[key[0]].append(key)
+        for band_key in self._band_keys(signature):
+            self._buckets[band_key].append(key)
+        for reference in references or []:
+            self._reference(key, reference)
+    
+    def _reference(self, key: Tuple[str, int], reference: Dict):
+        self.references[key].append(reference)
+        self._referenced[reference["path_key"]].append(key)
+    
+    @staticmethod
+    def location(path_key: str, chunk: Dict) -> Dict:
+        reference = {"path_key": path_key, "chunk_index": chunk["chunk_index"]}
+        for field in LOCATION_FIELDS:
+            if field in chunk:
+                reference[field] = chunk[field]
+        if "metadata" in chunk:
+            reference["metadata"] = chunk["metadata"]
+        return reference
+    
+    def deduplicate(self, path_key: str, chunks: List[Dict]) -> List[Dict]:
+        unique = []
+        for chunk in chunks:
+            signature = self.signature(chunk["text"])
+            match = self.find(signature)
+            if match is None:
+                self.add((path_key, chunk["chunk_index"]), signature)
+                unique.append(chunk)
+            else:
+                self._reference(match, self.location(path_key, chunk))
+        return unique
+    
+    def forget(self, path_key: str) -> List[Tuple[Tuple[str, int], np.ndarray, List[Dict]]]:
+        for key in set(self._referenced.pop(path_key, [])):
+            if key in self.references:
+                self.references[key] = [reference for reference in self.references[key] if reference["path_key"] != path_key]
+        
+        orphaned = []
+        for key in self._owned.pop(path_key, []):
+            signature = self.signatures.pop(key)
+            for band_key in self._band_keys(signature):
+                bucket = self._buckets[band_key]
+                bucket.remove(key)
+                if not bucket:
+                    del self._buckets[band_key]
+            references = self.references.pop(key)
+            if references:
+                orphaned.append((key, signature, references))
+        return orphaned
+    
+    def references_from(self, path_key: str) -> List[Tuple[Tuple[str, int], Dict]]:
+        return [
+            (key, reference)
+            for key in dict.fromkeys(self._referenced.get(path_key, []))
+            for reference in self.references.get(key, [])
+            if reference["path_key"] == path_key
+        ]
+    
+    def duplicates_of(self, path_key: str, chunk_index: int) -> List[Dict]:
+        return self.references.get((path_key, chunk_index), [])
+    
+    def clear(self):
+        self.signatures.clear()
+        self.references.clear()
+        self._buckets.clear()
+        self._owned.clear()
+        self._referenced.clear()
+    
+    def get_stats(self) -> Dict:
+        duplicates = sum(len(references) for references in self.references.values())
+        return {
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "rows": self.rows,
+            "representatives": len(self.signatures),
+            "duplicates": duplicates,
+            "duplicate_ratio": duplicates / (duplicates + len(self.signatures)) if self.signatures else 0.0
+        }
+    
+    def save(self, directory: Path):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        keys = list(self.signatures)
+        signatures = np.array([self.signatures[key] for key in keys], dtype=np.uint32).reshape(len(keys), self.num_perm)
+        save_array(directory, "signatures", signatures)
+        write_json(directory / "representatives.json", {
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+            "shingle_size": self.shingle_size,
+            "keys": [list(key) for key in keys],
+            "references": [self.references[key] for key in keys]
+        })
+    
+    def load(self, directory: Path):
+        directory = Path(directory)
+        state = read_json(directory / "representatives.json")
+        if (state["threshold"], state["num_perm"], state["shingle_size"]) != (self.threshold, self.num_perm, self.shingle_size):
+            raise ValueError("Near-duplicate index was built with different settings")
+        
+        signatures = load_array(directory, "signatures", mmap=False)
+        self.clear()
+        for (path_key, chunk_index), signature, references in zip(state["keys"], signatures, state["references"]):
+            self.add((path_key, chunk_index), signature, references)
@@ -1,7 +1,9 @@
-import pathway as pw
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 import json
+import unicodedata
+import threading
 import time
 from datetime import datetime
 import sys
@@ -9,8 +11,22 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from backend.ingestion.document_processor import DocumentProcessor
-from backend.indexing.embeddings import EmbeddingGenerator, TextChunker
+from backend.ingestion.provenance import ProvenanceIndex
+from backend.indexing.bm25_index import stop_words
+from backend.indexing.chunk_store import ChunkView
+from backend.indexing.embedding_batcher import EmbeddingBatcher
+from backend.indexing.embedding_cache import EmbeddingCache
+from backend.indexing.embedding_pool import EmbeddingPool
+from backend.indexing.embeddings import EmbeddingGenerator, TextChunker, TokenTextChunker
 from backend.indexing.hybrid_search import HybridSearchEngine
+from backend.indexing.lru_cache import LRUCache
+from backend.indexing.near_duplicates import NearDuplicateIndex
+from backend.indexing.segmented_search import SegmentedSearchEngine
+from backend.indexing.sharded_search import ShardedSearchEngine
+
+
+SEARCH_INDEX_DIR = "search_index"
+NEAR_DUPLICATES_DIR = "near_duplicates"
 
 
 class PathwayDocumentPipeline:
@@ -20,19 +36,99 @@ class PathwayDocumentPipeline:
         documents_path: str = "backend/data/documents/",
         index_path: str = "backend/data/index/",
         chunk_size: int = 500,
-        chunk_overlap: int = 50
+        chunk_overlap: int = 50,
+        vector_index: str = "exact",
+        vector_storage: str = "float32",
+        search_shards: int = 0,
+        index_segments: bool = False,
+        compaction_threshold: float = 0.2,
+        embedding_cache_size: int = 512 * 1024 * 1024,
+        parse_cache: bool = True,
+        query_batch_size: int = 32,
+        query_batch_wait_ms: float = 2.0,
+        embedding_workers: int = 0,
+        query_cache_size: int = 1024,
+        query_cache_ttl: Optional[float] = 3600.0,
+        embedding_backend: str = "torch",
+        chunking: str = "words",
+        dedup_threshold: Optional[float] = None
     ):
         self.documents_path = Path(documents_path)
         self.index_path = Path(index_path)
         self.index_path.mkdir(parents=True, exist_ok=True)
         
-        self.processor = DocumentProcessor()
-        self.chunker = TextChunker(chunk_size=chunk_size, overlap=chunk_overlap)
-        self.embedder = EmbeddingGenerator()
-        self.search_engine = HybridSearchEngine()
+        self.processor = DocumentProcessor(cache_dir=str(self.index_path / "parse_cache") if parse_cache else None)
+        self.embedder = EmbeddingGenerator(
+            backend=embedding_backend,
+            onnx_dir=str(self.index_path / "onnx_model") if embedding_backend == "onnx" else None
+        )
+        if chunking == "tokens":
+            self.chunker = TokenTextChunker(self.embedder, chunk_size=chunk_size, overlap=chunk_overlap)
+        elif chunking == "words":
+            self.chunker = TextChunker(chunk_size=chunk_size, overlap=chunk_overlap)
+        else:
+            raise ValueError(f"Unknown chunking mode: {chunking}")
+        self.embedding_cache = None
+        if embedding_cache_size:
+            self.embedding_cache = EmbeddingCache(
+                self.index_path / "embedding_cache.sqlite",
+                self.embedder.fingerprint,
+                max_bytes=embedding_cache_size
+            )
+        self.query_cache = LRUCache(query_cache_size, query_cache_ttl) if query_cache_size else None
+        self.deduplicator = NearDuplicateIndex(threshold=dedup_threshold) if dedup_threshold else None
+        self._promoted: Dict[str, List[Dict]] = {}
+        self.query_batcher = None
+        if query_batch_size > 1:
+            self.query_batcher = EmbeddingBatcher(self.embedder, max_batch_size=query_batch_size, max_wait_ms=query_batch_wait_ms)
+        if search_shards and index_segments:
+            raise ValueError("search_shards and index_segments cannot be combined")
+        
+        if index_segments:
+            self.search_engine = SegmentedSearchEngine(
+                self.index_path / SEARCH_INDEX_DIR,
+                vector_index=vector_index,
+                vector_storage=vector_storage
+            )
+        else:
+            engine_class = HybridSearchEngine
+            engine_options = {
+                "rescore_path": str(self.index_path / "vectors.f32"),
+                "text_path": str(self.index_path / "chunk_text.arena")
+            }
+            if search_shards:
+                engine_class = ShardedSearchEngine
+                engine_options = {"n_shards": search_shards, "directory": str(self.index_path / "shards")}
+            self.search_engine = engine_class(
+                vector_index=vector_index,
+                vector_storage=vector_storage,
+                **engine_options
+            )
         
-        self.indexed_documents = []
+        self.embedding_workers = embedding_workers
+        self.compaction_threshold = compaction_threshold
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        self._compaction_thread = None
+        
+        self.indexed_documents: Dict[int, Dict] = {}
+        self._path_index: Dict[str, int] = {}
+        self._next_doc_id = 0
         self.last_update = None
+        self._recover_documents()
+    
+    def warmup(self) -> Dict[str, float]:
+        timings = {}
+        steps = [
+            ("embedding_model", self.embedder.warmup),
+            ("keyword_tokenizer", stop_words),
+            ("ocr", self.processor.warmup)
+        ]
+        for name, step in steps:
+            start = time.perf_counter()
+            step()
+            timings[name] = time.perf_counter() - start
+        return timings
     
     def process_document(self, file_path: str) -> Optional[Dict]:
         try:
@@ -58,76 +154,265 @@ class PathwayDocumentPipeline:
             metadata["total_pages"] = doc_result.get("total_pages", 0)
         
         chunks = self.chunker.chunk_text(doc_result["full_text"], metadata)
-        return chunks
+        return ProvenanceIndex.from_result(doc_result).annotate(chunks)
     
-    def embed_chunks(self, chunks: List[Dict]) -> List[Dict]:
-        texts = [chunk["text"] for chunk in chunks]
-        embeddings = self.embedder.generate_batch(texts)
+    def _lookup_embeddings(self, texts: List[str]) -> Tuple[List, List[str]]:
+        if self.embedding_cache is None:
+            return [None] * len(texts), list(dict.fromkeys(texts))
+        
+        embeddings = self.embedding_cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        return embeddings, missing
+    
+    def _attach_embeddings(self, chunks: List[Dict], embeddings: List, missing: List[str], generated) -> List[Dict]:
+        if missing and self.embedding_cache is not None:
+            self.embedding_cache.put_many(missing, generated)
         
+        generated = dict(zip(missing, generated))
         for chunk, embedding in zip(chunks, embeddings):
-            chunk["embedding"] = embedding
+            chunk["embedding"] = generated[chunk["text"]] if embedding is None else embedding
+            chunk.pop("token_ids", None)
         
         return chunks
     
-    def index_document(self, file_path: str) -> Dict:
-        start_time = time.time()
-        
+    @staticmethod
+    def _embedding_inputs(chunks: List[Dict], missing: List[str]) -> List:
+        token_ids = {chunk["text"]: chunk["token_ids"] for chunk in chunks if "token_ids" in chunk}
+        if missing and all(text in token_ids for text in missing):
+            return [token_ids[text] for text in missing]
+        return missing
+    
+    def embed_chunks(self, chunks: List[Dict]) -> List[Dict]:
+        embeddings, missing = self._lookup_embeddings([chunk["text"] for chunk in chunks])
+        generated = self.embedder.generate_inputs(self._embedding_inputs(chunks, missing)) if missing else []
+        return self._attach_embeddings(chunks, embeddings, missing, generated)
+    
+    def _prepare_document(self, file_path: str) -> Tuple[Optional[Dict], List[Dict], Optional[Dict]]:
         doc_result = self.process_document(file_path)
         if not doc_result:
-            return {"success": False, "error": "Failed to process document"}
+            return None, [], {"success": False, "error": "Failed to process document"}
         
         chunks = self.chunk_document(doc_result)
         if not chunks:
-            return {"success": False, "error": "No chunks generated"}
+            return doc_result, [], {"success": False, "error": "No chunks generated"}
         
-        chunks = self.embed_chunks(chunks)
+        if self.deduplicator is not None:
+            chunks = self._deduplicate(file_path, chunks)
         
-        doc_id = len(self.indexed_documents)
-        doc_entry = {
-            "doc_id": doc_id,
-            "file_name": doc_result["file_name"],
-            "file_path": str(file_path),
-            "file_type": doc_result["file_type"],
-            "chunks": chunks,
-            "chunk_count": len(chunks),
-            "indexed_at": datetime.now().isoformat(),
-            "processing_time": time.time() - start_time
-        }
+        return doc_result, chunks, None
+    
+    def _deduplicate(self, file_path: str, chunks: List[Dict]) -> List[Dict]:
+        path_key = self._path_key(file_path)
+        with self._lock:
+            self._promote(self.deduplicator.forget(path_key))
+            return self.deduplicator.deduplicate(path_key, chunks)
+    
+    def _promote(self, orphaned: List) -> int:
+        promoted = 0
+        sources: Dict[int, Dict[int, ChunkView]] = {}
+        for (path_key, chunk_index), signature, references in orphaned:
+            doc_id = self._path_index.get(path_key)
+            if doc_id is None:
+                continue
+            if doc_id not in sources:
+                sources[doc_id] = {view["chunk_index"]: view for view in self.search_engine.document_chunks(doc_id)}
+            source = sources[doc_id].get(chunk_index)
+            if source is None:
+                continue
+            
+            reference, *rest = references
+            chunk = source.to_dict()
+            for field in ("doc_id", "file_name", "start_char", "end_char", "page_start", "page_end", "section"):
+                chunk.pop(field, None)
+            chunk.update({field: value for field, value in reference.items() if field != "path_key"})
+            
+            target = reference["path_key"]
+            self.deduplicator.add((target, reference["chunk_index"]), signature, rest)
+            target_id = self._path_index.get(target)
+            if target_id is None:
+                self._promoted.setdefault(target, []).append(chunk)
+            else:
+                self.search_engine.add_chunks(self._engine_chunks(self.indexed_documents[target_id], self.embed_chunks([chunk])))
+                self.indexed_documents[target_id]["chunk_count"] += 1
+            promoted += 1
+        return promoted
+    
+    def index_document(self, file_path: str) -> Dict:
+        start_time = time.time()
         
-        self.indexed_documents.append(doc_entry)
-        self.last_update = datetime.now()
+        doc_result, chunks, error = self._prepare_document(file_path)
+        if error:
+            return error
         
-        self._rebuild_search_index()
+        return self._store_document(file_path, doc_result, self.embed_chunks(chunks), start_time)
+    
+    def _store_document(self, file_path: str, doc_result: Dict, chunks: List[Dict], start_time: float) -> Dict:
+        with self._lock:
+            promoted = self._promoted.pop(self._path_key(file_path), [])
+            if promoted:
+                chunks = sorted(chunks + self.embed_chunks(promoted), key=lambda chunk: chunk["chunk_index"])
+            
+            doc_id = self._path_index.get(self._path_key(file_path))
+            replaced = doc_id is not None
+            if replaced:
+                self._remove(doc_id)
+            else:
+                doc_id = self._next_doc_id
+                self._next_doc_id += 1
+            
+            doc_entry = {
+                "doc_id": doc_id,
+                "file_name": doc_result["file_name"],
+                "file_path": str(file_path),
+                "file_type": doc_result["file_type"],
+                "file_mtime": Path(file_path).stat().st_mtime,
+                "chunk_count": len(chunks),
+                "indexed_at": datetime.now().isoformat(),
+                "processing_time": time.time() - start_time
+            }
+            
+            self.indexed_documents[doc_id] = doc_entry
+            self._path_index[self._path_key(file_path)] = doc_id
+            self.last_update = datetime.now()
+            
+            self.search_engine.add_chunks(self._engine_chunks(doc_entry, chunks))
+        
+        if replaced:
+            self._schedule_compaction()
         
         return {
             "success": True,
             "doc_id": doc_id,
             "file_name": doc_result["file_name"],
             "chunks": len(chunks),
+            "replaced": replaced,
             "processing_time": doc_entry["processing_time"]
         }
     
-    def _rebuild_search_index(self):
-        all_chunks = []
-        for doc in self.indexed_documents:
-            for chunk in doc["chunks"]:
-                chunk_with_doc = chunk.copy()
-                chunk_with_doc["doc_id"] = doc["doc_id"]
-                chunk_with_doc["file_name"] = doc["file_name"]
-                all_chunks.append(chunk_with_doc)
+    def reindex_document(self, file_path: str) -> Dict:
+        if not Path(file_path).exists():
+            return self.remove_document(file_path)
+        return self.index_document(file_path)
+    
+    def remove_document(self, document: Union[int, str]) -> Dict:
+        with self._lock:
+            if isinstance(document, int):
+                doc_id = document
+            else:
+                doc_id = self._path_index.get(self._path_key(document))
+            
+            if doc_id is None or doc_id not in self.indexed_documents:
+                return {"success": False, "error": "Document not indexed"}
+            
+            file_name = self.indexed_documents[doc_id]["file_name"]
+            if self.deduplicator is not None:
+                self._promote(self.deduplicator.forget(self._path_key(self.indexed_documents[doc_id]["file_path"])))
+            chunks_removed = self._remove(doc_id)
+            self.last_update = datetime.now()
+        
+        self._schedule_compaction()
+        
+        return {
+            "success": True,
+            "doc_id": doc_id,
+            "file_name": file_name,
+            "chunks_removed": chunks_removed
+        }
+    
+    def _remove(self, doc_id: int) -> int:
+        doc = self.indexed_documents.pop(doc_id)
+        self._path_index.pop(self._path_key(doc["file_path"]), None)
+        return self.search_engine.remove_doc(doc_id)
+    
+    @staticmethod
+    def _path_key(file_path: str) -> str:
+        return str(Path(file_path).resolve())
+    
+    def _schedule_compaction(self):
+        if self.search_engine.tombstone_ratio() < self.compaction_threshold:
+            return
         
-        if all_chunks:
-            self.search_engine.index_documents(all_chunks)
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(target=self._compact_in_background, daemon=True)
+            self._compaction_thread.start()
+    
+    def _compact_in_background(self):
+        while True:
+            self.compact_index()
+            ratio = self.search_engine.tombstone_ratio()
+            if not ratio or ratio < self.compaction_threshold:
+                return
+    
+    def wait_for_compaction(self, timeout: Optional[float] = None):
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join(timeout)
+    
+    def close(self):
+        self.wait_for_compaction()
+        if self.query_batcher is not None:
+            self.query_batcher.close()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+        if isinstance(self.search_engine, (SegmentedSearchEngine, ShardedSearchEngine)):
+            self.search_engine.close()
+    
+    def __enter__(self) -> "PathwayDocumentPipeline":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def _engine_chunks(self, doc: Dict, chunks: List[Dict]) -> List[Dict]:
+        engine_chunks = []
+        for chunk in chunks:
+            chunk_with_doc = chunk.copy()
+            chunk_with_doc["doc_id"] = doc["doc_id"]
+            chunk_with_doc["file_name"] = doc["file_name"]
+            engine_chunks.append(chunk_with_doc)
+        return engine_chunks
+    
+    def get_document_chunks(self, doc_id: int) -> List[ChunkView]:
+        with self._lock:
+            return self.search_engine.document_chunks(doc_id)
+    
+    def compact_index(self):
+        with self._compaction_lock:
+            if isinstance(self.search_engine, (SegmentedSearchEngine, ShardedSearchEngine)):
+                self.search_engine.compact()
+                return
+            
+            with self._lock:
+                engine = self.search_engine
+                snapshot = engine.begin_compaction()
+            try:
+                compacted = snapshot.compacted()
+            except Exception:
+                with self._lock:
+                    engine.abort_compaction()
+                raise
+            with self._lock:
+                engine.finish_compaction(snapshot, compacted)
     
     def index_all_documents(self) -> Dict:
         if not self.documents_path.exists():
             return {"success": False, "error": "Documents path does not exist"}
         
-        results = []
-        for file_path in self.documents_path.rglob("*"):
-            if file_path.is_file() and self.processor.is_supported(str(file_path)):
-                result = self.index_document(str(file_path))
-                results.append(result)
+        file_paths = [
+            str(file_path) for file_path in self.documents_path.rglob("*")
+            if file_path.is_file() and self.processor.is_supported(str(file_path))
+        ]
+        if self.embedding_workers > 1 and file_paths:
+            results = self._index_documents_parallel(file_paths)
+        else:
+            results = [self.index_document(file_path) for file_path in file_paths]
+        
+        if any(r.get("success") for r in results):
+            with self._lock:
+                self.search_engine.ensure_ann_index()
+            self._schedule_compaction()
         
         return {
             "success": True,
@@ -137,33 +422,167 @@ class PathwayDocumentPipeline:
             "results": results
         }
     
+    def _index_documents_parallel(self, file_paths: List[str]) -> List[Dict]:
+        def prepared_documents():
+            for file_path in file_paths:
+                start_time = time.time()
+                doc_result, chunks, error = self._prepare_document(file_path)
+                embeddings, missing = self._lookup_embeddings([chunk["text"] for chunk in chunks])
+                yield (file_path, doc_result, chunks, embeddings, missing, error, start_time), self._embedding_inputs(chunks, missing)
+        
+        self.embedder.prepare()
+        results = []
+        with EmbeddingPool(
+            self.embedder.model_name,
+            workers=self.embedding_workers,
+            generator_options=self.embedder.options()
+        ) as pool:
+            for (file_path, doc_result, chunks, embeddings, missing, error, start_time), generated in pool.map(prepared_documents()):
+                if error:
+                    results.append(error)
+                    continue
+                
+                chunks = self._attach_embeddings(chunks, embeddings, missing, generated)
+                results.append(self._store_document(file_path, doc_result, chunks, start_time))
+        
+        return results
+    
+    @staticmethod
+    def _query_key(query: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", query).split())
+    
+    def _embed_queries(self, queries: List[str]) -> List:
+        keys = [self._query_key(query) for query in queries]
+        if self.query_cache is None:
+            embeddings = [None] * len(keys)
+        else:
+            embeddings = [self.query_cache.get(key) for key in keys]
+        
+        missing = list(dict.fromkeys(key for key, embedding in zip(keys, embeddings) if embedding is None))
+        if not missing:
+            return embeddings
+        
+        if len(missing) == 1 and self.query_batcher is not None:
+            generated = {missing[0]: self.query_batcher.embed(missing[0])}
+        else:
+            generated = dict(zip(missing, self.embedder.generate_batch(missing)))
+        
+        if self.query_cache is not None:
+            for key, embedding in generated.items():
+                self.query_cache.put(key, embedding)
+        
+        return [generated[key] if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
+    
     def search(
         self,
         query: str,
         top_k: int = 5,
         keyword_weight: float = 0.3,
-        vector_weight: float = 0.7
+        vector_weight: float = 0.7,
+        filters: Optional[Dict] = None,
+        fields: Optional[Sequence[str]] = None
     ) -> List[Dict]:
-        query_embedding = self.embedder.generate(query)
-        
-        results = self.search_engine.hybrid_search(
-            query=query,
-            query_embedding=query_embedding,
-            top_k=top_k,
-            keyword_weight=keyword_weight,
-            vector_weight=vector_weight
-        )
+        query_embedding = self._embed_queries([query])[0]
         
-        return results
+        with self._engine_lock():
+            with self._lock:
+                engine_filters = self._engine_filters(filters)
+            results = self.search_engine.hybrid_search(
+                query=query,
+                query_embedding=query_embedding,
+                top_k=top_k,
+                keyword_weight=keyword_weight,
+                vector_weight=vector_weight,
+                filters=engine_filters
+            )
+            with self._lock:
+                return [self._with_duplicates(result.to_dict(fields)) for result in results]
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        keyword_weight: float = 0.3,
+        vector_weight: float = 0.7,
+        filters: Optional[Dict] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> List[List[Dict]]:
+        if not queries:
+            return []
+        
+        query_embeddings = self._embed_queries(queries)
+        
+        with self._engine_lock():
+            with self._lock:
+                engine_filters = self._engine_filters(filters)
+            result_batches = self.search_engine.hybrid_search_batch(
+                queries=queries,
+                query_embeddings=query_embeddings,
+                top_k=top_k,
+                keyword_weight=keyword_weight,
+                vector_weight=vector_weight,
+                filters=engine_filters
+            )
+            with self._lock:
+                return [[self._with_duplicates(result.to_dict(fields)) for result in results] for results in result_batches]
+    
+    def _engine_lock(self):
+        if isinstance(self.search_engine, (SegmentedSearchEngine, ShardedSearchEngine)):
+            return nullcontext()
+        return self._lock
+    
+    def _engine_filters(self, filters: Optional[Dict]) -> Optional[Union[Dict, List[Dict]]]:
+        if not filters or self.deduplicator is None:
+            return filters
+        
+        clauses: Dict[int, set] = {}
+        for doc in self.indexed_documents.values():
+            if not all(self._matches(doc.get(field), filters[field]) for field in filters if field != "chunk_index"):
+                continue
+            for (path_key, chunk_index), reference in self.deduplicator.references_from(self._path_key(doc["file_path"])):
+                owner = self._path_index.get(path_key)
+                if owner is not None and self._matches(reference["chunk_index"], filters.get("chunk_index")):
+                    clauses.setdefault(owner, set()).add(chunk_index)
+        
+        if not clauses:
+            return filters
+        return [filters] + [{"doc_id": owner, "chunk_index": sorted(indexes)} for owner, indexes in clauses.items()]
+    
+    @staticmethod
+    def _matches(value, allowed) -> bool:
+        if allowed is None:
+            return True
+        if isinstance(allowed, (list, tuple, set, frozenset)):
+            return value in allowed
+        return value == allowed
+    
+    def _with_duplicates(self, record: Dict) -> Dict:
+        if self.deduplicator is None or "doc_id" not in record or "chunk_index" not in record:
+            return record
+        
+        doc = self.indexed_documents.get(record["doc_id"])
+        references = self.deduplicator.duplicates_of(self._path_key(doc["file_path"]), record["chunk_index"]) if doc else []
+        if references:
+            record["duplicates"] = [
+                {field: value for field, value in reference.items() if field != "path_key"}
+                for reference in references
+            ]
+        return record
     
     def get_stats(self) -> Dict:
-        total_chunks = sum(doc["chunk_count"] for doc in self.indexed_documents)
+        total_chunks = sum(doc["chunk_count"] for doc in self.indexed_documents.values())
         
         return {
             "total_documents": len(self.indexed_documents),
             "total_chunks": total_chunks,
+            "tombstone_ratio": self.search_engine.tombstone_ratio(),
             "last_update": self.last_update.isoformat() if self.last_update else None,
-            "embedding_dimension": self.embedder.get_dimension(),
+            "embedding_dimension": self.embedder.get_dimension() if self.embedder.is_loaded else None,
+            "embedding_cache": self.embedding_cache.get_stats() if self.embedding_cache else None,
+            "parse_cache": self.processor.cache.get_stats() if self.processor.cache else None,
+            "query_cache": self.query_cache.get_stats() if self.query_cache else None,
+            "query_batcher": self.query_batcher.get_stats() if self.query_batcher else None,
+            "near_duplicates": self.deduplicator.get_stats() if self.deduplicator else None,
             "documents": [
                 {
                     "doc_id": doc["doc_id"],
@@ -172,28 +591,34 @@ class PathwayDocumentPipeline:
                     "chunks": doc["chunk_count"],
                     "indexed_at": doc["indexed_at"]
                 }
-                for doc in self.indexed_documents
+                for doc in self.indexed_documents.values()
             ]
         }
     
     def save_index(self):
         index_file = self.index_path / "index_metadata.json"
         
-        metadata = {
-            "last_update": self.last_update.isoformat() if self.last_update else None,
-            "total_documents": len(self.indexed_documents),
-            "documents": [
-                {
-                    "doc_id": doc["doc_id"],
-                    "file_name": doc["file_name"],
-                    "file_path": doc["file_path"],
-                    "file_type": doc["file_type"],
-                    "chunk_count": doc["chunk_count"],
-                    "indexed_at": doc["indexed_at"]
-                }
-                for doc in self.indexed_documents
-            ]
-        }
+        with self._lock:
+            metadata = {
+                "last_update": self.last_update.isoformat() if self.last_update else None,
+                "total_documents": len(self.indexed_documents),
+                "next_doc_id": self._next_doc_id,
+                "documents": [
+                    {
+                        "doc_id": doc["doc_id"],
+                        "file_name": doc["file_name"],
+                        "file_path": doc["file_path"],
+                        "file_type": doc["file_type"],
+                        "file_mtime": doc.get("file_mtime"),
+                        "chunk_count": doc["chunk_count"],
+                        "indexed_at": doc["indexed_at"]
+                    }
+                    for doc in self.indexed_documents.values()
+                ]
+            }
+            self.search_engine.save(self.index_path / SEARCH_INDEX_DIR)
+            if self.deduplicator is not None:
+                self.deduplicator.save(self.index_path / NEAR_DUPLICATES_DIR)
         
         with open(index_file, 'w') as f:
             json.dump(metadata, f, indent=2)
@@ -208,6 +633,15 @@ class PathwayDocumentPipeline:
             with open(index_file, 'r') as f:
                 metadata = json.load(f)
             
+            if (self.index_path / SEARCH_INDEX_DIR).exists():
+                try:
+                    self._load_binary_index(metadata)
+                    self._refresh_changed_documents()
+                    return True
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Binary index unusable, re-indexing documents: {str(e)}")
+                    self.clear_index()
+            
             for doc_meta in metadata.get("documents", []):
                 if Path(doc_meta["file_path"]).exists():
                     self.index_document(doc_meta["file_path"])
@@ -217,7 +651,63 @@ class PathwayDocumentPipeline:
             print(f"Error loading index: {str(e)}")
             return False
     
+    def _load_binary_index(self, metadata: Dict):
+        with self._lock:
+            self.search_engine.load(self.index_path / SEARCH_INDEX_DIR)
+            if self.deduplicator is not None and (self.index_path / NEAR_DUPLICATES_DIR).exists():
+                self.deduplicator.load(self.index_path / NEAR_DUPLICATES_DIR)
+            
+            self.indexed_documents = {doc["doc_id"]: dict(doc) for doc in metadata.get("documents", [])}
+            self._path_index = {
+                self._path_key(doc["file_path"]): doc_id
+                for doc_id, doc in self.indexed_documents.items()
+            }
+            self._next_doc_id = metadata.get("next_doc_id", max(self.indexed_documents, default=-1) + 1)
+            last_update = metadata.get("last_update")
+            self.last_update = datetime.fromisoformat(last_update) if last_update else None
+            self._recover_documents()
+    
+    def _recover_documents(self):
+        with self._lock:
+            for doc_id in self.search_engine.document_ids():
+                if doc_id in self.indexed_documents:
+                    continue
+                
+                chunks = self.search_engine.document_chunks(doc_id)
+                metadata = chunks[0].get("metadata", {})
+                file_path = metadata.get("file_path")
+                if not file_path:
+                    continue
+                
+                self.indexed_documents[doc_id] = {
+                    "doc_id": doc_id,
+                    "file_name": chunks[0].get("file_name", metadata.get("file_name", "unknown")),
+                    "file_path": file_path,
+                    "file_type": metadata.get("file_type", "unknown"),
+                    "file_mtime": Path(file_path).stat().st_mtime if Path(file_path).exists() else None,
+                    "chunk_count": len(chunks),
+                    "indexed_at": datetime.now().isoformat(),
+                    "processing_time": 0.0
+                }
+                self._path_index[self._path_key(file_path)] = doc_id
+            
+            self._next_doc_id = max(self._next_doc_id, max(self.indexed_documents, default=-1) + 1)
+    
+    def _refresh_changed_documents(self):
+        for doc in list(self.indexed_documents.values()):
+            file_path = Path(doc["file_path"])
+            if not file_path.exists():
+                self.remove_document(doc["doc_id"])
+            elif file_path.stat().st_mtime != doc.get("file_mtime"):
+                self.reindex_document(str(file_path))
+    
     def clear_index(self):
-        self.indexed_documents = []
-        self.search_engine.clear_index()
-        self.last_update = None
+        with self._lock:
+            self.indexed_documents = {}
+            self._path_index = {}
+            self._next_doc_id = 0
+            self.search_engine.clear_index()
+            if self.deduplicator is not None:
+                self.deduplicator.clear()
+            self._promoted = {}
+            self.last_update = None
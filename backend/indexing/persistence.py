@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+import json
+import os
+import shutil
+import numpy as np
+
+
+INDEX_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+def save_array(directory: Path, name: str, array: np.ndarray):
+    np.save(Path(directory) / f"{name}.npy", np.ascontiguousarray(array))
+
+
+def replace_array(directory: Path, name: str, array: np.ndarray):
+    staging = Path(directory) / f"{name}.tmp.npy"
+    np.save(staging, np.ascontiguousarray(array))
+    os.replace(staging, Path(directory) / f"{name}.npy")
+
+
+def load_array(directory: Path, name: str, mmap: bool = True) -> np.ndarray:
+    return np.load(Path(directory) / f"{name}.npy", mmap_mode="r" if mmap else None)
+
+
+def write_json(path: Path, data: Dict):
+    staging = Path(f"{path}.tmp")
+    with open(staging, 'w') as f:
+        json.dump(data, f)
+    os.replace(staging, path)
+
+
+def read_json(path: Path) -> Dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_manifest(directory: Path, **fields):
+    write_json(Path(directory) / MANIFEST_FILE, {"format_version": INDEX_FORMAT_VERSION, **fields})
+
+
+def read_manifest(directory: Path) -> Dict:
+    path = Path(directory) / MANIFEST_FILE
+    if not path.exists():
+        raise FileNotFoundError(f"No index manifest in {directory}")
+    
+    manifest = read_json(path)
+    version = manifest.get("format_version")
+    if version != INDEX_FORMAT_VERSION:
+        raise ValueError(f"Unsupported index format version {version} (expected {INDEX_FORMAT_VERSION})")
+    return manifest
+
+
+@contextmanager
+def atomic_directory(path: Path) -> Iterator[Path]:
+    path = Path(path)
+    staging = path.with_name(path.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    
+    try:
+        yield staging
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    
+    previous = path.with_name(path.name + ".old")
+    shutil.rmtree(previous, ignore_errors=True)
+    if path.exists():
+        path.rename(previous)
+    staging.rename(path)
+    shutil.rmtree(previous, ignore_errors=True)
@@ -0,0 +1,362 @@
+from pathlib import Path
+from typing import Dict, Optional
+import copy
+import os
+import numpy as np
+
+from backend.indexing.growable import GrowableArray
+from backend.indexing.kmeans import assign, kmeans
+from backend.indexing.persistence import load_array, save_array
+
+
+SCORE_BLOCK_ROWS = 8192
+
+
+def _rows(array: np.ndarray, ids: Optional[np.ndarray]) -> np.ndarray:
+    return array if ids is None else array[ids]
+
+
+class FloatCodec:
+    
+    def __init__(self, dimension: int, dtype=np.float32, capacity: int = 1024):
+        self.dimension = dimension
+        self.codes = GrowableArray(dtype, width=dimension, capacity=capacity)
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    @property
+    def nbytes(self) -> int:
+        return len(self.codes) * self.dimension * self.codes.dtype.itemsize
+    
+    def add(self, vectors: np.ndarray):
+        self.codes.extend(vectors)
+    
+    def save(self, directory: Path, prefix: str) -> Dict:
+        save_array(directory, f"{prefix}codes", self.codes.view)
+        return {}
+    
+    @classmethod
+    def load(cls, directory: Path, prefix: str, dimension: int, params: Dict, mmap: bool = True) -> "FloatCodec":
+        codes = load_array(directory, f"{prefix}codes", mmap)
+        codec = cls(dimension, codes.dtype, capacity=1)
+        codec.codes = GrowableArray.from_array(codes)
+        return codec
+    
+    def take(self, ids: np.ndarray) -> "FloatCodec":
+        subset = FloatCodec(self.dimension, self.codes.dtype, capacity=max(len(ids), 1))
+        subset.codes.extend(self.codes.view[ids])
+        return subset
+    
+    def decode(self, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        return _rows(self.codes.view, ids).astype(np.float32, copy=False)
+    
+    def score(self, query: np.ndarray, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        codes = _rows(self.codes.view, ids)
+        if codes.dtype == np.float32:
+            return codes @ query
+        
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            scores[start:start + SCORE_BLOCK_ROWS] = codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32) @ query
+        return scores
+    
+    def score_batch(self, queries: np.ndarray, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        codes = _rows(self.codes.view, ids)
+        if codes.dtype == np.float32:
+            return queries @ codes.T
+        
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            scores[:, start:start + SCORE_BLOCK_ROWS] = queries @ codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32).T
+        return scores
+
+
+class Int8Codec:
+    
+    def __init__(self, dimension: int, capacity: int = 1024):
+        self.dimension = dimension
+        self.codes = GrowableArray(np.int8, width=dimension, capacity=capacity)
+        self.scales = GrowableArray(np.float32, capacity=capacity)
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    @property
+    def nbytes(self) -> int:
+        return len(self.codes) * (self.dimension + 4)
+    
+    def add(self, vectors: np.ndarray):
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        self.codes.extend(np.rint(vectors / scales[:, None]))
+        self.scales.extend(scales)
+    
+    def save(self, directory: Path, prefix: str) -> Dict:
+        save_array(directory, f"{prefix}codes", self.codes.view)
+        save_array(directory, f"{prefix}scales", self.scales.view)
+        return {}
+    
+    @classmethod
+    def load(cls, directory: Path, prefix: str, dimension: int, params: Dict, mmap: bool = True) -> "Int8Codec":
+        codec = cls(dimension, capacity=1)
+        codec.codes = GrowableArray.from_array(load_array(directory, f"{prefix}codes", mmap))
+        codec.scales = GrowableArray.from_array(load_array(directory, f"{prefix}scales", mmap))
+        return codec
+    
+    def take(self, ids: np.ndarray) -> "Int8Codec":
+        subset = Int8Codec(self.dimension, capacity=max(len(ids), 1))
+        subset.codes.extend(self.codes.view[ids])
+        subset.scales.extend(self.scales.view[ids])
+        return subset
+    
+    def decode(self, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        codes = _rows(self.codes.view, ids).astype(np.float32)
+        return codes * _rows(self.scales.view, ids)[:, None]
+    
+    def score(self, query: np.ndarray, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        codes = _rows(self.codes.view, ids)
+        scales = _rows(self.scales.view, ids)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + SCORE_BLOCK_ROWS] = (block @ query) * scales[start:start + SCORE_BLOCK_ROWS]
+        return scores
+    
+    def score_batch(self, queries: np.ndarray, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        codes = _rows(self.codes.view, ids)
+        scales = _rows(self.scales.view, ids)
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + SCORE_BLOCK_ROWS] = (queries @ block.T) * scales[start:start + SCORE_BLOCK_ROWS]
+        return scores
+
+
+class PQCodec:
+    
+    def __init__(
+        self,
+        dimension: int,
+        n_subvectors: Optional[int] = None,
+        n_centroids: int = 256,
+        train_size: int = 10_000,
+        iterations: int = 15,
+        capacity: int = 1024
+    ):
+        n_subvectors = n_subvectors or max(1, dimension // 8)
+        if dimension % n_subvectors:
+            raise ValueError(f"Dimension {dimension} is not divisible by {n_subvectors} subvectors")
+        
+        self.dimension = dimension
+        self.n_subvectors = n_subvectors
+        self.subvector_size = dimension // n_subvectors
+        self.n_centroids = n_centroids
+        self.train_size = train_size
+        self.iterations = iterations
+        self.codebooks = None
+        self.codes = GrowableArray(np.uint8, width=n_subvectors, capacity=capacity)
+        self.pending: Optional[GrowableArray] = GrowableArray(np.float32, width=dimension, capacity=capacity)
+    
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+    
+    @property
+    def state(self) -> str:
+        return "trained" if self.is_trained else "untrained"
+    
+    def __len__(self) -> int:
+        return len(self.codes) if self.is_trained else len(self.pending)
+    
+    @property
+    def nbytes(self) -> int:
+        if not self.is_trained:
+            return len(self.pending) * self.dimension * 4
+        return len(self.codes) * self.n_subvectors + self.codebooks.nbytes
+    
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.reshape(len(vectors), self.n_subvectors, self.subvector_size)
+    
+    def train(self, vectors: Optional[np.ndarray] = None):
+        if self.is_trained:
+            raise RuntimeError("PQ codec is already trained")
+        
+        vectors = self.pending.view if vectors is None else np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            raise ValueError("Cannot train a PQ codec without vectors")
+        if len(vectors) > self.train_size:
+            sample = np.random.default_rng(0).choice(len(vectors), self.train_size, replace=False)
+            vectors = vectors[np.sort(sample)]
+        
+        subvectors = self._split(vectors)
+        self.codebooks = np.stack([
+            kmeans(subvectors[:, j], self.n_centroids, iterations=self.iterations, spherical=False, seed=j)
+            for j in range(self.n_subvectors)
+        ])
+        
+        if len(self.pending):
+            self.codes.extend(self.encode(self.pending.view))
+        self.pending = None
+    
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        subvectors = self._split(vectors)
+        codes = np.empty((len(vectors), self.n_subvectors), dtype=np.uint8)
+        for j in range(self.n_subvectors):
+            codes[:, j] = assign(subvectors[:, j], self.codebooks[j], spherical=False)
+        return codes
+    
+    def add(self, vectors: np.ndarray):
+        if self.is_trained:
+            self.codes.extend(self.encode(vectors))
+            return
+        
+        self.pending.extend(vectors)
+        if len(self.pending) >= self.n_centroids:
+            self.train()
+    
+    def save(self, directory: Path, prefix: str) -> Dict:
+        if self.is_trained:
+            save_array(directory, f"{prefix}codes", self.codes.view)
+            save_array(directory, f"{prefix}codebooks", self.codebooks)
+        else:
+            save_array(directory, f"{prefix}pending", self.pending.view)
+        
+        return {
+            "n_subvectors": self.n_subvectors,
+            "n_centroids": self.n_centroids,
+            "train_size": self.train_size,
+            "iterations": self.iterations,
+            "trained": self.is_trained
+        }
+    
+    @classmethod
+    def load(cls, directory: Path, prefix: str, dimension: int, params: Dict, mmap: bool = True) -> "PQCodec":
+        codec = cls(
+            dimension, params["n_subvectors"], params["n_centroids"],
+            params["train_size"], params["iterations"], capacity=1
+        )
+        if params["trained"]:
+            codec.codes = GrowableArray.from_array(load_array(directory, f"{prefix}codes", mmap))
+            codec.codebooks = load_array(directory, f"{prefix}codebooks", mmap=False)
+            codec.pending = None
+        else:
+            codec.pending = GrowableArray.from_array(load_array(directory, f"{prefix}pending", mmap))
+        return codec
+    
+    def take(self, ids: np.ndarray) -> "PQCodec":
+        subset = PQCodec(
+            self.dimension, self.n_subvectors, self.n_centroids,
+            self.train_size, self.iterations, capacity=max(len(ids), 1)
+        )
+        if self.is_trained:
+            subset.codebooks = self.codebooks
+            subset.codes.extend(self.codes.view[ids])
+            subset.pending = None
+        else:
+            subset.pending.extend(self.pending.view[ids])
+        return subset
+    
+    def decode(self, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        if not self.is_trained:
+            return _rows(self.pending.view, ids)
+        
+        codes = _rows(self.codes.view, ids)
+        return np.concatenate([self.codebooks[j][codes[:, j]] for j in range(self.n_subvectors)], axis=1)
+    
+    def _lookup_tables(self, query: np.ndarray) -> np.ndarray:
+        return np.einsum('jcs,js->jc', self.codebooks, query.reshape(self.n_subvectors, self.subvector_size))
+    
+    def _adc(self, tables: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        flat = tables.ravel()
+        offsets = np.arange(self.n_subvectors) * tables.shape[1]
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS].astype(np.int64) + offsets
+            scores[start:start + SCORE_BLOCK_ROWS] = flat[block].sum(axis=1)
+        return scores
+    
+    def score(self, query: np.ndarray, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        if not self.is_trained:
+            return _rows(self.pending.view, ids) @ query
+        return self._adc(self._lookup_tables(query), _rows(self.codes.view, ids))
+    
+    def score_batch(self, queries: np.ndarray, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        if not self.is_trained:
+            return queries @ _rows(self.pending.view, ids).T
+        if not len(queries):
+            return np.empty((0, len(self) if ids is None else len(ids)), dtype=np.float32)
+        return np.stack([self.score(query, ids) for query in queries])
+
+
+class VectorFile:
+    
+    def __init__(self, path: str, dimension: int):
+        self.path = Path(path)
+        self.dimension = dimension
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_bytes(b"")
+        self._size = 0
+        self._map = None
+    
+    @classmethod
+    def open(cls, path: str, dimension: int) -> "VectorFile":
+        vector_file = cls.__new__(cls)
+        vector_file.path = Path(path)
+        vector_file.dimension = dimension
+        vector_file._size = vector_file.path.stat().st_size // (4 * dimension)
+        vector_file._map = None
+        return vector_file
+    
+    def take(self, ids: np.ndarray, path: str) -> "VectorFile":
+        rows = self.rows(ids) if len(ids) else np.empty((0, self.dimension), dtype=np.float32)
+        Path(path).write_bytes(np.ascontiguousarray(rows, dtype=np.float32).tobytes())
+        return VectorFile.open(path, self.dimension)
+    
+    def replace(self, path: str):
+        self._map = None
+        os.replace(self.path, path)
+        self.path = Path(path)
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def append(self, vectors: np.ndarray):
+        with open(self.path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self._size += len(vectors)
+        self._map = None
+    
+    def rows(self, ids: np.ndarray) -> np.ndarray:
+        if self._map is None:
+            self._map = np.memmap(self.path, dtype=np.float32, mode="r", shape=(self._size, self.dimension))
+        return np.asarray(self._map[ids])
+
+
+def snapshot_codec(codec):
+    frozen = copy.copy(codec)
+    for name, value in vars(codec).items():
+        if isinstance(value, GrowableArray):
+            setattr(frozen, name, value.snapshot())
+    return frozen
+
+
+CODECS = {"float32": FloatCodec, "float16": FloatCodec, "int8": Int8Codec, "pq": PQCodec}
+
+
+def make_codec(storage: str, dimension: int, capacity: int = 1024, **options):
+    if storage == "float32":
+        return FloatCodec(dimension, np.float32, capacity)
+    if storage == "float16":
+        return FloatCodec(dimension, np.float16, capacity)
+    if storage == "int8":
+        return Int8Codec(dimension, capacity)
+    if storage == "pq":
+        return PQCodec(dimension, capacity=capacity, **options)
+    raise ValueError(f"Unknown vector storage: {storage}")
+
+
+def load_codec(storage: str, directory: Path, prefix: str, dimension: int, params: Dict, mmap: bool = True):
+    if storage not in CODECS:
+        raise ValueError(f"Unknown vector storage: {storage}")
+    return CODECS[storage].load(directory, prefix, dimension, params, mmap)
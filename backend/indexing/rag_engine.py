@@ -1,9 +1,11 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence, Union
 import sys
+import time
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
+from backend.indexing.lru_cache import LRUCache
 from backend.indexing.pathway_pipeline import PathwayDocumentPipeline
 from backend.synonyms.manager import SynonymManager
 from backend.synonyms.query_expander import QueryExpander
@@ -14,15 +16,34 @@ class RAGEngine:
     def __init__(
         self,
         documents_path: str = "backend/data/documents/",
-        index_path: str = "backend/data/index/"
+        index_path: str = "backend/data/index/",
+        query_cache_size: int = 1024,
+        query_cache_ttl: Optional[float] = 3600.0
     ):
+        start = time.perf_counter()
         self.pipeline = PathwayDocumentPipeline(
             documents_path=documents_path,
-            index_path=index_path
+            index_path=index_path,
+            query_cache_size=query_cache_size,
+            query_cache_ttl=query_cache_ttl
         )
+        pipeline_ready = time.perf_counter()
         self.synonym_manager = SynonymManager()
         self.query_expander = QueryExpander(self.synonym_manager)
+        self.expansion_cache = LRUCache(query_cache_size, query_cache_ttl) if query_cache_size else None
+        self._expansion_version = self.synonym_manager.version
         self.is_indexed = False
+        
+        self.startup_report = {
+            "pipeline_init": pipeline_ready - start,
+            "synonyms_load": time.perf_counter() - pipeline_ready,
+            "init_total": time.perf_counter() - start,
+            "warmup": None
+        }
+    
+    def warmup(self) -> Dict:
+        self.startup_report["warmup"] = self.pipeline.warmup()
+        return self.startup_report
     
     def initialize(self) -> Dict:
         result = self.pipeline.index_all_documents()
@@ -35,7 +56,38 @@ class RAGEngine:
         top_k: int = 5,
         use_synonyms: bool = True,
         keyword_weight: float = 0.3,
-        vector_weight: float = 0.7
+        vector_weight: float = 0.7,
+        filters: Optional[Dict] = None,
+        fields: Optional[Sequence[str]] = None
+    ) -> Dict:
+        if not self.is_indexed:
+            return {
+                "success": False,
+                "error": "Index not initialized. Call initialize() first."
+            }
+        
+        expanded_terms, expanded_query = self._expand_question(question, use_synonyms)
+        
+        results = self.pipeline.search(
+            query=expanded_query,
+            top_k=top_k,
+            keyword_weight=keyword_weight,
+            vector_weight=vector_weight,
+            filters=filters,
+            fields=fields
+        )
+        
+        return self._build_response(question, expanded_terms, expanded_query, results, use_synonyms)
+    
+    def query_batch(
+        self,
+        questions: List[str],
+        top_k: int = 5,
+        use_synonyms: bool = True,
+        keyword_weight: float = 0.3,
+        vector_weight: float = 0.7,
+        filters: Optional[Dict] = None,
+        fields: Optional[Sequence[str]] = None
     ) -> Dict:
         if not self.is_indexed:
             return {
@@ -43,6 +95,44 @@ class RAGEngine:
                 "error": "Index not initialized. Call initialize() first."
             }
         
+        expansions = [self._expand_question(question, use_synonyms) for question in questions]
+        
+        result_batches = self.pipeline.search_batch(
+            queries=[expanded_query for _, expanded_query in expansions],
+            top_k=top_k,
+            keyword_weight=keyword_weight,
+            vector_weight=vector_weight,
+            filters=filters,
+            fields=fields
+        )
+        
+        responses = [
+            self._build_response(question, expanded_terms, expanded_query, results, use_synonyms)
+            for question, (expanded_terms, expanded_query), results
+            in zip(questions, expansions, result_batches)
+        ]
+        
+        return {
+            "success": True,
+            "responses": responses,
+            "query_count": len(responses)
+        }
+    
+    def _expand_question(self, question: str, use_synonyms: bool):
+        if use_synonyms and self.expansion_cache is not None:
+            if self._expansion_version != self.synonym_manager.version:
+                self.expansion_cache.clear()
+                self._expansion_version = self.synonym_manager.version
+            
+            expansion = self.expansion_cache.get(question)
+            if expansion is None:
+                expansion = self._expand(question, use_synonyms)
+                self.expansion_cache.put(question, expansion)
+            return expansion
+        
+        return self._expand(question, use_synonyms)
+    
+    def _expand(self, question: str, use_synonyms: bool):
         expanded_terms = {}
         if use_synonyms:
             expanded_terms = self.query_expander.expand_search_terms(question)
@@ -54,13 +144,16 @@ class RAGEngine:
                 synonym_additions.extend(variants[:3])
             expanded_query = f"{question} {' '.join(synonym_additions)}"
         
-        results = self.pipeline.search(
-            query=expanded_query,
-            top_k=top_k,
-            keyword_weight=keyword_weight,
-            vector_weight=vector_weight
-        )
-        
+        return expanded_terms, expanded_query
+    
+    def _build_response(
+        self,
+        question: str,
+        expanded_terms: Dict,
+        expanded_query: str,
+        results: List[Dict],
+        use_synonyms: bool
+    ) -> Dict:
         return {
             "success": True,
             "question": question,
@@ -74,6 +167,12 @@ class RAGEngine:
         result = self.pipeline.index_document(file_path)
         return result
     
+    def remove_document(self, document: Union[int, str]) -> Dict:
+        return self.pipeline.remove_document(document)
+    
+    def reindex_document(self, file_path: str) -> Dict:
+        return self.pipeline.reindex_document(file_path)
+    
     def get_stats(self) -> Dict:
         pipeline_stats = self.pipeline.get_stats()
         synonym_stats = self.synonym_manager.get_stats()
@@ -81,6 +180,8 @@ class RAGEngine:
         return {
             "pipeline": pipeline_stats,
             "synonyms": synonym_stats,
+            "expansion_cache": self.expansion_cache.get_stats() if self.expansion_cache else None,
+            "startup": self.startup_report,
             "is_indexed": self.is_indexed
         }
     
@@ -88,9 +189,10 @@ class RAGEngine:
         self,
         question: str,
         top_k: int = 5,
-        context_window: int = 2
+        context_window: int = 2,
+        filters: Optional[Dict] = None
     ) -> Dict:
-        query_result = self.query(question, top_k=top_k)
+        query_result = self.query(question, top_k=top_k, filters=filters)
         
         if not query_result.get("success"):
             return query_result
@@ -98,6 +200,7 @@ class RAGEngine:
         enriched_results = []
         for result in query_result["results"]:
             enriched = result.copy()
+            enriched["source"] = self._source_label(result)
             
             doc_id = result.get("doc_id")
             chunk_index = result.get("chunk_index")
@@ -114,34 +217,44 @@ class RAGEngine:
         query_result["results"] = enriched_results
         return query_result
     
+    @staticmethod
+    def _source_label(result: Dict) -> str:
+        label = result.get("file_name", "unknown")
+        page_start, page_end = result.get("page_start"), result.get("page_end")
+        if page_start is not None:
+            label += f", p. {page_start}" if page_start == page_end else f", pp. {page_start}-{page_end}"
+        if result.get("section"):
+            label += f" ({result['section']})"
+        return label
+    
     def _get_surrounding_chunks(
         self,
         doc_id: int,
         chunk_index: int,
         window: int
     ) -> Dict:
-        if doc_id >= len(self.pipeline.indexed_documents):
+        chunks = self.pipeline.get_document_chunks(doc_id)
+        if not chunks:
             return {"before": [], "after": []}
         
-        doc = self.pipeline.indexed_documents[doc_id]
-        chunks = doc["chunks"]
-        
-        before = []
-        for i in range(max(0, chunk_index - window), chunk_index):
-            if i < len(chunks):
-                before.append(chunks[i]["text"])
+        position = chunk_index
+        if chunk_index >= len(chunks) or chunks[chunk_index]["chunk_index"] != chunk_index:
+            chunks = sorted(chunks, key=lambda chunk: chunk["chunk_index"])
+            position = next((i for i, chunk in enumerate(chunks) if chunk["chunk_index"] == chunk_index), None)
+            if position is None:
+                return {"before": [], "after": []}
         
-        after = []
-        for i in range(chunk_index + 1, min(len(chunks), chunk_index + window + 1)):
-            after.append(chunks[i]["text"])
+        before = [chunk["text"] for chunk in chunks[max(0, position - window):position]]
+        after = [chunk["text"] for chunk in chunks[position + 1:position + window + 1]]
         
         return {"before": before, "after": after}
     
     def get_document_summary(self, doc_id: int) -> Optional[Dict]:
-        if doc_id >= len(self.pipeline.indexed_documents):
+        doc = self.pipeline.indexed_documents.get(doc_id)
+        if doc is None:
             return None
         
-        doc = self.pipeline.indexed_documents[doc_id]
+        chunks = self.pipeline.get_document_chunks(doc_id)
         
         return {
             "doc_id": doc["doc_id"],
@@ -149,9 +262,18 @@ class RAGEngine:
             "file_type": doc["file_type"],
             "chunk_count": doc["chunk_count"],
             "indexed_at": doc["indexed_at"],
-            "first_chunk": doc["chunks"][0]["text"][:200] if doc["chunks"] else ""
+            "first_chunk": chunks[0]["text"][:200] if chunks else ""
         }
     
     def clear_index(self):
         self.pipeline.clear_index()
         self.is_indexed = False
+    
+    def close(self):
+        self.pipeline.close()
+    
+    def __enter__(self) -> "RAGEngine":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
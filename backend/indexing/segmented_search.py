@@ -0,0 +1,591 @@
+from bisect import bisect_right
+import math
+import os
+import copy
+from pathlib import Path
+import pickle
+import shutil
+import struct
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import zlib
+import numpy as np
+
+from backend.indexing.ann_index import IVFIndex
+from backend.indexing.bitmap_index import Bitmap, filter_fields
+from backend.indexing.bm25_index import combined_term_stats, tokenize
+from backend.indexing.chunk_store import ChunkView
+from backend.indexing.hybrid_search import HybridSearchEngine, fuse_results
+from backend.indexing.persistence import (
+    MANIFEST_FILE, atomic_directory, load_array, read_manifest, replace_array, write_manifest
+)
+
+
+WAL_HEADER = struct.Struct("<II")
+MERGE_BATCH_SIZE = 4096
+
+
+class WriteAheadLog:
+    
+    def __init__(self, path: Path, sync: bool = False):
+        self.path = Path(path)
+        self.sync = sync
+        self._file = open(self.path, "ab")
+    
+    def append(self, record: Tuple):
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.write(WAL_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+    
+    def close(self):
+        self._file.close()
+    
+    @staticmethod
+    def replay(path: Path) -> Iterator[Tuple]:
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(WAL_HEADER.size)
+                if len(header) < WAL_HEADER.size:
+                    break
+                
+                length, checksum = WAL_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    break
+                yield pickle.loads(payload)
+
+
+class SegmentSet:
+    
+    def __init__(self, segments: List[HybridSearchEngine]):
+        self.segments = segments
+        self.bases = np.cumsum([0] + [len(segment.documents) for segment in segments]).tolist()
+    
+    def __len__(self) -> int:
+        return self.bases[-1]
+    
+    def view(self, slot: int, score: Optional[float] = None, rank: Optional[int] = None) -> ChunkView:
+        position = bisect_right(self.bases, slot) - 1
+        return self.segments[position].documents.view(slot - self.bases[position], score, rank)
+    
+    def merge(self, segment_results: List[List[Tuple[int, float]]], top_k: int) -> List[Tuple[int, float]]:
+        merged = [
+            (self.bases[position] + slot, score)
+            for position, results in enumerate(segment_results)
+            for slot, score in results
+        ]
+        merged.sort(key=lambda result: (-result[1], result[0]))
+        return merged[:top_k]
+
+
+def _segment_number(name: str) -> int:
+    return int(name.split("_")[1])
+
+
+class SegmentedSearchEngine:
+    
+    def __init__(
+        self,
+        directory: str,
+        vector_index: str = "exact",
+        nprobe: int = 16,
+        vector_storage: str = "float32",
+        flush_threshold: int = 10_000,
+        merge_factor: int = 4,
+        sync: bool = False,
+        background: bool = True
+    ):
+        if vector_index not in ("exact", "ivf"):
+            raise ValueError(f"Unknown vector index: {vector_index}")
+        
+        self.directory = Path(directory)
+        self.vector_index = vector_index
+        self.nprobe = nprobe
+        self.vector_storage = vector_storage
+        self.flush_threshold = flush_threshold
+        self.merge_factor = merge_factor
+        self.sync = sync
+        self.background = background
+        self.mmap = True
+        
+        self._lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+        self._worker = None
+        self._error: Optional[Exception] = None
+        self._open()
+    
+    def _open(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segments: List[Tuple[str, HybridSearchEngine]] = []
+        self._persisted = set()
+        self._flush_queue: List[Tuple[str, HybridSearchEngine, List[Path]]] = []
+        self._pending_removals: Optional[List[int]] = None
+        self._next_segment = 0
+        
+        if (self.directory / MANIFEST_FILE).exists():
+            manifest = read_manifest(self.directory)
+            self.vector_index = manifest["vector_index"]
+            self.vector_storage = manifest["vector_storage"]
+            self.nprobe = manifest["nprobe"]
+            self._next_segment = manifest["next_segment"]
+            self._persisted = set(manifest["segments"])
+            self.segments = [(name, self._load_segment(name)) for name in manifest["segments"]]
+        
+        wal_paths = sorted(self.directory.glob("segment_*.wal"))
+        for entry in self.directory.iterdir():
+            name = entry.name.split(".")[0]
+            if entry.suffix == ".wal":
+                self._next_segment = max(self._next_segment, _segment_number(name) + 1)
+                if name in self._persisted:
+                    entry.unlink()
+            elif entry.is_dir():
+                if entry.name not in self._persisted:
+                    shutil.rmtree(entry, ignore_errors=True)
+            elif entry.name != MANIFEST_FILE and (name not in self._persisted or ".tmp" in entry.name):
+                entry.unlink()
+        
+        self._new_mutable()
+        replayed = [path for path in wal_paths if path.stem not in self._persisted]
+        for path in replayed:
+            for record in WriteAheadLog.replay(path):
+                self._apply(record)
+        self._mutable_wals = replayed + self._mutable_wals
+        
+        if len(self.mutable.documents) >= self.flush_threshold:
+            with self._lock:
+                self._rotate()
+    
+    def _allocate_name(self) -> str:
+        name = f"segment_{self._next_segment:06d}"
+        self._next_segment += 1
+        return name
+    
+    def _segment_options(self, name: str) -> Dict:
+        return {
+            "vector_index": self.vector_index,
+            "nprobe": self.nprobe,
+            "vector_storage": self.vector_storage,
+            "rescore_path": str(self.directory / f"{name}.f32") if self.vector_storage != "float32" else None
+        }
+    
+    def _new_mutable(self):
+        self.mutable_name = self._allocate_name()
+        self.mutable = HybridSearchEngine(**self._segment_options(self.mutable_name))
+        self.wal = WriteAheadLog(self.directory / f"{self.mutable_name}.wal", self.sync)
+        self._mutable_wals = [self.wal.path]
+    
+    def _load_segment(self, name: str) -> HybridSearchEngine:
+        path = self.directory / name
+        segment = HybridSearchEngine(
+            rescore_path=str(path / "rescore.f32") if self.vector_storage != "float32" else None
+        )
+        segment.load(path, self.mmap)
+        
+        if (self.directory / f"{name}.deleted.npy").exists():
+            segment.deleted.update(load_array(self.directory, f"{name}.deleted", mmap=False))
+            segment.doc_chunks = segment.documents.group_by('doc_id', exclude=segment.deleted.to_array())
+        return segment
+    
+    @staticmethod
+    def _wal_chunk(chunk: Dict) -> Dict:
+        if chunk.get('embedding') is None:
+            return chunk
+        return {**chunk, 'embedding': np.asarray(chunk['embedding'], dtype=np.float32)}
+    
+    def _apply(self, record: Tuple):
+        operation, payload = record
+        if operation == "add":
+            self.mutable.add_chunks(payload)
+        else:
+            self._remove(payload)
+    
+    def add_chunks(self, chunks: List[Dict]) -> List[int]:
+        if not chunks:
+            return []
+        
+        record = ("add", [self._wal_chunk(chunk) for chunk in chunks])
+        with self._lock:
+            self.wal.append(record)
+            base = sum(len(segment.documents) for _, segment in self.segments)
+            slots = self.mutable.add_chunks(chunks)
+            if len(self.mutable.documents) >= self.flush_threshold:
+                self._rotate()
+        
+        return [base + slot for slot in slots]
+    
+    def index_documents(self, documents: List[Dict]):
+        self.clear_index()
+        self.add_chunks(documents)
+    
+    def remove_doc(self, doc_id: int) -> int:
+        with self._lock:
+            self.wal.append(("remove", doc_id))
+            return self._remove(doc_id)
+    
+    def _remove(self, doc_id: int) -> int:
+        removed = self.mutable.remove_doc(doc_id)
+        for _, segment in self.segments:
+            removed += segment.remove_doc(doc_id)
+        if self._pending_removals is not None:
+            self._pending_removals.append(doc_id)
+        return removed
+    
+    def _rotate(self):
+        if not len(self.mutable.documents):
+            return
+        
+        self.wal.close()
+        self.segments.append((self.mutable_name, self.mutable))
+        self._flush_queue.append((self.mutable_name, self.mutable, self._mutable_wals))
+        self._new_mutable()
+        self._start_background()
+    
+    def _start_background(self):
+        if self._worker is not None:
+            return
+        self._error = None
+        if not self.background:
+            self._run_background()
+        else:
+            self._worker = threading.Thread(target=self._run_background, daemon=True)
+            self._worker.start()
+    
+    def _run_background(self):
+        while True:
+            with self._lock:
+                job = self._flush_queue[0] if self._flush_queue else None
+                selection = None if job is not None else self._select_merge()
+                if job is None and selection is None:
+                    self._worker = None
+                    return
+            
+            try:
+                if job is not None:
+                    self._flush_segment(*job)
+                else:
+                    self._merge(selection)
+            except Exception as e:
+                print(f"Segment maintenance failed: {str(e)}")
+                with self._lock:
+                    self._error = e
+                    self._pending_removals = None
+                    self._worker = None
+                return
+    
+    def _build_ann(self, segment: HybridSearchEngine):
+        if self.vector_index == "ivf" and len(segment.vectors):
+            ann_index = IVFIndex(nprobe=self.nprobe)
+            ann_index.build(segment.vectors.decode())
+            segment.ann_index = ann_index
+    
+    def _flush_segment(self, name: str, segment: HybridSearchEngine, wal_paths: List[Path]):
+        self._build_ann(segment)
+        with self._lock:
+            snapshot = copy.copy(segment)
+            snapshot.deleted = Bitmap(segment.deleted.to_array())
+            snapshot.doc_chunks = {doc_id: list(slots) for doc_id, slots in segment.doc_chunks.items()}
+        snapshot.save(self.directory / name)
+        loaded = self._load_segment(name)
+        
+        with self._lock:
+            loaded.deleted = segment.deleted
+            loaded.doc_chunks = segment.doc_chunks
+            position = next(i for i, (entry, _) in enumerate(self.segments) if entry == name)
+            self.segments[position] = (name, loaded)
+            self._persisted.add(name)
+            self._flush_queue.pop(0)
+            self._write_manifest()
+        
+        for path in wal_paths:
+            path.unlink(missing_ok=True)
+        (self.directory / f"{name}.f32").unlink(missing_ok=True)
+    
+    def _manifest_fields(self) -> Dict:
+        return {
+            "segments": [name for name, _ in self.segments if name in self._persisted],
+            "next_segment": self._next_segment,
+            "vector_index": self.vector_index,
+            "vector_storage": self.vector_storage,
+            "nprobe": self.nprobe
+        }
+    
+    def _write_manifest(self):
+        for name, segment in self.segments:
+            if name in self._persisted and segment.deleted:
+                replace_array(self.directory, f"{name}.deleted", segment.deleted.to_array())
+        write_manifest(self.directory, **self._manifest_fields())
+    
+    def _select_merge(self) -> Optional[List[str]]:
+        persisted = [(name, segment) for name, segment in self.segments if name in self._persisted]
+        for name, segment in persisted:
+            if segment.tombstone_ratio() >= 0.5:
+                return [name]
+        
+        tiers = [
+            max(0, int(math.log(max(segment.get_document_count(), 1) / self.flush_threshold, self.merge_factor)))
+            for _, segment in persisted
+        ]
+        for start in range(len(persisted) - self.merge_factor + 1):
+            if len(set(tiers[start:start + self.merge_factor])) == 1:
+                return [name for name, _ in persisted[start:start + self.merge_factor]]
+        return None
+    
+    def _merge(self, names: List[str]):
+        with self._merge_lock:
+            with self._lock:
+                segments = dict(self.segments)
+                if any(name not in segments or name not in self._persisted for name in names):
+                    return
+                entries = [segments[name] for name in names]
+                name = self._allocate_name()
+                self._pending_removals = []
+            
+            merged = HybridSearchEngine(**self._segment_options(name))
+            for segment in entries:
+                live = np.setdiff1d(np.arange(len(segment.documents)), segment.deleted.to_array(), assume_unique=True)
+                for start in range(0, len(live), MERGE_BATCH_SIZE):
+                    merged.add_chunks(segment.records(live[start:start + MERGE_BATCH_SIZE]))
+            
+            loaded = None
+            if len(merged.documents):
+                self._build_ann(merged)
+                merged.save(self.directory / name)
+                loaded = self._load_segment(name)
+            
+            with self._lock:
+                for doc_id in self._pending_removals:
+                    if loaded is not None:
+                        loaded.remove_doc(doc_id)
+                self._pending_removals = None
+                
+                position = next(i for i, (entry, _) in enumerate(self.segments) if entry == names[0])
+                self.segments = [entry for entry in self.segments if entry[0] not in names]
+                if loaded is not None:
+                    self.segments.insert(position, (name, loaded))
+                    self._persisted.add(name)
+                self._persisted.difference_update(names)
+                self._write_manifest()
+            
+            for old_name in names:
+                shutil.rmtree(self.directory / old_name, ignore_errors=True)
+                (self.directory / f"{old_name}.deleted.npy").unlink(missing_ok=True)
+            (self.directory / f"{name}.f32").unlink(missing_ok=True)
+    
+    def wait(self):
+        while True:
+            with self._lock:
+                worker = self._worker
+            if worker is None:
+                return
+            worker.join()
+    
+    def flush(self):
+        with self._lock:
+            self._rotate()
+            if self._flush_queue:
+                self._start_background()
+        self.wait()
+        
+        with self._lock:
+            if self._error is not None and self._flush_queue:
+                raise RuntimeError(f"Segment flush failed: {self._error}") from self._error
+            if not len(self.mutable.documents) and not self._flush_queue:
+                self._write_manifest()
+                self.wal.close()
+                for path in self._mutable_wals:
+                    path.unlink(missing_ok=True)
+                self.wal = WriteAheadLog(self.directory / f"{self.mutable_name}.wal", self.sync)
+                self._mutable_wals = [self.wal.path]
+    
+    def ensure_ann_index(self) -> bool:
+        return False
+    
+    def compact(self):
+        self.flush()
+        with self._lock:
+            names = [name for name, _ in self.segments if name in self._persisted]
+            needed = len(names) > 1 or any(segment.deleted for _, segment in self.segments)
+        if needed:
+            self._merge(names)
+    
+    def _snapshot(self) -> SegmentSet:
+        return SegmentSet([segment for _, segment in self.segments] + [self.mutable])
+    
+    def _search_snapshot(self, queries: Sequence[str] = (), filters: Optional[Dict] = None) -> SegmentSet:
+        terms = {term for query in queries for term in tokenize(query)}
+        fields = filter_fields(filters)
+        with self._lock:
+            segments = []
+            for _, segment in self.segments:
+                frozen = copy.copy(segment)
+                frozen.deleted = segment.deleted.copy()
+                segments.append(frozen)
+            segments.append(self.mutable.search_snapshot(terms, fields))
+        return SegmentSet(segments)
+    
+    def document_chunks(self, doc_id: int) -> List[ChunkView]:
+        with self._lock:
+            return [
+                view
+                for segment in self._snapshot().segments
+                for view in segment.document_chunks(doc_id)
+            ]
+    
+    def document_ids(self) -> List[int]:
+        with self._lock:
+            return sorted({doc_id for segment in self._snapshot().segments for doc_id in segment.doc_chunks})
+    
+    def _keyword_batches(
+        self,
+        segments: SegmentSet,
+        queries: List[str],
+        top_k: int,
+        filters: Optional[Dict]
+    ) -> List[List[Tuple[int, float]]]:
+        term_stats = combined_term_stats([segment.keyword_index for segment in segments.segments], " ".join(queries))
+        segment_batches = [
+            segment.keyword_search_batch(queries, top_k, filters, term_stats)
+            for segment in segments.segments
+        ]
+        return [
+            segments.merge([batch[i] for batch in segment_batches], top_k)
+            for i in range(len(queries))
+        ]
+    
+    def _vector_batches(
+        self,
+        segments: SegmentSet,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        nprobe: Optional[int],
+        filters: Optional[Dict]
+    ) -> List[List[Tuple[int, float]]]:
+        segment_batches = [
+            segment.vector_search_batch(query_embeddings, top_k, nprobe=nprobe, filters=filters)
+            for segment in segments.segments
+        ]
+        return [
+            segments.merge([batch[i] for batch in segment_batches], top_k)
+            for i in range(len(query_embeddings))
+        ]
+    
+    def keyword_search(
+        self,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[Dict] = None
+    ) -> List[Tuple[int, float]]:
+        return self.keyword_search_batch([query], top_k, filters)[0]
+    
+    def vector_search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Tuple[int, float]]:
+        return self.vector_search_batch([query_embedding], top_k, nprobe, filters)[0]
+    
+    def keyword_search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filters: Optional[Dict] = None
+    ) -> List[List[Tuple[int, float]]]:
+        return self._keyword_batches(self._search_snapshot(queries, filters), queries, top_k, filters)
+    
+    def vector_search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[List[Tuple[int, float]]]:
+        if not len(query_embeddings):
+            return []
+        return self._vector_batches(self._search_snapshot(filters=filters), query_embeddings, top_k, nprobe, filters)
+    
+    def hybrid_search(
+        self,
+        query: str,
+        query_embedding: List[float],
+        top_k: int = 5,
+        keyword_weight: float = 0.3,
+        vector_weight: float = 0.7,
+        filters: Optional[Dict] = None
+    ) -> List[ChunkView]:
+        return self.hybrid_search_batch([query], [query_embedding], top_k, keyword_weight, vector_weight, filters)[0]
+    
+    def hybrid_search_batch(
+        self,
+        queries: List[str],
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        keyword_weight: float = 0.3,
+        vector_weight: float = 0.7,
+        filters: Optional[Dict] = None
+    ) -> List[List[ChunkView]]:
+        if not queries:
+            return []
+        
+        segments = self._search_snapshot(queries, filters)
+        keyword_batches = self._keyword_batches(segments, queries, top_k * 2, filters)
+        vector_batches = self._vector_batches(segments, query_embeddings, top_k * 2, None, filters)
+        return [
+            fuse_results(segments, keyword_results, vector_results, top_k, keyword_weight, vector_weight)
+            for keyword_results, vector_results in zip(keyword_batches, vector_batches)
+        ]
+    
+    def tombstone_ratio(self) -> float:
+        with self._lock:
+            segments = self._snapshot().segments
+            total = sum(len(segment.documents) for segment in segments)
+            return sum(len(segment.deleted) for segment in segments) / total if total else 0.0
+    
+    def get_document_count(self) -> int:
+        with self._lock:
+            return sum(segment.get_document_count() for segment in self._snapshot().segments)
+    
+    def save(self, directory: str):
+        self.flush()
+        directory = Path(directory)
+        if directory.resolve() == self.directory.resolve():
+            return
+        
+        with self._lock, atomic_directory(directory) as staging:
+            for entry in self.directory.iterdir():
+                if entry.is_dir():
+                    shutil.copytree(entry, staging / entry.name)
+                elif entry.suffix != ".wal":
+                    shutil.copy2(entry, staging / entry.name)
+    
+    def load(self, directory: str, mmap: bool = True) -> Dict:
+        self.close()
+        self.directory = Path(directory)
+        self.mmap = mmap
+        self._open()
+        return self._manifest_fields()
+    
+    def clear_index(self):
+        self.wait()
+        with self._lock:
+            self.wal.close()
+            for entry in self.directory.iterdir():
+                if entry.is_dir():
+                    shutil.rmtree(entry, ignore_errors=True)
+                else:
+                    entry.unlink()
+            self._open()
+    
+    def close(self):
+        self.wait()
+        with self._lock:
+            self.wal.close()
+    
+    def __enter__(self) -> "SegmentedSearchEngine":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,643 @@
+from concurrent.futures import Future
+from itertools import count
+import multiprocessing
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+import weakref
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from backend.indexing.ann_index import IVFIndex
+from backend.indexing.bitmap_index import FILTER_FIELDS, Bitmap, MetadataIndex, field_value
+from backend.indexing.bm25_index import BM25Index, CorpusStatistics
+from backend.indexing.chunk_store import ChunkStore, ChunkView
+from backend.indexing.growable import GrowableArray
+from backend.indexing.hybrid_search import HybridSearchEngine, fuse_results
+from backend.indexing.persistence import atomic_directory, load_array, read_manifest, save_array, write_manifest
+from backend.indexing.quantization import VectorFile
+from backend.indexing.vector_store import VectorStore
+
+
+VECTOR_FILE = "vectors.f32"
+
+
+class ShardIndex(HybridSearchEngine):
+    
+    def __init__(self, vector_path: str, vector_index: str = "exact", nprobe: int = 16, vector_storage: str = "float32"):
+        self.vector_path = vector_path
+        super().__init__(vector_index, nprobe, vector_storage)
+    
+    def _reset(self):
+        self.keyword_index = BM25Index()
+        self.metadata_index = MetadataIndex()
+        self.vectors = VectorStore(storage=self.vector_storage)
+        self.ann_index = None
+        self.deleted = Bitmap()
+        self.statistics = CorpusStatistics()
+    
+    def add(
+        self,
+        start: int,
+        texts: List[str],
+        fields: List[Dict],
+        statistics: CorpusStatistics,
+        vector_count: int,
+        dimension: Optional[int]
+    ):
+        self.statistics.merge(statistics)
+        self.keyword_index.add(start, texts)
+        self.metadata_index.add(start, fields)
+        
+        vector_start = len(self.vectors)
+        if vector_count > vector_start:
+            self.vectors.attach(self.vector_path, dimension, vector_count)
+            if self.ann_index is not None:
+                self.ann_index.add(vector_start, self.vectors.decode(np.arange(vector_start, vector_count)))
+    
+    def remove(self, slots: np.ndarray):
+        self.deleted.update(slots)
+    
+    def compact(self, live: np.ndarray, vector_count: int, dimension: Optional[int]) -> CorpusStatistics:
+        self.keyword_index = self.keyword_index.take(live)
+        self.metadata_index = self.metadata_index.take(live)
+        self.deleted = Bitmap()
+        self.vectors = VectorStore(storage=self.vector_storage)
+        self.vectors.attach(self.vector_path, dimension, vector_count)
+        self.ann_index = None
+        self.ensure_ann_index()
+        return CorpusStatistics.from_index(self.keyword_index)
+    
+    def set_statistics(self, statistics: CorpusStatistics):
+        self.statistics = statistics
+    
+    def candidates(
+        self,
+        queries: List[Optional[str]],
+        query_embeddings: Optional[np.ndarray],
+        top_k: int,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> Tuple[List, List]:
+        texts = [query or "" for query in queries]
+        keyword_batches = self.keyword_search_batch(texts, top_k, filters, self.statistics.term_stats(" ".join(texts)))
+        if query_embeddings is None:
+            vector_batches = [[] for _ in queries]
+        else:
+            vector_batches = self.vector_search_batch(query_embeddings, top_k, nprobe=nprobe, filters=filters)
+        return keyword_batches, vector_batches
+    
+    def save(self, directory: str):
+        self.keyword_index.save(Path(directory))
+        if self.ann_index is not None:
+            self.ann_index.save(str(Path(directory) / "ivf.npz"))
+    
+    def load(
+        self,
+        directory: str,
+        mmap: bool,
+        statistics: CorpusStatistics,
+        vector_count: int,
+        dimension: Optional[int]
+    ):
+        directory = Path(directory)
+        self._reset()
+        self.statistics = statistics
+        self.keyword_index = BM25Index.load(directory, mmap)
+        self.metadata_index.add_store(ChunkStore.load(directory, mmap=True))
+        self.deleted = Bitmap(load_array(directory, "deleted", mmap=False))
+        self.vectors.attach(self.vector_path, dimension, vector_count)
+        if (directory / "ivf.npz").exists():
+            self.ann_index = IVFIndex.load(str(directory / "ivf.npz"))
+    
+    def clear_index(self):
+        self._reset()
+
+
+SHARD_COMMANDS = {
+    "add": ShardIndex.add,
+    "remove": ShardIndex.remove,
+    "compact": ShardIndex.compact,
+    "set_statistics": ShardIndex.set_statistics,
+    "build_ann_index": ShardIndex.build_ann_index,
+    "ensure_ann_index": ShardIndex.ensure_ann_index,
+    "clear_index": ShardIndex.clear_index,
+    "save": ShardIndex.save,
+    "load": ShardIndex.load,
+    "candidates": ShardIndex.candidates,
+}
+
+
+def _shard_worker(connection, shard_options: Dict):
+    shard = ShardIndex(**shard_options)
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        
+        request_id, command, args, kwargs = message
+        try:
+            result = SHARD_COMMANDS[command](shard, *args, **kwargs)
+            connection.send((request_id, True, result))
+        except Exception as e:
+            connection.send((request_id, False, f"{type(e).__name__}: {e}"))
+
+
+class ShardClient:
+    
+    def __init__(self, context, shard_options: Dict):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_shard_worker, args=(child_connection, shard_options), daemon=True)
+        self.process.start()
+        child_connection.close()
+        
+        self._request_ids = count()
+        self._send_lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._reader = threading.Thread(target=self._read_responses, daemon=True)
+        self._reader.start()
+    
+    def submit(self, command: str, *args, **kwargs) -> Future:
+        future = Future()
+        with self._send_lock:
+            request_id = next(self._request_ids)
+            self._pending[request_id] = future
+            self.connection.send((request_id, command, args, kwargs))
+        return future
+    
+    def _read_responses(self):
+        while True:
+            try:
+                request_id, ok, result = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            
+            future = self._pending.pop(request_id)
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(result))
+        
+        for request_id in list(self._pending):
+            self._pending.pop(request_id).set_exception(RuntimeError("Search shard exited"))
+    
+    def close(self, timeout: float = 5.0):
+        try:
+            with self._send_lock:
+                self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+
+
+class ShardedChunks:
+    
+    def __init__(self, stores: List[ChunkStore], shard_slots: Optional[List[np.ndarray]] = None):
+        self.stores = stores
+        self.locations = GrowableArray(np.int64, width=2)
+        if shard_slots is None:
+            self.shard_slots = [GrowableArray(np.int64) for _ in stores]
+            return
+        
+        self.shard_slots = [GrowableArray.from_array(slots) for slots in shard_slots]
+        self.locations.extend(np.empty((sum(len(slots) for slots in shard_slots), 2), dtype=np.int64))
+        for shard, slots in enumerate(shard_slots):
+            self.locations.view[slots] = np.column_stack([np.full(len(slots), shard), np.arange(len(slots))])
+    
+    def __len__(self) -> int:
+        return len(self.locations)
+    
+    def add(self, chunks: List[Dict]) -> List[Tuple[int, int, List[Dict]]]:
+        start = len(self)
+        slots = np.arange(start, start + len(chunks))
+        locations = np.empty((len(chunks), 2), dtype=np.int64)
+        batches = []
+        for shard, store in enumerate(self.stores):
+            positions = np.flatnonzero(slots % len(self.stores) == shard)
+            shard_chunks = [chunks[position] for position in positions]
+            local_start = store.add(shard_chunks)
+            locations[positions, 0] = shard
+            locations[positions, 1] = np.arange(local_start, local_start + len(positions))
+            self.shard_slots[shard].extend(slots[positions])
+            batches.append((shard, local_start, shard_chunks))
+        self.locations.extend(locations)
+        return batches
+    
+    def local_slots(self, slots: np.ndarray, shard: int) -> np.ndarray:
+        locations = self.locations.view[np.asarray(slots, dtype=np.int64)]
+        return locations[locations[:, 0] == shard, 1]
+    
+    def global_slots(self, shard: int, local_slots: List[int]) -> np.ndarray:
+        return self.shard_slots[shard].view[np.asarray(local_slots, dtype=np.int64)]
+    
+    def take(self, slots: np.ndarray) -> Tuple["ShardedChunks", List[np.ndarray]]:
+        new_slots = np.full(len(self), -1, dtype=np.int64)
+        new_slots[slots] = np.arange(len(slots))
+        stores, shard_slots, live = [], [], []
+        for shard, store in enumerate(self.stores):
+            remapped = new_slots[self.shard_slots[shard].view]
+            local_live = np.flatnonzero(remapped >= 0)
+            stores.append(store.take(local_live))
+            shard_slots.append(remapped[local_live])
+            live.append(local_live)
+        return ShardedChunks(stores, shard_slots), live
+    
+    def view(self, slot: int, score: Optional[float] = None, rank: Optional[int] = None) -> ChunkView:
+        shard, local_slot = self.locations.view[slot].tolist()
+        return self.stores[shard].view(local_slot, score, rank)
+
+
+class ShardedSearchEngine:
+    
+    def __init__(
+        self,
+        n_shards: Optional[int] = None,
+        vector_index: str = "exact",
+        nprobe: int = 16,
+        vector_storage: str = "float32",
+        directory: Optional[str] = None,
+        start_method: str = "spawn"
+    ):
+        if vector_index not in ("exact", "ivf"):
+            raise ValueError(f"Unknown vector index: {vector_index}")
+        
+        self.n_shards = n_shards or os.cpu_count() or 1
+        self.vector_index = vector_index
+        self.nprobe = nprobe
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix="shards.")
+            weakref.finalize(self, shutil.rmtree, directory, True)
+        self.directory = Path(directory)
+        self.shard_directories = [self.directory / f"shard_{shard}" for shard in range(self.n_shards)]
+        for shard_directory in self.shard_directories:
+            shard_directory.mkdir(parents=True, exist_ok=True)
+        
+        context = multiprocessing.get_context(start_method)
+        self.shards = [
+            ShardClient(context, {
+                "vector_path": str(shard_directory / VECTOR_FILE),
+                "vector_index": vector_index,
+                "nprobe": nprobe,
+                "vector_storage": vector_storage
+            })
+            for shard_directory in self.shard_directories
+        ]
+        self._lock = threading.RLock()
+        self._closed = False
+        self._reset()
+    
+    def _reset(self):
+        self.documents = ShardedChunks([ChunkStore(text_path=self._text_path(shard)) for shard in range(self.n_shards)])
+        for shard_directory in self.shard_directories:
+            (shard_directory / VECTOR_FILE).unlink(missing_ok=True)
+        self.vector_files: List[Optional[VectorFile]] = [None] * self.n_shards
+        self.dimension: Optional[int] = None
+        self.statistics = CorpusStatistics()
+        self.doc_chunks: Dict[int, List[int]] = {}
+        self.deleted = Bitmap()
+    
+    def _text_path(self, shard: int) -> str:
+        return str(self.shard_directories[shard] / "chunk_text.arena")
+    
+    def _ensure_open(self):
+        if self._closed:
+            raise RuntimeError("Sharded search engine is closed")
+    
+    def _broadcast(self, command: str, *args, **kwargs) -> List:
+        futures = [shard.submit(command, *args, **kwargs) for shard in self.shards]
+        return [future.result() for future in futures]
+    
+    def _vector_count(self, shard: int) -> int:
+        vector_file = self.vector_files[shard]
+        return 0 if vector_file is None else len(vector_file)
+    
+    def _append_vectors(self, shard: int, start: int, embeddings: List):
+        if all(embedding is None for embedding in embeddings):
+            return
+        
+        if self.dimension is None:
+            self.dimension = len(next(embedding for embedding in embeddings if embedding is not None))
+        vector_file = self.vector_files[shard]
+        if vector_file is None:
+            vector_file = self.vector_files[shard] = VectorFile(str(self.shard_directories[shard] / VECTOR_FILE), self.dimension)
+        
+        offset = start - len(vector_file)
+        block = np.zeros((offset + len(embeddings), self.dimension), dtype=np.float32)
+        for row, embedding in enumerate(embeddings, start=offset):
+            if embedding is not None:
+                block[row] = embedding
+        vector_file.append(VectorStore.normalize(block))
+    
+    def _index_stores(self):
+        deleted = self.deleted.to_array()
+        doc_chunks: Dict[int, List[int]] = {}
+        for shard, store in enumerate(self.documents.stores):
+            local_deleted = self.documents.local_slots(deleted, shard)
+            for doc_id, local_slots in store.group_by('doc_id', exclude=local_deleted).items():
+                doc_chunks.setdefault(doc_id, []).extend(self.documents.global_slots(shard, local_slots).tolist())
+        self.doc_chunks = {doc_id: sorted(slots) for doc_id, slots in doc_chunks.items()}
+    
+    def index_documents(self, documents: List[Dict]):
+        self.clear_index()
+        self.add_chunks(documents)
+    
+    def add_chunks(self, chunks: List[Dict]) -> List[int]:
+        if not chunks:
+            return []
+        
+        with self._lock:
+            self._ensure_open()
+            statistics = CorpusStatistics()
+            statistics.add([chunk['text'] for chunk in chunks])
+            self.statistics.merge(statistics)
+            
+            start = len(self.documents)
+            futures = []
+            for shard, local_start, shard_chunks in self.documents.add(chunks):
+                self._append_vectors(shard, local_start, [chunk.get('embedding') for chunk in shard_chunks])
+                futures.append(self.shards[shard].submit(
+                    "add",
+                    local_start,
+                    [chunk['text'] for chunk in shard_chunks],
+                    [{field: field_value(chunk, field) for field in FILTER_FIELDS} for chunk in shard_chunks],
+                    statistics,
+                    self._vector_count(shard),
+                    self.dimension
+                ))
+            
+            slots = list(range(start, start + len(chunks)))
+            for slot, chunk in zip(slots, chunks):
+                doc_id = chunk.get('doc_id')
+                if doc_id is not None:
+                    self.doc_chunks.setdefault(doc_id, []).append(slot)
+            for future in futures:
+                future.result()
+        
+        return slots
+    
+    def document_chunks(self, doc_id: int) -> List[ChunkView]:
+        with self._lock:
+            documents = self.documents
+            slots = list(self.doc_chunks.get(doc_id, []))
+        return [documents.view(slot) for slot in slots]
+    
+    def document_ids(self) -> List[int]:
+        with self._lock:
+            return sorted(self.doc_chunks)
+    
+    def remove_doc(self, doc_id: int) -> int:
+        with self._lock:
+            self._ensure_open()
+            slots = self.doc_chunks.pop(doc_id, [])
+            if slots:
+                futures = [
+                    shard.submit("remove", self.documents.local_slots(slots, position))
+                    for position, shard in enumerate(self.shards)
+                ]
+                for future in futures:
+                    future.result()
+            self.deleted.update(slots)
+        return len(slots)
+    
+    def compact(self):
+        with self._lock:
+            self._ensure_open()
+            live = np.setdiff1d(np.arange(len(self.documents)), self.deleted.to_array(), assume_unique=True)
+            documents, shard_live = self.documents.take(live)
+            futures = []
+            for shard, local_live in enumerate(shard_live):
+                vector_file = self.vector_files[shard]
+                if vector_file is not None:
+                    path = vector_file.path
+                    vector_file = vector_file.take(local_live[local_live < len(vector_file)], f"{path}.tmp")
+                    vector_file.replace(path)
+                    self.vector_files[shard] = vector_file
+                futures.append(self.shards[shard].submit("compact", local_live, self._vector_count(shard), self.dimension))
+            
+            statistics = CorpusStatistics()
+            for future in futures:
+                statistics.merge(future.result())
+            self._broadcast("set_statistics", statistics)
+            
+            self.documents = documents
+            self.statistics = statistics
+            self.deleted = Bitmap()
+            self._index_stores()
+    
+    def save(self, directory: str):
+        with self._lock, atomic_directory(directory) as staging:
+            self._ensure_open()
+            deleted = self.deleted.to_array()
+            futures = []
+            for shard, store in enumerate(self.documents.stores):
+                shard_directory = staging / f"shard_{shard}"
+                shard_directory.mkdir()
+                futures.append(self.shards[shard].submit("save", str(shard_directory)))
+                store.save(shard_directory)
+                save_array(shard_directory, "global_slots", self.documents.shard_slots[shard].view)
+                save_array(shard_directory, "deleted", self.documents.local_slots(deleted, shard))
+                if self.vector_files[shard] is not None:
+                    shutil.copyfile(self.vector_files[shard].path, shard_directory / VECTOR_FILE)
+            self.statistics.save(staging)
+            save_array(staging, "deleted", deleted)
+            for future in futures:
+                future.result()
+            
+            write_manifest(
+                staging,
+                n_shards=self.n_shards,
+                vector_index=self.vector_index,
+                nprobe=self.nprobe,
+                dimension=self.dimension,
+                chunk_count=len(self.documents)
+            )
+    
+    def load(self, directory: str, mmap: bool = True) -> Dict:
+        directory = Path(directory)
+        manifest = read_manifest(directory)
+        if manifest.get("n_shards") != self.n_shards:
+            raise ValueError(f"Index has {manifest.get('n_shards')} shards, engine has {self.n_shards}")
+        
+        with self._lock:
+            self._ensure_open()
+            self._reset()
+            self.dimension = manifest["dimension"]
+            self.statistics = CorpusStatistics.load(directory)
+            self.deleted = Bitmap(load_array(directory, "deleted", mmap=False))
+            
+            stores = []
+            shard_slots = []
+            futures = []
+            for shard, shard_directory in enumerate(self.shard_directories):
+                saved = directory / f"shard_{shard}"
+                stores.append(ChunkStore.load(saved, mmap, text_path=self._text_path(shard)))
+                shard_slots.append(load_array(saved, "global_slots", mmap=False))
+                if (saved / VECTOR_FILE).exists():
+                    shutil.copyfile(saved / VECTOR_FILE, shard_directory / VECTOR_FILE)
+                    self.vector_files[shard] = VectorFile.open(str(shard_directory / VECTOR_FILE), self.dimension)
+                futures.append(self.shards[shard].submit(
+                    "load", str(saved), mmap, self.statistics, self._vector_count(shard), self.dimension
+                ))
+            
+            self.documents = ShardedChunks(stores, shard_slots)
+            self._index_stores()
+            for future in futures:
+                future.result()
+        
+        return manifest
+    
+    def build_ann_index(self, n_lists: Optional[int] = None):
+        with self._lock:
+            self._ensure_open()
+            self._broadcast("build_ann_index", n_lists)
+    
+    def ensure_ann_index(self) -> bool:
+        with self._lock:
+            self._ensure_open()
+            return any(self._broadcast("ensure_ann_index"))
+    
+    def _merge(
+        self,
+        documents: ShardedChunks,
+        shard_results: List[List[Tuple[int, float]]],
+        top_k: int
+    ) -> List[Tuple[int, float]]:
+        merged = [
+            (global_slot, score)
+            for shard, results in enumerate(shard_results) if results
+            for global_slot, (_, score) in zip(documents.global_slots(shard, [slot for slot, _ in results]).tolist(), results)
+        ]
+        merged.sort(key=lambda result: (-result[1], result[0]))
+        return merged[:top_k]
+    
+    def _scatter_gather(
+        self,
+        queries: List[Optional[str]],
+        query_embeddings: Optional[List[List[float]]],
+        top_k: int,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> Tuple[List, List, ShardedChunks]:
+        embeddings = None
+        if query_embeddings is not None:
+            embeddings = np.asarray(query_embeddings, dtype=np.float32).reshape(len(queries), -1)
+        
+        with self._lock:
+            self._ensure_open()
+            documents = self.documents
+            futures = [shard.submit("candidates", queries, embeddings, top_k, nprobe, filters) for shard in self.shards]
+        shard_batches = [future.result() for future in futures]
+        
+        keyword_batches = [
+            self._merge(documents, [keyword[i] for keyword, _ in shard_batches], top_k)
+            for i in range(len(queries))
+        ]
+        vector_batches = [
+            self._merge(documents, [vector[i] for _, vector in shard_batches], top_k)
+            for i in range(len(queries))
+        ]
+        return keyword_batches, vector_batches, documents
+    
+    def keyword_search(
+        self,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[Dict] = None
+    ) -> List[Tuple[int, float]]:
+        return self.keyword_search_batch([query], top_k, filters)[0]
+    
+    def vector_search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[Tuple[int, float]]:
+        return self.vector_search_batch([query_embedding], top_k, nprobe, filters)[0]
+    
+    def keyword_search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filters: Optional[Dict] = None
+    ) -> List[List[Tuple[int, float]]]:
+        if not queries:
+            return []
+        return self._scatter_gather(queries, None, top_k, filters=filters)[0]
+    
+    def vector_search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict] = None
+    ) -> List[List[Tuple[int, float]]]:
+        if not len(query_embeddings):
+            return []
+        return self._scatter_gather([None] * len(query_embeddings), query_embeddings, top_k, nprobe, filters)[1]
+    
+    def hybrid_search(
+        self,
+        query: str,
+        query_embedding: List[float],
+        top_k: int = 5,
+        keyword_weight: float = 0.3,
+        vector_weight: float = 0.7,
+        filters: Optional[Dict] = None
+    ) -> List[ChunkView]:
+        return self.hybrid_search_batch([query], [query_embedding], top_k, keyword_weight, vector_weight, filters)[0]
+    
+    def hybrid_search_batch(
+        self,
+        queries: List[str],
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        keyword_weight: float = 0.3,
+        vector_weight: float = 0.7,
+        filters: Optional[Dict] = None
+    ) -> List[List[ChunkView]]:
+        if not queries:
+            return []
+        
+        keyword_batches, vector_batches, documents = self._scatter_gather(queries, query_embeddings, top_k * 2, filters=filters)
+        return [
+            fuse_results(documents, keyword_results, vector_results, top_k, keyword_weight, vector_weight)
+            for keyword_results, vector_results in zip(keyword_batches, vector_batches)
+        ]
+    
+    def tombstone_ratio(self) -> float:
+        with self._lock:
+            chunk_count = len(self.documents)
+            return len(self.deleted) / chunk_count if chunk_count else 0.0
+    
+    def get_document_count(self) -> int:
+        with self._lock:
+            return len(self.documents) - len(self.deleted)
+    
+    def clear_index(self):
+        with self._lock:
+            self._ensure_open()
+            self._broadcast("clear_index")
+            self._reset()
+    
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for shard in self.shards:
+            shard.close()
+    
+    def __enter__(self) -> "ShardedSearchEngine":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,288 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import copy
+import shutil
+import numpy as np
+
+from backend.indexing.growable import GrowableArray
+from backend.indexing.persistence import read_json, write_json
+from backend.indexing.quantization import PQCodec, VectorFile, load_codec, make_codec, snapshot_codec
+
+
+class VectorStore:
+    
+    def __init__(
+        self,
+        dimension: Optional[int] = None,
+        storage: str = "float32",
+        rescore_path: Optional[str] = None,
+        rescore_factor: int = 4,
+        capacity: int = 1024,
+        **codec_options
+    ):
+        self.dimension = dimension
+        self.storage = storage
+        self.rescore_path = rescore_path
+        self.rescore_factor = rescore_factor
+        self.capacity = capacity
+        self.codec_options = codec_options
+        self.codec = None
+        self.full_vectors = None
+        if dimension is not None:
+            self._create(dimension)
+    
+    def _create(self, dimension: int):
+        self.dimension = dimension
+        self.codec = make_codec(self.storage, dimension, self.capacity, **self.codec_options)
+        if self.rescore_path and self.storage != "float32":
+            self.full_vectors = VectorFile(self.rescore_path, dimension)
+    
+    def __len__(self) -> int:
+        return 0 if self.codec is None else len(self.codec)
+    
+    @property
+    def nbytes(self) -> int:
+        return 0 if self.codec is None else self.codec.nbytes
+    
+    @property
+    def storage_label(self) -> str:
+        if isinstance(self.codec, PQCodec) and not self.codec.is_trained:
+            return f"{self.storage} (untrained, float32)"
+        return self.storage
+    
+    def get_stats(self) -> Dict:
+        return {
+            "storage": self.storage_label,
+            "vectors": len(self),
+            "nbytes": self.nbytes,
+            "rescore": self.full_vectors is not None
+        }
+    
+    def train(self):
+        if isinstance(self.codec, PQCodec) and not self.codec.is_trained:
+            self.codec.train()
+    
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+    
+    def add(self, start: int, vectors: Sequence) -> int:
+        if self.codec is None:
+            first = next(v for v in vectors if v is not None)
+            self._create(len(first))
+        
+        if start > len(self):
+            self._extend(np.zeros((start - len(self), self.dimension), dtype=np.float32))
+        
+        if all(vector is not None for vector in vectors):
+            block = np.array(vectors, dtype=np.float32).reshape(len(vectors), self.dimension)
+        else:
+            block = np.zeros((len(vectors), self.dimension), dtype=np.float32)
+            for row, vector in enumerate(vectors):
+                if vector is not None:
+                    block[row] = vector
+        
+        position = len(self)
+        self._extend(self.normalize(block))
+        return position
+    
+    def _extend(self, block: np.ndarray):
+        self.codec.add(block)
+        if self.full_vectors is not None:
+            self.full_vectors.append(block)
+    
+    def attach(self, path: str, dimension: int, count: int):
+        if not count:
+            return
+        if self.codec is None:
+            self._create(dimension)
+        
+        rows = np.memmap(path, dtype=np.float32, mode="r", shape=(count, dimension))
+        if self.storage == "float32":
+            self.codec.codes = GrowableArray.from_array(rows)
+        else:
+            self.codec.add(rows[len(self.codec):])
+            self.full_vectors = VectorFile.open(path, dimension)
+    
+    def decode(self, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        if self.codec is None:
+            return np.empty((0, self.dimension or 0), dtype=np.float32)
+        return self.codec.decode(ids)
+    
+    def rows(self, ids: np.ndarray) -> np.ndarray:
+        if self.full_vectors is not None:
+            return self.full_vectors.rows(ids)
+        return self.decode(ids)
+    
+    def _query(self, query_embedding: Sequence[float]) -> np.ndarray:
+        return self.normalize(np.asarray(query_embedding, dtype=np.float32).ravel())
+    
+    def scores(self, query_embedding: Sequence[float]) -> np.ndarray:
+        return self.codec.score(self._query(query_embedding))
+    
+    def score_rows(self, query: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        return self.codec.score(query, ids)
+    
+    def rank_candidates(
+        self,
+        query: np.ndarray,
+        scores: np.ndarray,
+        ids: Optional[np.ndarray],
+        top_k: int
+    ) -> List[Tuple[int, float]]:
+        rescoring = self.full_vectors is not None
+        shortlist = top_k_indices(scores, top_k * self.rescore_factor if rescoring else top_k)
+        positions = np.array([idx for idx, _ in shortlist], dtype=np.int64)
+        candidate_ids = positions if ids is None else ids[positions]
+        
+        if not rescoring:
+            return [(int(slot), score) for slot, (_, score) in zip(candidate_ids, shortlist)][:top_k]
+        
+        candidate_ids = np.sort(candidate_ids)
+        exact = self.full_vectors.rows(candidate_ids) @ query
+        return [(int(candidate_ids[idx]), score) for idx, score in top_k_indices(exact, top_k)]
+    
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        top_k: int = 5,
+        exclude: Optional[np.ndarray] = None,
+        ids: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        if not len(self) or top_k <= 0:
+            return []
+        
+        query = self._query(query_embedding)
+        if ids is not None:
+            if not len(ids):
+                return []
+            return self.rank_candidates(query, self.codec.score(query, ids), ids, top_k)
+        
+        similarities = self.codec.score(query)
+        if exclude is not None and len(exclude):
+            similarities[exclude] = -np.inf
+        
+        return self.rank_candidates(query, similarities, None, top_k)
+    
+    def search_batch(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        top_k: int = 5,
+        exclude: Optional[np.ndarray] = None,
+        ids: Optional[np.ndarray] = None
+    ) -> List[List[Tuple[int, float]]]:
+        if not len(self) or top_k <= 0 or (ids is not None and not len(ids)):
+            return [[] for _ in query_embeddings]
+        
+        queries = self.normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        similarities = self.codec.score_batch(queries, ids)
+        if exclude is not None and len(exclude):
+            similarities[:, exclude] = -np.inf
+        
+        width = top_k * self.rescore_factor if self.full_vectors is not None else top_k
+        results = []
+        for query, row in zip(queries, similarities):
+            shortlist = np.sort([idx for idx, _ in top_k_indices(row, 2 * width)]).astype(np.int64)
+            if ids is not None:
+                shortlist = ids[shortlist]
+            if not len(shortlist):
+                results.append([])
+                continue
+            
+            results.append(self.rank_candidates(query, self.codec.score(query, shortlist), shortlist, top_k))
+        
+        return results
+    
+    def snapshot(self) -> "VectorStore":
+        frozen = copy.copy(self)
+        if self.codec is not None:
+            frozen.codec = snapshot_codec(self.codec)
+        if self.full_vectors is not None:
+            frozen.full_vectors = copy.copy(self.full_vectors)
+        return frozen
+    
+    def take(self, ids: np.ndarray, rescore_path: Optional[str]) -> "VectorStore":
+        subset = VectorStore(
+            storage=self.storage,
+            rescore_path=rescore_path,
+            rescore_factor=self.rescore_factor,
+            capacity=self.capacity,
+            **self.codec_options
+        )
+        if self.codec is not None:
+            subset.dimension = self.dimension
+            subset.codec = self.codec.take(ids)
+            if self.full_vectors is not None:
+                subset.full_vectors = self.full_vectors.take(ids, rescore_path)
+        return subset
+    
+    def relocate(self, rescore_path: Optional[str]):
+        if self.full_vectors is not None:
+            self.full_vectors.replace(rescore_path)
+        self.rescore_path = rescore_path
+    
+    def save(self, directory: Path):
+        directory = Path(directory)
+        params = {
+            "storage": self.storage,
+            "dimension": self.dimension,
+            "rescore_factor": self.rescore_factor,
+            "codec_options": self.codec_options,
+            "codec": None,
+            "rescore": False
+        }
+        if self.codec is not None:
+            params["codec"] = self.codec.save(directory, "vectors_")
+            if self.full_vectors is not None:
+                shutil.copyfile(self.full_vectors.path, directory / "rescore.f32")
+                params["rescore"] = True
+        write_json(directory / "vectors.json", params)
+    
+    @classmethod
+    def load(cls, directory: Path, rescore_path: Optional[str] = None, mmap: bool = True) -> "VectorStore":
+        directory = Path(directory)
+        params = read_json(directory / "vectors.json")
+        store = cls(
+            storage=params["storage"],
+            rescore_path=rescore_path,
+            rescore_factor=params["rescore_factor"],
+            **params["codec_options"]
+        )
+        if params["codec"] is None:
+            return store
+        
+        store.dimension = params["dimension"]
+        store.codec = load_codec(params["storage"], directory, "vectors_", store.dimension, params["codec"], mmap)
+        if params["rescore"] and rescore_path:
+            if Path(rescore_path).resolve() != (directory / "rescore.f32").resolve():
+                Path(rescore_path).parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(directory / "rescore.f32", rescore_path)
+            store.full_vectors = VectorFile.open(rescore_path, store.dimension)
+        return store
+    
+    def clear(self):
+        self.codec = None
+        self.full_vectors = None
+        if self.dimension is not None:
+            self._create(self.dimension)
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+    k = min(top_k, len(scores))
+    if k <= 0:
+        return []
+    
+    if k < len(scores):
+        kth_score = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= kth_score)
+    else:
+        candidates = np.arange(len(scores))
+    candidates = candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+    
+    return [
+        (int(idx), float(scores[idx])) for idx in candidates
+        if np.isfinite(scores[idx])
+    ]
@@ -1,15 +1,17 @@
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, Optional
 from .pdf_parser import PDFParser
 from .word_parser import WordParser
 from .excel_parser import ExcelParser
 from .txt_parser import TxtParser
 from .ocr_handler import OCRHandler
+from .parse_cache import ParseCache
 
 
 class DocumentProcessor:
     
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache = ParseCache(cache_dir) if cache_dir else None
         self.pdf_parser = PDFParser()
         self.word_parser = WordParser()
         self.excel_parser = ExcelParser()
@@ -33,7 +35,7 @@ class DocumentProcessor:
         extension = path.suffix.lower()
         
         if self.ocr_handler.is_image_supported(file_path):
-            result = self.ocr_handler.process_image(str(path))
+            result = self._parse_cached(path, "ocr", lambda: self.ocr_handler.process_image(str(path)))
             if "error" not in result:
                 result['file_path'] = str(path)
                 result['file_size'] = path.stat().st_size
@@ -46,24 +48,48 @@ class DocumentProcessor:
             }
         
         try:
-            parser = self.supported_extensions[extension]
-            result = parser.parse(str(path))
-            
-            if extension == '.pdf' and use_ocr:
-                if result.get('full_text', '').strip() == '':
-                    result = self.ocr_handler.process_scanned_pdf(str(path))
+            variant = "ocr" if extension == '.pdf' and use_ocr else "text"
+            result = self._parse_cached(path, variant, lambda: self._parse(path, extension, use_ocr))
             
             result['file_path'] = str(path)
             result['file_size'] = path.stat().st_size
             
             return result
-            
+        
         except Exception as e:
             return {
                 "error": f"Failed to process {path.name}",
                 "exception": str(e)
             }
     
+    def _parse(self, path: Path, extension: str, use_ocr: bool) -> Dict:
+        parser = self.supported_extensions[extension]
+        result = parser.parse(str(path))
+        
+        if extension == '.pdf' and use_ocr:
+            if result.get('full_text', '').strip() == '':
+                result = self.ocr_handler.process_scanned_pdf(str(path))
+        
+        return result
+    
+    def _parse_cached(self, path: Path, variant: str, parse: Callable[[], Dict]) -> Dict:
+        if self.cache is None:
+            return parse()
+        
+        key = self.cache.key(str(path), variant)
+        result = self.cache.load(key)
+        if result is None:
+            result = parse()
+            if "error" not in result:
+                self.cache.store(key, result)
+        else:
+            result['file_name'] = path.name
+        
+        return result
+    
+    def warmup(self) -> bool:
+        return self.ocr_handler.warmup()
+    
     def is_supported(self, file_path: str) -> bool:
         extension = Path(file_path).suffix.lower()
         return extension in self.supported_extensions or self.ocr_handler.is_image_supported(file_path)
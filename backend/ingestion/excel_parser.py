@@ -1,15 +1,20 @@
-from openpyxl import load_workbook
 from pathlib import Path
 from typing import Dict, List
 
+from .provenance import ProvenanceIndex
+
 
 class ExcelParser:
     
     def parse(self, file_path: str) -> Dict:
+        from openpyxl import load_workbook
+        
         wb = load_workbook(file_path, data_only=True)
         
         sheets_data = []
         full_text = []
+        provenance = ProvenanceIndex()
+        offset = 0
         
         for sheet_name in wb.sheetnames:
             sheet = wb[sheet_name]
@@ -32,6 +37,9 @@ class ExcelParser:
                 "column_count": sheet.max_column
             })
             
+            if sheet_text:
+                provenance.add_section(sheet_name, offset)
+                offset += sum(len(row_text) + 1 for row_text in sheet_text)
             full_text.extend(sheet_text)
         
         wb.close()
@@ -42,12 +50,15 @@ class ExcelParser:
             "total_sheets": len(sheets_data),
             "full_text": "\n".join(full_text),
             "sheets": sheets_data,
+            "provenance": provenance.to_dict(),
             "metadata": {
                 "sheet_names": wb.sheetnames
             }
         }
     
     def extract_sheet(self, file_path: str, sheet_name: str = None) -> List[List[str]]:
+        from openpyxl import load_workbook
+        
         wb = load_workbook(file_path, data_only=True)
         
         if sheet_name:
@@ -1,14 +1,24 @@
 from pathlib import Path
 from typing import Dict
-import fitz
 import os
 
+from .provenance import ProvenanceIndex, join_with_offsets
+
 
 class OCRHandler:
     
     def __init__(self):
         self.supported_image_formats = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.gif'}
-        self.tesseract_available = self._check_and_configure_tesseract()
+        self._tesseract_available = None
+    
+    @property
+    def tesseract_available(self) -> bool:
+        if self._tesseract_available is None:
+            self._tesseract_available = self._check_and_configure_tesseract()
+        return self._tesseract_available
+    
+    def warmup(self) -> bool:
+        return self.tesseract_available
     
     def _check_and_configure_tesseract(self) -> bool:
         try:
@@ -50,6 +60,7 @@ class OCRHandler:
                 "message": "Install Tesseract OCR to process scanned documents"
             }
         
+        import fitz
         import pytesseract
         from PIL import Image
         import io
@@ -73,13 +84,15 @@ class OCRHandler:
             full_text.append(text)
         
         doc.close()
+        text, page_starts = join_with_offsets(full_text, "\n\n")
         
         return {
             "file_name": Path(file_path).name,
             "file_type": "pdf_scanned",
             "total_pages": len(pages),
-            "full_text": "\n\n".join(full_text),
+            "full_text": text,
             "pages": pages,
+            "provenance": ProvenanceIndex(page_starts).to_dict(),
             "ocr_method": "tesseract"
         }
     
@@ -0,0 +1,78 @@
+from pathlib import Path
+from typing import Dict, Optional
+import json
+import os
+import xxhash
+import zstandard
+
+
+CACHE_FORMAT_VERSION = 2
+HASH_BLOCK_SIZE = 1 << 20
+
+
+class ParseCache:
+    
+    def __init__(self, cache_dir: str, level: int = 3):
+        self.cache_dir = Path(cache_dir)
+        (self.cache_dir / "paths").mkdir(parents=True, exist_ok=True)
+        (self.cache_dir / "results").mkdir(parents=True, exist_ok=True)
+        self.level = level
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def content_hash(path: Path) -> str:
+        hasher = xxhash.xxh3_128()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+    
+    def _write(self, path: Path, data: bytes):
+        staging = path.with_name(path.name + ".tmp")
+        staging.write_bytes(data)
+        os.replace(staging, path)
+    
+    def key(self, file_path: str, variant: str = "text") -> str:
+        path = Path(file_path).resolve()
+        stat = path.stat()
+        fingerprint = {"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        entry_path = self.cache_dir / "paths" / f"{xxhash.xxh3_64_hexdigest(str(path))}.json"
+        
+        content_hash = None
+        if entry_path.exists():
+            entry = json.loads(entry_path.read_text())
+            if all(entry.get(field) == value for field, value in fingerprint.items()):
+                content_hash = entry["content_hash"]
+        
+        if content_hash is None:
+            content_hash = self.content_hash(path)
+            self._write(entry_path, json.dumps({**fingerprint, "content_hash": content_hash}).encode("utf-8"))
+        
+        return f"{content_hash}-{variant}-v{CACHE_FORMAT_VERSION}"
+    
+    def _result_path(self, key: str) -> Path:
+        return self.cache_dir / "results" / key[:2] / f"{key}.json.zst"
+    
+    def load(self, key: str) -> Optional[Dict]:
+        path = self._result_path(key)
+        if not path.exists():
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        return json.loads(zstandard.ZstdDecompressor().decompress(path.read_bytes()))
+    
+    def store(self, key: str, result: Dict):
+        path = self._result_path(key)
+        path.parent.mkdir(exist_ok=True)
+        self._write(path, zstandard.ZstdCompressor(level=self.level).compress(json.dumps(result).encode("utf-8")))
+    
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "cache_dir": str(self.cache_dir),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
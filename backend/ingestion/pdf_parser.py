@@ -1,11 +1,14 @@
-import fitz
 from pathlib import Path
 from typing import Dict, List
 
+from .provenance import ProvenanceIndex, join_with_offsets
+
 
 class PDFParser:
     
     def parse(self, file_path: str) -> Dict:
+        import fitz
+        
         doc = fitz.open(file_path)
         
         pages = []
@@ -20,6 +23,12 @@ class PDFParser:
             })
             full_text.append(text)
         
+        text, page_starts = join_with_offsets(full_text, "\n\n")
+        provenance = ProvenanceIndex(page_starts)
+        for _, title, page_num in sorted(doc.get_toc(simple=True), key=lambda entry: entry[2]):
+            if 1 <= page_num <= len(page_starts):
+                provenance.add_section(title, page_starts[page_num - 1])
+        
         metadata = doc.metadata
         doc.close()
         
@@ -27,8 +36,9 @@ class PDFParser:
             "file_name": Path(file_path).name,
             "file_type": "pdf",
             "total_pages": len(pages),
-            "full_text": "\n\n".join(full_text),
+            "full_text": text,
             "pages": pages,
+            "provenance": provenance.to_dict(),
             "metadata": {
                 "title": metadata.get("title", ""),
                 "author": metadata.get("author", ""),
@@ -38,6 +48,8 @@ class PDFParser:
         }
     
     def extract_tables(self, file_path: str) -> List[Dict]:
+        import fitz
+        
         doc = fitz.open(file_path)
         tables = []
         
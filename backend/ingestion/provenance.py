@@ -0,0 +1,74 @@
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def join_with_offsets(parts: Sequence[str], separator: str) -> Tuple[str, List[int]]:
+    starts = []
+    offset = 0
+    for part in parts:
+        starts.append(offset)
+        offset += len(part) + len(separator)
+    return separator.join(parts), starts
+
+
+class ProvenanceIndex:
+    
+    def __init__(
+        self,
+        page_starts: Optional[List[int]] = None,
+        section_starts: Optional[List[int]] = None,
+        section_titles: Optional[List[str]] = None
+    ):
+        self.page_starts = page_starts or []
+        self.section_starts = section_starts or []
+        self.section_titles = section_titles or []
+    
+    @classmethod
+    def from_result(cls, doc_result: Dict) -> "ProvenanceIndex":
+        provenance = doc_result.get("provenance") or {}
+        return cls(
+            provenance.get("page_starts"),
+            provenance.get("section_starts"),
+            provenance.get("section_titles")
+        )
+    
+    def to_dict(self) -> Dict:
+        return {
+            "page_starts": self.page_starts,
+            "section_starts": self.section_starts,
+            "section_titles": self.section_titles
+        }
+    
+    def add_section(self, title: str, offset: int):
+        if self.section_starts and self.section_starts[-1] == offset:
+            self.section_titles[-1] = title
+        else:
+            self.section_starts.append(offset)
+            self.section_titles.append(title)
+    
+    def page_at(self, offset: int) -> Optional[int]:
+        page = bisect_right(self.page_starts, offset)
+        return page or None
+    
+    def section_at(self, offset: int) -> Optional[str]:
+        index = bisect_right(self.section_starts, offset) - 1
+        return self.section_titles[index] if index >= 0 else None
+    
+    def locate(self, start_char: int, end_char: int) -> Dict:
+        last = max(start_char, end_char - 1)
+        location = {}
+        if self.page_starts:
+            location["page_start"] = self.page_at(start_char)
+            location["page_end"] = self.page_at(last)
+        section = self.section_at(start_char)
+        if section is not None:
+            location["section"] = section
+        return location
+    
+    def annotate(self, chunks: List[Dict]) -> List[Dict]:
+        if not self.page_starts and not self.section_starts:
+            return chunks
+        for chunk in chunks:
+            if "start_char" in chunk:
+                chunk.update(self.locate(chunk["start_char"], chunk["end_char"]))
+        return chunks
@@ -1,11 +1,14 @@
-from docx import Document
 from pathlib import Path
 from typing import Dict, List
 
+from .provenance import ProvenanceIndex, join_with_offsets
+
 
 class WordParser:
     
     def parse(self, file_path: str) -> Dict:
+        from docx import Document
+        
         doc = Document(file_path)
         
         paragraphs = []
@@ -19,6 +22,12 @@ class WordParser:
                 })
                 full_text.append(para.text)
         
+        text, paragraph_starts = join_with_offsets(full_text, "\n\n")
+        provenance = ProvenanceIndex()
+        for paragraph, start in zip(paragraphs, paragraph_starts):
+            if paragraph["style"] == "Title" or paragraph["style"].startswith("Heading"):
+                provenance.add_section(paragraph["text"].strip(), start)
+        
         tables_data = []
         for table in doc.tables:
             table_text = []
@@ -32,9 +41,10 @@ class WordParser:
             "file_type": "docx",
             "total_paragraphs": len(paragraphs),
             "total_tables": len(tables_data),
-            "full_text": "\n\n".join(full_text),
+            "full_text": text,
             "paragraphs": paragraphs,
             "tables": tables_data,
+            "provenance": provenance.to_dict(),
             "metadata": {
                 "title": doc.core_properties.title or "",
                 "author": doc.core_properties.author or "",
@@ -44,6 +54,8 @@ class WordParser:
         }
     
     def extract_tables(self, file_path: str) -> List[List[List[str]]]:
+        from docx import Document
+        
         doc = Document(file_path)
         tables = []
         
@@ -12,6 +12,7 @@ class SynonymManager:
         self.synonyms_file = Path(synonyms_file)
         self.synonyms: Dict[str, List[str]] = {}
         self.reverse_map: Dict[str, str] = {}
+        self.version = 0
         self.load()
     
     def load(self):
@@ -22,8 +23,10 @@ class SynonymManager:
         else:
             self.synonyms = {}
             self.reverse_map = {}
+        self.version += 1
     
     def save(self):
+        self.version += 1
         self.synonyms_file.parent.mkdir(parents=True, exist_ok=True)
         with open(self.synonyms_file, 'w', encoding='utf-8') as f:
             json.dump(self.synonyms, f, indent=2, ensure_ascii=False)
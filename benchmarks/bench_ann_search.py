@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.indexing.ann_index import IVFIndex
+from backend.indexing.vector_store import VectorStore
+
+
+def clustered_vectors(rng, count: int, dimension: int, clusters: int = 200) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dimension))
+    labels = rng.integers(0, clusters, size=count)
+    return (centers[labels] + 0.6 * rng.normal(size=(count, dimension))).astype(np.float32)
+
+
+def run_benchmark(
+    corpus_size: int = 200_000,
+    dimension: int = 384,
+    top_k: int = 10,
+    query_count: int = 100,
+    nprobes=(1, 2, 4, 8, 16, 32, 64)
+):
+    print("=" * 70)
+    print("IVF ANN RECALL / LATENCY BENCHMARK")
+    print("=" * 70)
+    
+    rng = np.random.default_rng(42)
+    vectors = clustered_vectors(rng, corpus_size, dimension)
+    queries = clustered_vectors(rng, query_count, dimension)
+    
+    store = VectorStore()
+    store.add(0, vectors)
+    
+    build_start = time.perf_counter()
+    index = IVFIndex()
+    index.build(store.decode())
+    build_time = time.perf_counter() - build_start
+    print(f"Chunks: {corpus_size}, dimension: {dimension}, lists: {len(index.lists)}")
+    print(f"Build time: {build_time:.2f}s")
+    
+    exact_start = time.perf_counter()
+    exact = [{idx for idx, _ in store.search(q, top_k)} for q in queries]
+    exact_ms = (time.perf_counter() - exact_start) / query_count * 1000
+    
+    print(f"\n{'mode':>10} {'nprobe':>8} {'recall@' + str(top_k):>12} {'latency (ms)':>14}")
+    print("-" * 70)
+    print(f"{'exact':>10} {'-':>8} {1.0:12.3f} {exact_ms:14.2f}")
+    
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        approximate = [
+            {idx for idx, _ in index.search(store, q, top_k, nprobe=nprobe)}
+            for q in queries
+        ]
+        latency_ms = (time.perf_counter() - start) / query_count * 1000
+        recall = np.mean([len(a & e) / top_k for a, e in zip(approximate, exact)])
+        print(f"{'ivf':>10} {nprobe:>8} {recall:12.3f} {latency_ms:14.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
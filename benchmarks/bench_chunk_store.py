@@ -0,0 +1,105 @@
+import sys
+from pathlib import Path
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.indexing.chunk_store import ChunkStore
+
+
+WORDS = ["revenue", "tax", "profit", "cash", "dividend", "invoice", "margin", "salary", "rent", "asset"]
+
+
+def make_chunks(rng, count: int, dimension: int = 0, words_per_chunk: int = 120, chunks_per_doc: int = 40):
+    chunks = []
+    for i in range(count):
+        doc_id = i // chunks_per_doc
+        metadata = {
+            "file_name": f"report_{doc_id}.pdf",
+            "file_type": "pdf",
+            "file_path": f"backend/data/documents/report_{doc_id}.pdf",
+            "total_pages": 30
+        }
+        chunk = {
+            "text": " ".join(rng.choice(WORDS, size=words_per_chunk)),
+            "chunk_index": i % chunks_per_doc,
+            "start_char": (i % chunks_per_doc) * 3600,
+            "end_char": (i % chunks_per_doc) * 3600 + words_per_chunk * 8,
+            "word_count": words_per_chunk,
+            "metadata": metadata,
+            "doc_id": doc_id,
+            "file_name": metadata["file_name"]
+        }
+        if dimension:
+            chunk["embedding"] = rng.normal(size=dimension).tolist()
+        chunks.append(chunk)
+    return chunks
+
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def build_store(count: int, dimension: int, batch_size: int = 1000):
+    rng = np.random.default_rng(42)
+    store = ChunkStore()
+    embeddings = np.empty((count, dimension), dtype=np.float32)
+    for start in range(0, count, batch_size):
+        batch = make_chunks(rng, min(batch_size, count - start), dimension)
+        embeddings[start:start + len(batch)] = [chunk["embedding"] for chunk in batch]
+        store.add(batch)
+    return store, embeddings
+
+
+def run_benchmark(chunk_count: int = 20_000, dimension: int = 384, top_k: int = 10, query_count: int = 2000):
+    print("=" * 70)
+    print("CHUNK STORE MEMORY / RESULT ASSEMBLY BENCHMARK")
+    print("=" * 70)
+    print(f"Chunks: {chunk_count}, dimension: {dimension}, top_k: {top_k}")
+    
+    documents, legacy_bytes = measure(lambda: make_chunks(np.random.default_rng(42), chunk_count, dimension))
+    (store, _), store_bytes = measure(lambda: build_store(chunk_count, dimension))
+    
+    result_slots = np.random.default_rng(7).integers(0, chunk_count, size=(query_count, top_k))
+    
+    start = time.perf_counter()
+    for slots in result_slots:
+        results = []
+        for rank, slot in enumerate(slots, start=1):
+            result = documents[slot].copy()
+            result["score"] = 0.5
+            result["rank"] = rank
+            results.append(result)
+    dict_ms = (time.perf_counter() - start) / query_count * 1000
+    
+    start = time.perf_counter()
+    for slots in result_slots:
+        results = [store.view(int(slot), 0.5, rank) for rank, slot in enumerate(slots, start=1)]
+    view_ms = (time.perf_counter() - start) / query_count * 1000
+    
+    start = time.perf_counter()
+    for slots in result_slots:
+        results = [
+            store.view(int(slot), 0.5, rank).to_dict(["text", "file_name", "score"])
+            for rank, slot in enumerate(slots, start=1)
+        ]
+    materialize_ms = (time.perf_counter() - start) / query_count * 1000
+    
+    print(f"\n{'layout':>28} {'allocated (MB)':>15} {'assembly (ms/query)':>22}")
+    print("-" * 70)
+    print(f"{'chunk dicts + embeddings':>28} {legacy_bytes / 1e6:15.1f} {dict_ms:22.3f}")
+    print(f"{'chunk store + float32 matrix':>28} {store_bytes / 1e6:15.1f} {view_ms:22.3f}")
+    print(f"{'  materialized (3 fields)':>28} {'':>15} {materialize_ms:22.3f}")
+    print(f"\nMemory reduction: {legacy_bytes / store_bytes:.1f}x "
+          f"(chunk store columns: {store.nbytes / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    run_benchmark()
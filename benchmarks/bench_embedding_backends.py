@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.indexing.embeddings import EmbeddingGenerator
+
+
+WORDS = ["revenue", "tax", "profit", "cash", "dividend", "invoice", "margin", "salary", "rent", "asset"]
+
+
+def measure(embedder: EmbeddingGenerator, texts, repeats: int):
+    start = time.perf_counter()
+    embedder.warmup()
+    load_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for _ in range(repeats):
+        embeddings = embedder.generate_batch(texts)
+    throughput = repeats * len(texts) / (time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    for text in texts[:200]:
+        embedder.generate(text)
+    query_ms = (time.perf_counter() - start) * 1000 / min(len(texts), 200)
+    return embeddings, load_seconds, throughput, query_ms
+
+
+def run_benchmark(text_count: int = 2000, repeats: int = 3, quantization: str = "avx2"):
+    print("=" * 70)
+    print("EMBEDDING BACKEND BENCHMARK (torch fp32 vs ONNX int8)")
+    print("=" * 70)
+    
+    rng = np.random.default_rng(42)
+    texts = [" ".join(rng.choice(WORDS, size=int(rng.integers(10, 150)))) for _ in range(text_count)]
+    print(f"Texts: {text_count}, repeats: {repeats}, quantization: {quantization}")
+    
+    print(f"\n{'backend':>10} {'load (s)':>10} {'chunks/s':>10} {'query (ms)':>11} {'min cosine':>11}")
+    print("-" * 70)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        EmbeddingGenerator(backend="onnx", onnx_dir=tmp, quantization=quantization).prepare()
+        reference = None
+        for backend in ("torch", "onnx"):
+            embedder = EmbeddingGenerator(backend=backend, onnx_dir=tmp, quantization=quantization)
+            embeddings, load_seconds, throughput, query_ms = measure(embedder, texts, repeats)
+            if reference is None:
+                reference = embeddings
+            cosine = (reference * embeddings).sum(axis=1) / (
+                np.linalg.norm(reference, axis=1) * np.linalg.norm(embeddings, axis=1)
+            )
+            print(f"{backend:>10} {load_seconds:10.2f} {throughput:10.0f} {query_ms:11.2f} {cosine.min():11.4f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
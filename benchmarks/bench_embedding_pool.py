@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+import os
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.indexing.embedding_pool import EmbeddingPool
+from backend.indexing.embeddings import EmbeddingGenerator
+
+
+WORDS = ["revenue", "tax", "profit", "cash", "dividend", "invoice", "margin", "salary", "rent", "asset"]
+
+
+def make_documents(rng, document_count: int, chunks_per_document: int):
+    return [
+        (doc, [" ".join(rng.choice(WORDS, size=int(rng.integers(40, 120)))) for _ in range(chunks_per_document)])
+        for doc in range(document_count)
+    ]
+
+
+def run_benchmark(document_count: int = 64, chunks_per_document: int = 64, batch_size: int = 64):
+    print("=" * 70)
+    print("MULTI-PROCESS EMBEDDING POOL BENCHMARK")
+    print("=" * 70)
+    
+    rng = np.random.default_rng(42)
+    documents = make_documents(rng, document_count, chunks_per_document)
+    total = document_count * chunks_per_document
+    cores = os.cpu_count() or 1
+    print(f"Chunks: {total} ({document_count} documents), cores: {cores}")
+    
+    print(f"\n{'mode':>16} {'chunks/s':>10} {'speedup':>9}")
+    print("-" * 70)
+    
+    embedder = EmbeddingGenerator()
+    embedder.generate_batch(documents[0][1])
+    start = time.perf_counter()
+    for _, texts in documents:
+        embedder.generate_batch(texts)
+    baseline = total / (time.perf_counter() - start)
+    print(f"{'single process':>16} {baseline:10.0f} {1.0:8.2f}x")
+    
+    workers = 1
+    while workers <= cores:
+        with EmbeddingPool(embedder.model_name, workers=workers, batch_size=batch_size) as pool:
+            list(pool.map(documents[:workers]))
+            start = time.perf_counter()
+            for _ in pool.map(documents):
+                pass
+            throughput = total / (time.perf_counter() - start)
+        print(f"{f'{workers} workers':>16} {throughput:10.0f} {throughput / baseline:8.2f}x")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    run_benchmark()
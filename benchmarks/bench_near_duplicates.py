@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.indexing.near_duplicates import NearDuplicateIndex
+
+
+WORDS = ["revenue", "tax", "profit", "cash", "dividend", "invoice", "margin", "salary", "rent", "asset"]
+BOILERPLATE = [
+    "This report is provided for information only and does not constitute investment advice or an offer to buy securities",
+    "Past performance is not a reliable indicator of future results and the value of investments can go down as well as up",
+    "Figures are unaudited and presented in thousands of dollars unless otherwise stated in the accompanying notes",
+]
+
+
+def make_chunks(rng, document_count: int, chunks_per_document: int, boilerplate_ratio: float):
+    documents = []
+    for doc in range(document_count):
+        chunks = []
+        for chunk_index in range(chunks_per_document):
+            if rng.random() < boilerplate_ratio:
+                words = rng.choice(BOILERPLATE).split()
+                words[int(rng.integers(len(words)))] = str(doc)
+                text = " ".join(words)
+            else:
+                text = " ".join(f"{word}{rng.integers(1000)}" for word in rng.choice(WORDS, size=80))
+            chunks.append({"text": text, "chunk_index": chunk_index})
+        documents.append((f"report_{doc}.pdf", chunks))
+    return documents
+
+
+def run_benchmark(document_count: int = 200, chunks_per_document: int = 40, thresholds=(0.7, 0.8, 0.9)):
+    print("=" * 70)
+    print("NEAR-DUPLICATE CHUNK DETECTION BENCHMARK")
+    print("=" * 70)
+    
+    rng = np.random.default_rng(42)
+    for boilerplate_ratio in (0.1, 0.3):
+        documents = make_chunks(rng, document_count, chunks_per_document, boilerplate_ratio)
+        total = document_count * chunks_per_document
+        print(f"\nChunks: {total}, boilerplate share: {boilerplate_ratio:.0%}")
+        print(f"{'threshold':>10} {'bands x rows':>13} {'indexed':>9} {'saved':>8} {'chunks/s':>10}")
+        print("-" * 70)
+        
+        for threshold in thresholds:
+            index = NearDuplicateIndex(threshold=threshold)
+            start = time.perf_counter()
+            indexed = sum(len(index.deduplicate(path, chunks)) for path, chunks in documents)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{threshold:10.2f} {f'{index.bands} x {index.rows}':>13} {indexed:9d} "
+                f"{1 - indexed / total:7.1%} {total / elapsed:10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    run_benchmark()
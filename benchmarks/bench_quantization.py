@@ -0,0 +1,71 @@
+import sys
+from pathlib import Path
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.indexing.vector_store import VectorStore
+
+
+def embedding_like_vectors(rng, projection: np.ndarray, count: int) -> np.ndarray:
+    latent = rng.normal(size=(count, projection.shape[0]))
+    noise = 0.1 * rng.normal(size=(count, projection.shape[1]))
+    return (latent @ projection + noise).astype(np.float32)
+
+
+def run_benchmark(
+    corpus_size: int = 100_000,
+    dimension: int = 384,
+    top_k: int = 10,
+    query_count: int = 100
+):
+    print("=" * 78)
+    print("QUANTIZED EMBEDDING STORAGE BENCHMARK")
+    print("=" * 78)
+    print(f"Chunks: {corpus_size}, dimension: {dimension}, top_k: {top_k}")
+    
+    rng = np.random.default_rng(42)
+    projection = rng.normal(size=(48, dimension)) / np.sqrt(48)
+    vectors = embedding_like_vectors(rng, projection, corpus_size)
+    queries = embedding_like_vectors(rng, projection, query_count)
+    
+    exact_store = VectorStore()
+    exact_store.add(0, vectors)
+    exact = [{idx for idx, _ in exact_store.search(q, top_k)} for q in queries]
+    
+    print(f"\n{'storage':>10} {'rescore':>8} {'bytes/vec':>10} {'RAM (MB)':>10} {'recall@' + str(top_k):>10} {'latency (ms)':>13}")
+    print("-" * 78)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for storage in ("float32", "float16", "int8", "pq"):
+            for rescore in (False, True):
+                if storage == "float32" and rescore:
+                    continue
+                
+                store = VectorStore(
+                    storage=storage,
+                    rescore_path=str(Path(tmp) / f"{storage}.f32") if rescore else None,
+                    rescore_factor=10 if storage == "pq" else 4
+                )
+                store.add(0, vectors)
+                
+                start = time.perf_counter()
+                found = [{idx for idx, _ in store.search(q, top_k)} for q in queries]
+                latency_ms = (time.perf_counter() - start) / query_count * 1000
+                
+                recall = np.mean([len(f & e) / top_k for f, e in zip(found, exact)])
+                print(
+                    f"{store.storage_label:>10} {'yes' if rescore else 'no':>8} {store.nbytes / corpus_size:10.1f} "
+                    f"{store.nbytes / 2**20:10.1f} {recall:10.3f} {latency_ms:13.2f}"
+                )
+    
+    print("\nProjected in-memory vector storage for 10M chunks:")
+    for storage, bytes_per_vector in (("float32", dimension * 4), ("float16", dimension * 2), ("int8", dimension + 4), ("pq", dimension // 8)):
+        print(f"  - {storage}: {bytes_per_vector * 10_000_000 / 2**30:.1f} GiB")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.indexing.embedding_batcher import EmbeddingBatcher
+from backend.indexing.embeddings import EmbeddingGenerator
+
+
+WORDS = ["revenue", "tax", "profit", "cash", "dividend", "invoice", "margin", "salary", "rent", "asset"]
+
+
+def run_load(embed, queries, concurrency: int):
+    def timed(query):
+        start = time.perf_counter()
+        embed(query)
+        return (time.perf_counter() - start) * 1000
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = np.array(list(pool.map(timed, queries)))
+    return len(queries) / (time.perf_counter() - start), latencies
+
+
+def run_benchmark(query_count: int = 2000, concurrency_levels=(1, 8, 32), wait_ms: float = 2.0):
+    print("=" * 70)
+    print("QUERY EMBEDDING MICRO-BATCHING BENCHMARK")
+    print("=" * 70)
+    
+    embedder = EmbeddingGenerator()
+    rng = np.random.default_rng(42)
+    queries = [" ".join(rng.choice(WORDS, size=6)) + f" {i}" for i in range(query_count)]
+    embedder.generate_batch(queries[:32])
+    print(f"Model: {embedder.model_name}, queries: {query_count}, batch window: {wait_ms} ms")
+    
+    print(f"\n{'mode':>10} {'threads':>8} {'QPS':>10} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    print("-" * 70)
+    
+    for concurrency in concurrency_levels:
+        batcher = EmbeddingBatcher(embedder, max_batch_size=concurrency, max_wait_ms=wait_ms)
+        for label, embed in [("direct", embedder.generate), ("batched", batcher.embed)]:
+            qps, latencies = run_load(embed, queries, concurrency)
+            print(
+                f"{label:>10} {concurrency:8d} {qps:10.0f} "
+                f"{np.percentile(latencies, 50):10.2f} {np.percentile(latencies, 99):10.2f}"
+            )
+        print(f"{'':>10} mean batch size: {batcher.get_stats()['mean_batch_size']:.1f}")
+        batcher.close()
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,85 @@
+import sys
+from pathlib import Path
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.indexing.hybrid_search import HybridSearchEngine
+from backend.indexing.segmented_search import SegmentedSearchEngine
+
+
+WORDS = ["revenue", "tax", "profit", "cash", "dividend", "invoice", "margin", "salary", "rent", "asset"]
+
+
+def make_batches(rng, batch_count: int, batch_size: int, dimension: int):
+    for batch in range(batch_count):
+        embeddings = rng.normal(size=(batch_size, dimension)).astype(np.float32)
+        yield [
+            {
+                "text": " ".join(rng.choice(WORDS, size=60)),
+                "doc_id": batch,
+                "chunk_index": i,
+                "embedding": embeddings[i]
+            }
+            for i in range(batch_size)
+        ]
+
+
+def run_ingest(engine, batches, queries, embeddings, compact_every: int):
+    add_ms, search_ms = [], []
+    for number, batch in enumerate(batches, start=1):
+        start = time.perf_counter()
+        engine.add_chunks(batch)
+        if number % 4 == 0:
+            engine.remove_doc(number - 3)
+        if number % compact_every == 0:
+            engine.compact()
+        add_ms.append((time.perf_counter() - start) * 1000)
+        
+        start = time.perf_counter()
+        engine.hybrid_search(queries[number % len(queries)], embeddings[number % len(queries)], top_k=10)
+        search_ms.append((time.perf_counter() - start) * 1000)
+    return np.array(add_ms), np.array(search_ms)
+
+
+def run_benchmark(batch_count: int = 200, batch_size: int = 250, dimension: int = 384, compact_every: int = 20):
+    print("=" * 70)
+    print("SEGMENTED INGEST BENCHMARK (live document drops)")
+    print("=" * 70)
+    print(f"Batches: {batch_count} x {batch_size} chunks, dimension: {dimension}, compaction every {compact_every} batches")
+    
+    rng = np.random.default_rng(42)
+    queries = [" ".join(rng.choice(WORDS, size=3)) for _ in range(50)]
+    embeddings = rng.normal(size=(50, dimension)).astype(np.float32)
+    
+    print(f"\n{'engine':>12} {'chunks/s':>10} {'write p99 (ms)':>15} {'search p50 (ms)':>16} {'search p99 (ms)':>16}")
+    print("-" * 70)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        engines = [
+            ("monolithic", HybridSearchEngine(), compact_every),
+            ("segmented", SegmentedSearchEngine(tmp, flush_threshold=5000), batch_count + 1)
+        ]
+        for label, engine, every in engines:
+            start = time.perf_counter()
+            add_ms, search_ms = run_ingest(
+                engine, make_batches(np.random.default_rng(7), batch_count, batch_size, dimension),
+                queries, embeddings, every
+            )
+            if isinstance(engine, SegmentedSearchEngine):
+                engine.flush()
+            throughput = batch_count * batch_size / (time.perf_counter() - start)
+            print(
+                f"{label:>12} {throughput:10.0f} {np.percentile(add_ms, 99):15.1f} "
+                f"{np.percentile(search_ms, 50):16.2f} {np.percentile(search_ms, 99):16.2f}"
+            )
+            if isinstance(engine, SegmentedSearchEngine):
+                print(f"{'':>12} segments after ingest: {len(engine.segments)}")
+                engine.close()
+
+
+if __name__ == "__main__":
+    run_benchmark()
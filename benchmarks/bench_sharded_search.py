@@ -0,0 +1,86 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import os
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.indexing.hybrid_search import HybridSearchEngine
+from backend.indexing.sharded_search import ShardedSearchEngine
+
+
+WORDS = [
+    "revenue", "tax", "profit", "cash", "dividend", "invoice", "margin", "salary", "rent", "asset",
+    "audit", "ledger", "equity", "liability", "expense", "budget", "forecast", "loan", "interest", "capital"
+]
+
+
+def make_corpus(rng, count: int, dimension: int, batch_size: int = 10_000):
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        embeddings = rng.normal(size=(size, dimension)).astype(np.float32)
+        yield [
+            {
+                "text": " ".join(rng.choice(WORDS, size=40)),
+                "doc_id": (start + i) // 20,
+                "chunk_index": (start + i) % 20,
+                "embedding": embeddings[i]
+            }
+            for i in range(size)
+        ]
+
+
+def measure_qps(engine, queries, embeddings, clients: int, top_k: int) -> float:
+    def run(i):
+        engine.hybrid_search(queries[i], embeddings[i], top_k=top_k)
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(run, range(len(queries))))
+    return len(queries) / (time.perf_counter() - start)
+
+
+def run_benchmark(
+    corpus_size: int = 200_000,
+    dimension: int = 384,
+    top_k: int = 10,
+    query_count: int = 400,
+    shard_counts=(0, 1, 2, 4, 8, 16, 32)
+):
+    print("=" * 70)
+    print("SHARDED SEARCH THROUGHPUT BENCHMARK")
+    print("=" * 70)
+    cores = os.cpu_count() or 1
+    print(f"Chunks: {corpus_size}, dimension: {dimension}, queries: {query_count}, cores: {cores}")
+    print(f"\n{'shards':>8} {'clients':>8} {'QPS':>10} {'speedup':>10}")
+    print("-" * 70)
+    
+    rng = np.random.default_rng(42)
+    queries = [" ".join(rng.choice(WORDS, size=3)) for _ in range(query_count)]
+    embeddings = rng.normal(size=(query_count, dimension)).astype(np.float32)
+    
+    baseline = None
+    for shards in shard_counts:
+        if shards > cores:
+            continue
+        
+        engine = ShardedSearchEngine(n_shards=shards) if shards else HybridSearchEngine()
+        for batch in make_corpus(np.random.default_rng(7), corpus_size, dimension):
+            engine.add_chunks(batch)
+        
+        clients = max(shards, 1) * 2
+        measure_qps(engine, queries[:20], embeddings[:20], clients, top_k)
+        qps = measure_qps(engine, queries, embeddings, clients, top_k)
+        baseline = baseline or qps
+        label = shards if shards else "single"
+        print(f"{label:>8} {clients:>8} {qps:10.1f} {qps / baseline:9.1f}x")
+        
+        if shards:
+            engine.close()
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+import json
+import subprocess
+import tempfile
+
+import numpy as np
+
+
+ROOT = Path(__file__).parent.parent
+
+COLD_START = """
+import json, sys, time
+start = time.perf_counter()
+from backend.indexing.rag_engine import RAGEngine
+imported = time.perf_counter()
+engine = RAGEngine(documents_path=sys.argv[1], index_path=sys.argv[2])
+constructed = time.perf_counter()
+synonyms = engine.query_expander.expand_search_terms("vat and revenue")
+synonyms_ready = time.perf_counter()
+engine.warmup()
+warmed = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "construct": constructed - imported,
+    "first synonym lookup": synonyms_ready - constructed,
+    "warmup": warmed - synonyms_ready,
+    "total": warmed - start
+}))
+"""
+
+
+def run_benchmark(runs: int = 5):
+    print("=" * 70)
+    print("RAG ENGINE COLD START BENCHMARK")
+    print("=" * 70)
+    print(f"Fresh interpreter per run, {runs} runs")
+    
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for run in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", COLD_START, tmp, str(Path(tmp) / f"index_{run}")],
+                cwd=str(ROOT), capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+            samples.append(json.loads(output))
+    
+    print(f"\n{'phase':>22} {'p50 (ms)':>10} {'max (ms)':>10}")
+    print("-" * 70)
+    for phase in samples[0]:
+        values = np.array([sample[phase] for sample in samples]) * 1000
+        print(f"{phase:>22} {np.percentile(values, 50):10.1f} {values.max():10.1f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.indexing.vector_store import VectorStore
+
+
+def legacy_vector_search(embeddings, query_embedding, top_k):
+    query_vec = np.array(query_embedding).reshape(1, -1)
+    doc_vecs = np.array(embeddings)
+    doc_norms = np.linalg.norm(doc_vecs, axis=1)
+    similarities = (doc_vecs @ query_vec.ravel()) / (doc_norms * np.linalg.norm(query_vec))
+    top_indices = np.argsort(similarities)[::-1][:top_k]
+    return [(int(idx), float(similarities[idx])) for idx in top_indices]
+
+
+def time_queries(search, queries, repeat: int = 1) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            search(query)
+    return (time.perf_counter() - start) / (len(queries) * repeat)
+
+
+def run_benchmark(
+    corpus_sizes=(10_000, 50_000, 200_000),
+    dimension: int = 384,
+    top_k: int = 10,
+    query_count: int = 20,
+    legacy_limit: int = 50_000
+):
+    print("=" * 70)
+    print("VECTOR SEARCH LATENCY BENCHMARK")
+    print("=" * 70)
+    print(f"Dimension: {dimension}, top_k: {top_k}, queries: {query_count}")
+    print(f"\n{'chunks':>10} {'legacy (ms)':>14} {'matrix (ms)':>14} {'speedup':>10}")
+    print("-" * 70)
+    
+    rng = np.random.default_rng(42)
+    queries = rng.normal(size=(query_count, dimension)).astype(np.float32)
+    
+    for size in corpus_sizes:
+        vectors = rng.normal(size=(size, dimension)).astype(np.float32)
+        
+        store = VectorStore()
+        store.add(0, vectors)
+        matrix_ms = time_queries(lambda q: store.search(q, top_k), queries, repeat=3) * 1000
+        
+        legacy_ms = None
+        if size <= legacy_limit:
+            embeddings = vectors.tolist()
+            legacy_ms = time_queries(lambda q: legacy_vector_search(embeddings, q.tolist(), top_k), queries) * 1000
+        
+        legacy_text = f"{legacy_ms:14.2f}" if legacy_ms is not None else f"{'skipped':>14}"
+        speedup_text = f"{legacy_ms / matrix_ms:9.1f}x" if legacy_ms is not None else f"{'-':>10}"
+        print(f"{size:>10} {legacy_text} {matrix_ms:14.2f} {speedup_text}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
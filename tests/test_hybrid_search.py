@@ -0,0 +1,764 @@
+import gc
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.indexing.bitmap_index import Bitmap
+from backend.indexing.bm25_index import BM25Index, tokenize
+from backend.indexing.chunk_store import ChunkStore
+from backend.indexing.hybrid_search import HybridSearchEngine
+from backend.indexing.persistence import load_array
+from backend.indexing.segmented_search import SegmentedSearchEngine
+from backend.indexing.sharded_search import ShardedSearchEngine
+from backend.indexing.vector_store import VectorStore
+
+
+TEXTS = [
+    "Quarterly revenue grew twelve percent on strong product sales",
+    "Operating expenses increased due to higher salaries and rent",
+    "Net profit margin improved as cost of goods sold declined",
+    "Sales tax liabilities were settled with the state authority",
+    "Cash flow from operations funded the dividend payment",
+    "Accounts receivable ageing shows most invoices paid within thirty days",
+]
+
+
+def make_chunks(doc_id: int, texts, dimension: int = 16, seed: int = 0):
+    rng = np.random.default_rng(seed + doc_id)
+    return [
+        {
+            "text": text,
+            "chunk_index": i,
+            "doc_id": doc_id,
+            "file_name": f"doc_{doc_id}.txt",
+            "embedding": rng.normal(size=dimension).tolist()
+        }
+        for i, text in enumerate(texts)
+    ]
+
+
+def test_incremental_add_and_remove():
+    print("=" * 60)
+    print("Hybrid Search Incremental Index Test")
+    print("=" * 60)
+    
+    engine = HybridSearchEngine()
+    first = make_chunks(0, TEXTS[:3])
+    second = make_chunks(1, TEXTS[3:])
+    
+    slots = engine.add_chunks(first)
+    assert slots == [0, 1, 2]
+    slots = engine.add_chunks(second)
+    assert slots == [3, 4, 5]
+    print(f"\n✓ Indexed {engine.get_document_count()} chunks incrementally")
+    
+    results = engine.hybrid_search("revenue", second[0]["embedding"], top_k=3)
+    assert results[0]["doc_id"] == 1
+    print(f"✓ Top hit for own embedding: doc {results[0]['doc_id']}")
+    
+    removed = engine.remove_doc(1)
+    assert removed == 3
+    assert engine.get_document_count() == 3
+    results = engine.hybrid_search("sales tax", second[0]["embedding"], top_k=5)
+    assert all(r["doc_id"] == 0 for r in results)
+    print(f"✓ Removed doc 1 ({removed} chunks), results only from doc 0")
+    
+    engine.compact()
+    assert len(engine.documents) == 3
+    assert engine.doc_chunks == {0: [0, 1, 2]}
+    print("✓ Compaction reclaimed deleted chunks")
+
+
+def test_remove_chunks_without_embeddings():
+    engine = HybridSearchEngine()
+    engine.add_chunks([{**chunk, "embedding": [1.0, 0.0, 0.0]} for chunk in make_chunks(1, TEXTS[:2], dimension=3)])
+    engine.add_chunks([{key: value for key, value in chunk.items() if key != "embedding"} for chunk in make_chunks(2, TEXTS[2:4])])
+    assert len(engine.vectors) == 2 and len(engine.documents) == 4
+    
+    assert engine.remove_doc(2) == 2
+    assert [slot for slot, _ in engine.vector_search([1, 0, 0])] == [0, 1]
+    assert [[slot for slot, _ in results] for results in engine.vector_search_batch([[1, 0, 0]] * 2)] == [[0, 1], [0, 1]]
+    assert {r["doc_id"] for r in engine.hybrid_search("profit margin", [1, 0, 0])} == {1}
+    
+    engine.remove_doc(1)
+    assert engine.vector_search([1, 0, 0]) == []
+    print("✓ Removed chunks without embeddings without touching the vector store")
+
+
+def test_compaction_matches_full_rebuild():
+    chunks = make_chunks(0, TEXTS[:2]) + make_chunks(1, TEXTS[2:])
+    
+    incremental = HybridSearchEngine()
+    incremental.add_chunks(chunks[:2])
+    incremental.add_chunks(chunks[2:])
+    incremental.compact()
+    
+    rebuilt = HybridSearchEngine()
+    rebuilt.index_documents(chunks)
+    
+    for query in ["sales tax", "profit margin", "dividend cash flow"]:
+        assert incremental.keyword_search(query) == rebuilt.keyword_search(query)
+    print("✓ Compacted index matches a full rebuild")
+
+
+def index_footprint(engine: HybridSearchEngine):
+    bitmaps = [bitmap for values in engine.metadata_index.bitmaps.values() for bitmap in values.values()]
+    return (
+        engine.documents.nbytes,
+        sum(len(table) for table in engine.documents.tables.values()),
+        sum(bitmap.nbytes for bitmap in bitmaps)
+    )
+
+
+def test_compaction_replays_concurrent_changes():
+    replacement = make_chunks(3, ["Revised guidance lifts the dividend payout ratio"], seed=7)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = HybridSearchEngine(vector_storage="int8", rescore_path=str(Path(tmp) / "vectors.f32"))
+        for doc_id in range(4):
+            engine.add_chunks(make_chunks(doc_id, TEXTS[doc_id:doc_id + 2]))
+        engine.remove_doc(1)
+        
+        snapshot = engine.begin_compaction()
+        engine.remove_doc(2)
+        engine.remove_doc(3)
+        engine.add_chunks(make_chunks(4, TEXTS[4:]))
+        engine.add_chunks(replacement)
+        engine.add_chunks(make_chunks(5, TEXTS[:1]))
+        engine.remove_doc(5)
+        assert len(snapshot.documents) == 8 and len(snapshot.deleted) == 2
+        
+        assert engine.finish_compaction(snapshot, snapshot.compacted())
+        rebuilt = HybridSearchEngine(vector_storage="int8", rescore_path=str(Path(tmp) / "rebuilt.f32"))
+        rebuilt.add_chunks(make_chunks(0, TEXTS[:2]) + make_chunks(4, TEXTS[4:]) + replacement)
+        
+        assert engine.document_ids() == [0, 3, 4] and engine.get_document_count() == 5
+        assert len(engine.deleted) == 4 and len(engine.vectors) == len(engine.documents)
+        footprint = index_footprint(engine)
+        engine.compact()
+        assert engine.tombstone_ratio() == 0.0
+        assert all(after < before for after, before in zip(index_footprint(engine), footprint))
+        assert sorted(engine.documents.tables["file_name"].values) == ["doc_0.txt", "doc_3.txt", "doc_4.txt"]
+        assert sorted(engine.metadata_index.values("file_name")) == ["doc_0.txt", "doc_3.txt", "doc_4.txt"]
+        assert list(engine.documents.texts()) == list(rebuilt.documents.texts())
+        embeddings = [chunk["embedding"] for chunk in replacement + make_chunks(0, TEXTS[:1])]
+        for expected, results in zip(rebuilt.vector_search_batch(embeddings, top_k=5), engine.vector_search_batch(embeddings, top_k=5)):
+            assert [slot for slot, _ in results] == [slot for slot, _ in expected]
+            assert np.allclose([score for _, score in results], [score for _, score in expected], atol=1e-5)
+        for query in ["sales tax", "dividend payout", "revenue"]:
+            assert engine.keyword_search(query) == rebuilt.keyword_search(query)
+        assert (Path(tmp) / "vectors.f32").stat().st_size == 5 * 16 * 4
+        assert not (Path(tmp) / "vectors.f32.tmp").exists()
+        
+        snapshot = engine.begin_compaction()
+        engine.clear_index()
+        assert not engine.finish_compaction(snapshot, snapshot.compacted()) and not len(engine.documents)
+    print("✓ Off-lock compaction replays removals and additions made during the rebuild")
+
+
+def test_vector_search_matches_cosine_ranking():
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(500, 32))
+    query = rng.normal(size=32)
+    
+    engine = HybridSearchEngine()
+    engine.add_chunks([
+        {"text": f"chunk {i}", "embedding": vector.tolist()}
+        for i, vector in enumerate(vectors)
+    ])
+    
+    cosine = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    expected = np.argsort(-cosine)[:10]
+    results = engine.vector_search(query.tolist(), top_k=10)
+    
+    assert [idx for idx, _ in results] == expected.tolist()
+    assert np.allclose([score for _, score in results], cosine[expected], atol=1e-5)
+    print("✓ Vector search matches brute-force cosine ranking")
+
+
+def test_ivf_vector_index():
+    rng = np.random.default_rng(11)
+    vectors = rng.normal(size=(2000, 32))
+    query = rng.normal(size=32)
+    chunks = [{"text": f"chunk {i}", "embedding": v.tolist()} for i, v in enumerate(vectors)]
+    
+    exact = HybridSearchEngine()
+    exact.add_chunks(chunks)
+    
+    approximate = HybridSearchEngine(vector_index="ivf")
+    approximate.add_chunks(chunks)
+    approximate.compact()
+    n_lists = len(approximate.ann_index.lists)
+    print(f"\n✓ IVF index built with {n_lists} lists")
+    
+    expected = exact.vector_search(query.tolist(), top_k=10)
+    assert approximate.vector_search(query.tolist(), top_k=10, nprobe=n_lists) == expected
+    
+    partial = approximate.vector_search(query.tolist(), top_k=10, nprobe=4)
+    assert len(partial) == 10
+    print(f"✓ Recall@10 with nprobe=4: {len(set(partial) & set(expected)) / 10:.1f}")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "ivf.npz")
+        approximate.save_ann_index(path)
+        approximate.load_ann_index(path)
+    assert approximate.vector_search(query.tolist(), top_k=10, nprobe=4) == partial
+    print("✓ IVF index survives save/load")
+
+
+def brute_force_bm25(texts, query, k1=1.2, b=0.75):
+    documents = [tokenize(text) for text in texts]
+    average_length = sum(len(doc) for doc in documents) / len(documents)
+    scores = np.zeros(len(documents))
+    for term in set(tokenize(query)):
+        df = sum(1 for doc in documents if term in doc)
+        if not df:
+            continue
+        idf = np.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+        for i, doc in enumerate(documents):
+            tf = doc.count(term)
+            scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / average_length))
+    return scores
+
+
+def test_bm25_matches_brute_force():
+    rng = np.random.default_rng(3)
+    vocabulary = [f"term{i}" for i in range(8000)]
+    texts = [
+        " ".join(rng.choice(vocabulary[:200], size=rng.integers(5, 40)))
+        + f" account{i}"
+        for i in range(1500)
+    ]
+    
+    index = BM25Index()
+    index.add(0, texts)
+    print(f"\n✓ BM25 vocabulary size: {index.vocabulary_size} (no cap)")
+    
+    for query in ["term1 term7 term150", "term42", "account1234 term3", "missing words"]:
+        expected = brute_force_bm25(texts, query)
+        results = index.search(query, top_k=10)
+        top = [int(i) for i in np.argsort(-expected, kind="stable")[:10] if expected[i] > 0]
+        assert np.allclose([score for _, score in results], expected[top], atol=1e-4)
+        assert np.allclose([expected[idx] for idx, _ in results], [score for _, score in results], atol=1e-4)
+    
+    assert index.search("account1234", top_k=1)[0][0] == 1234
+    print("✓ BM25 MaxScore top-k matches exhaustive scoring")
+
+
+def test_batch_search_matches_single_queries():
+    rng = np.random.default_rng(5)
+    words = ["revenue", "tax", "profit", "cash", "dividend", "invoice", "margin", "salary", "rent", "asset"]
+    chunks = [
+        {
+            "text": " ".join(rng.choice(words, size=12)),
+            "doc_id": i // 10,
+            "chunk_index": i % 10,
+            "embedding": rng.normal(size=24).tolist()
+        }
+        for i in range(300)
+    ]
+    engine = HybridSearchEngine()
+    engine.add_chunks(chunks)
+    engine.remove_doc(3)
+    
+    queries = ["revenue tax", "cash dividend", "rent", "unknown words", "profit margin asset"]
+    embeddings = rng.normal(size=(len(queries), 24)).tolist()
+    
+    batched = engine.hybrid_search_batch(queries, embeddings, top_k=7)
+    for query, embedding, batch_results in zip(queries, embeddings, batched):
+        single = engine.hybrid_search(query, embedding, top_k=7)
+        assert [(r["doc_id"], r["chunk_index"]) for r in batch_results] == [(r["doc_id"], r["chunk_index"]) for r in single]
+        assert np.allclose([r["score"] for r in batch_results], [r["score"] for r in single])
+    
+    for filters in (None, {"doc_id": [1, 2, 3, 5]}):
+        assert engine.keyword_search_batch(queries, 7, filters) == [engine.keyword_search(q, 7, filters=filters) for q in queries]
+        for embedding, batch_results in zip(embeddings, engine.vector_search_batch(embeddings, 7, filters=filters)):
+            single = engine.vector_search(embedding, 7, filters=filters)
+            assert [slot for slot, _ in batch_results] == [slot for slot, _ in single]
+            assert np.allclose([score for _, score in batch_results], [score for _, score in single])
+    print(f"\n✓ Batched search matches {len(queries)} single-query calls")
+
+
+def test_quantized_vector_storage():
+    rng = np.random.default_rng(13)
+    vectors = rng.normal(size=(3000, 32)).astype(np.float32)
+    queries = rng.normal(size=(20, 32)).astype(np.float32)
+    
+    exact = VectorStore()
+    exact.add(0, vectors)
+    expected = [[idx for idx, _ in exact.search(q, 10)] for q in queries]
+    
+    print("")
+    with tempfile.TemporaryDirectory() as tmp:
+        for storage, options in (("float16", {}), ("int8", {}), ("pq", {"n_subvectors": 8, "train_size": 1000})):
+            store = VectorStore(storage=storage, rescore_path=str(Path(tmp) / f"{storage}.f32"), rescore_factor=10, **options)
+            store.add(0, vectors)
+            assert store.nbytes < exact.nbytes
+            
+            found = [[idx for idx, _ in store.search(q, 10)] for q in queries]
+            recall = np.mean([len(set(f) & set(e)) / 10 for f, e in zip(found, expected)])
+            assert recall >= 0.9
+            assert store.search_batch(queries, 10) == [store.search(q, 10) for q in queries]
+            print(f"✓ {storage}: {store.nbytes / len(vectors):.0f} bytes/vector, recall@10 with rescoring {recall:.2f}")
+        
+        small = VectorStore(storage="pq", n_subvectors=8)
+        small.add(0, vectors[:100])
+        assert small.get_stats()["storage"] == "pq (untrained, float32)" and small.nbytes == 100 * 32 * 4
+        small.train()
+        assert small.get_stats()["storage"] == "pq" and len(small) == 100 and small.nbytes == 100 * 8 + small.codec.codebooks.nbytes
+        small.save(Path(tmp))
+        assert not (Path(tmp) / "vectors_pending.npy").exists()
+        assert VectorStore.load(Path(tmp)).search(queries[0], 5) == small.search(queries[0], 5)
+        
+        streamed = VectorStore(storage="pq", n_subvectors=8)
+        for start in range(0, 300, 20):
+            streamed.add(start, vectors[start:start + 20])
+        assert streamed.codec.is_trained and streamed.codec.pending is None and len(streamed) == 300
+        
+        engine = HybridSearchEngine(vector_storage="int8", rescore_path=str(Path(tmp) / "engine.f32"))
+        engine.add_chunks(make_chunks(0, TEXTS[:3], dimension=32) + make_chunks(1, TEXTS[3:], dimension=32))
+        target = engine.vectors.full_vectors.rows(np.array([4]))[0]
+        engine.remove_doc(0)
+        engine.compact()
+        assert engine.vector_search(target.tolist(), top_k=1)[0][0] == 1
+        assert (Path(tmp) / "engine.f32").stat().st_size == 3 * 32 * 4
+        assert not (Path(tmp) / "engine.f32.tmp").exists()
+    print("✓ Quantized vectors survive compaction without re-encoding")
+
+
+def test_sharded_search_matches_single_engine():
+    rng = np.random.default_rng(9)
+    words = ["revenue", "tax", "profit", "cash", "dividend", "invoice", "margin", "salary", "rent", "asset", "audit", "ledger"]
+    chunks = [
+        {
+            "text": " ".join(rng.choice(words, size=rng.integers(4, 16))),
+            "doc_id": i // 10,
+            "chunk_index": i % 10,
+            "embedding": rng.normal(size=24).tolist()
+        }
+        for i in range(200)
+    ]
+    queries = ["revenue tax", "cash dividend audit", "rent", "unknown words", "profit margin ledger"]
+    embeddings = rng.normal(size=(len(queries), 24)).tolist()
+    
+    def key(results):
+        return [(r["doc_id"], r["chunk_index"]) for r in results]
+    
+    def check(sharded, engine):
+        assert sharded.get_document_count() == engine.get_document_count()
+        batched = sharded.hybrid_search_batch(queries, embeddings, top_k=6)
+        for query, embedding, batch_results in zip(queries, embeddings, batched):
+            expected = engine.hybrid_search(query, embedding, top_k=6)
+            assert key(sharded.hybrid_search(query, embedding, top_k=6)) == key(expected)
+            assert key(batch_results) == key(expected)
+            assert np.allclose([r["score"] for r in batch_results], [r["score"] for r in expected])
+            keyword_scores = [score for _, score in sharded.keyword_search(query, 10)]
+            assert np.allclose(keyword_scores, [score for _, score in engine.keyword_search(query, 10)])
+            filtered = sharded.hybrid_search(query, embedding, top_k=6, filters={"doc_id": [2, 7]})
+            assert key(filtered) == key(engine.hybrid_search(query, embedding, top_k=6, filters={"doc_id": [2, 7]}))
+    
+    engine = HybridSearchEngine()
+    with tempfile.TemporaryDirectory() as tmp, ShardedSearchEngine(n_shards=3, directory=tmp) as sharded:
+        for start in (0, 120):
+            engine.add_chunks(chunks[start:start + 120])
+            sharded.add_chunks(chunks[start:start + 120])
+        engine.remove_doc(4)
+        sharded.remove_doc(4)
+        check(sharded, engine)
+        assert [(Path(tmp) / f"shard_{shard}" / "vectors.f32").stat().st_size for shard in range(3)] == [67 * 24 * 4] * 2 + [66 * 24 * 4]
+        
+        engine.compact()
+        sharded.compact()
+        assert sharded.tombstone_ratio() == 0.0
+        check(sharded, engine)
+        
+        extra = [dict(chunk, doc_id=chunk["doc_id"] + 100) for chunk in chunks[:30]]
+        engine.add_chunks(extra)
+        sharded.add_chunks(extra)
+        engine.remove_doc(101)
+        sharded.remove_doc(101)
+        check(sharded, engine)
+        
+        sharded.save(Path(tmp) / "saved")
+        with ShardedSearchEngine(n_shards=3, directory=Path(tmp) / "reloaded") as reloaded:
+            reloaded.load(Path(tmp) / "saved")
+            assert reloaded.document_ids() == sharded.document_ids()
+            assert [view["chunk_index"] for view in reloaded.document_chunks(102)] == list(range(10))
+            check(reloaded, engine)
+    
+    sharded.close()
+    for call in (lambda: sharded.hybrid_search(queries[0], embeddings[0]), lambda: sharded.add_chunks(chunks[:1])):
+        try:
+            call()
+            assert False, "closed engine accepted a call"
+        except RuntimeError:
+            pass
+    print(f"\n✓ Sharded search matches the single engine across {len(queries)} queries")
+
+
+def test_bitmap_set_operations():
+    rng = np.random.default_rng(11)
+    left_values = np.concatenate([rng.integers(0, 200_000, size=3000), np.arange(70_000, 80_000)])
+    right_values = np.concatenate([rng.integers(0, 200_000, size=5000), np.arange(75_000, 140_000, 3)])
+    left, right = Bitmap(left_values), Bitmap(right_values)
+    left_set, right_set = set(left_values.tolist()), set(right_values.tolist())
+    
+    assert left.to_array().tolist() == sorted(left_set)
+    assert (left & right).to_array().tolist() == sorted(left_set & right_set)
+    assert (left | right).to_array().tolist() == sorted(left_set | right_set)
+    assert (left - right).to_array().tolist() == sorted(left_set - right_set)
+    assert len(left | right) == len(left_set | right_set)
+    assert 75_000 in left and 199_999 not in Bitmap([1, 2, 3])
+    print(f"\n✓ Bitmap operations match Python sets ({len(left | right)} values)")
+
+
+def test_metadata_filters():
+    rng = np.random.default_rng(13)
+    words = ["revenue", "tax", "profit", "cash", "dividend", "invoice"]
+    chunks = []
+    for doc_id, file_type in enumerate(["pdf", "xlsx", "pdf", "docx", "pdf", "xlsx"]):
+        for i in range(15):
+            chunks.append({
+                "text": " ".join(rng.choice(words, size=8)),
+                "chunk_index": i,
+                "doc_id": doc_id,
+                "file_name": f"doc_{doc_id}.{file_type}",
+                "metadata": {"file_type": file_type, "file_name": f"doc_{doc_id}.{file_type}"},
+                "embedding": rng.normal(size=16).tolist()
+            })
+    
+    engine = HybridSearchEngine()
+    engine.add_chunks(chunks)
+    engine.remove_doc(2)
+    embedding = rng.normal(size=16).tolist()
+    
+    results = engine.hybrid_search("revenue tax", embedding, top_k=10, filters={"file_type": "pdf"})
+    assert len(results) == 10
+    assert {r["doc_id"] for r in results} <= {0, 4}
+    
+    expected = [
+        (slot, score) for slot, score in engine.vector_search(embedding, top_k=len(chunks))
+        if chunks[slot]["metadata"]["file_type"] == "pdf"
+    ][:5]
+    assert engine.vector_search(embedding, top_k=5, filters={"file_type": "pdf"}) == expected
+    
+    results = engine.hybrid_search("cash", embedding, top_k=20, filters={"file_type": ["xlsx", "docx"], "doc_id": [1, 3]})
+    assert {r["doc_id"] for r in results} == {1, 3}
+    assert engine.hybrid_search("cash", embedding, filters={"file_name": "missing.pdf"}) == []
+    
+    results = engine.hybrid_search("cash", embedding, top_k=30, filters=[{"doc_id": 0}, {"doc_id": [2, 5], "chunk_index": [3, 4]}])
+    assert sorted((r["doc_id"], r["chunk_index"]) for r in results if r["doc_id"] != 0) == [(5, 3), (5, 4)]
+    assert len(results) == 17
+    
+    engine.compact()
+    results = engine.hybrid_search("dividend", embedding, top_k=30, filters={"file_name": "doc_5.xlsx"})
+    assert len(results) == 15 and {r["doc_id"] for r in results} == {5}
+    print("\n✓ Metadata filters restrict scoring to matching chunks")
+
+
+def test_chunk_store_round_trip():
+    chunks = make_chunks(0, TEXTS) + make_chunks(1, ["Résumé of naïve café spending 💶"])
+    for chunk in chunks:
+        chunk["metadata"] = {"file_type": "pdf", "file_name": chunk["file_name"]}
+    chunks[2]["page"] = 7
+    
+    store = ChunkStore()
+    store.add(chunks[:4])
+    store.add(chunks[4:])
+    assert len(store) == len(chunks)
+    assert len(store.tables["metadata"]) == 2
+    
+    for slot, chunk in enumerate(chunks):
+        expected = {key: value for key, value in chunk.items() if key != "embedding"}
+        assert store.record(slot) == expected
+        assert dict(store[slot]) == expected
+    
+    view = store.view(6, score=0.5, rank=1)
+    assert view.to_dict(["text", "score"]) == {"text": chunks[6]["text"], "score": 0.5}
+    
+    subset = store.take(np.array([6, 2, 0]))
+    assert [subset.text(slot) for slot in range(3)] == [chunks[6]["text"], chunks[2]["text"], chunks[0]["text"]]
+    assert subset.value(1, "page") == 7 and subset.value(0, "page") is None
+    runs = store.take(np.array([1, 2, 3, 5, 6]))
+    assert list(runs.texts()) == [chunks[slot]["text"] for slot in (1, 2, 3, 5, 6)]
+    assert len(store.take(np.array([], dtype=np.int64))) == 0
+    
+    survivors = store.take(np.arange(len(TEXTS)))
+    assert survivors.tables["file_name"].values == ["doc_0.txt"]
+    assert survivors.field_codes("file_name")[1] == ["doc_0.txt"]
+    assert all(entry["file_name"] == "doc_0.txt" for entry in survivors.tables["metadata"].values)
+    assert [survivors.record(slot) for slot in range(len(TEXTS))] == [store.record(slot) for slot in range(len(TEXTS))]
+    survivors.add(chunks[-1:])
+    assert survivors.record(len(TEXTS)) == store.record(len(chunks) - 1)
+    print(f"\n✓ Chunk store round-trips {len(chunks)} chunks in {store.nbytes} bytes")
+
+
+def test_binary_index_round_trip():
+    rng = np.random.default_rng(17)
+    words = ["revenue", "tax", "profit", "cash", "dividend", "invoice", "margin", "salary"]
+    chunks = [
+        {
+            "text": " ".join(rng.choice(words, size=10)),
+            "doc_id": i // 20,
+            "chunk_index": i % 20,
+            "file_name": f"doc_{i // 20}.pdf",
+            "metadata": {"file_type": "pdf" if i // 20 % 2 else "xlsx"},
+            "embedding": rng.normal(size=16).tolist()
+        }
+        for i in range(400)
+    ]
+    queries = ["revenue tax", "cash dividend", "salary"]
+    embeddings = rng.normal(size=(len(queries), 16)).tolist()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for vector_index, storage in [("exact", "float32"), ("ivf", "int8")]:
+            engine = HybridSearchEngine(vector_index=vector_index, vector_storage=storage)
+            engine.add_chunks(chunks)
+            engine.remove_doc(2)
+            if vector_index == "ivf":
+                engine.build_ann_index()
+            engine.save(f"{tmp}/{storage}")
+            
+            loaded = HybridSearchEngine()
+            manifest = loaded.load(f"{tmp}/{storage}")
+            assert manifest["chunk_count"] == len(chunks)
+            assert loaded.vector_storage == storage and loaded.get_document_count() == engine.get_document_count()
+            for query, embedding in zip(queries, embeddings):
+                for filters in (None, {"file_type": "pdf"}):
+                    expected = engine.hybrid_search(query, embedding, top_k=8, filters=filters)
+                    assert loaded.hybrid_search(query, embedding, top_k=8, filters=filters) == expected
+            
+            loaded.add_chunks(make_chunks(50, TEXTS))
+            loaded.compact()
+            assert loaded.get_document_count() == engine.get_document_count() + len(TEXTS)
+        
+        manifest_path = Path(tmp) / "float32" / "manifest.json"
+        manifest_path.write_text(manifest_path.read_text().replace('"format_version": 1', '"format_version": 99'))
+        try:
+            HybridSearchEngine().load(f"{tmp}/float32")
+            assert False, "expected a format version error"
+        except ValueError:
+            pass
+    print("\n✓ Binary index round-trips through save/load")
+
+
+def test_memory_mapped_text_arena():
+    chunks = make_chunks(0, TEXTS) + make_chunks(1, ["Résumé of naïve café spending 💶"])
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = HybridSearchEngine(text_path=str(Path(tmp) / "chunks.arena"))
+        engine.add_chunks(chunks[:4])
+        engine.add_chunks(chunks[4:])
+        
+        arena = engine.documents.text_bytes
+        assert isinstance(arena.tail, np.memmap)
+        assert arena.path.name.startswith("chunks.") and arena.path.suffix == ".arena"
+        assert arena.path.stat().st_size == sum(len(chunk["text"].encode("utf-8")) for chunk in chunks)
+        assert list(engine.documents.texts()) == [chunk["text"] for chunk in chunks]
+        
+        other = HybridSearchEngine(text_path=str(Path(tmp) / "chunks.arena"))
+        other.add_chunks(chunks[:1])
+        assert other.documents.text_bytes.path != arena.path
+        assert list(engine.documents.texts()) == [chunk["text"] for chunk in chunks]
+        
+        reference = HybridSearchEngine()
+        reference.add_chunks(chunks)
+        assert engine.keyword_search("sales tax", top_k=3) == reference.keyword_search("sales tax", top_k=3)
+        
+        stale = engine.document_chunks(0)
+        engine.remove_doc(0)
+        engine.compact()
+        assert stale[1]["text"] == TEXTS[1] and arena.path.exists()
+        assert [chunk["text"] for chunk in engine.document_chunks(1)] == [chunks[-1]["text"]]
+        assert engine.documents.text_bytes.path.read_bytes().decode("utf-8") == chunks[-1]["text"]
+        
+        stale_path = arena.path
+        del stale, arena
+        gc.collect()
+        assert not stale_path.exists()
+        
+        engine.add_chunks(make_chunks(2, TEXTS[:2]))
+        engine.save(Path(tmp) / "index")
+        loaded = HybridSearchEngine(text_path=str(Path(tmp) / "chunks.arena"))
+        loaded.load(Path(tmp) / "index")
+        assert isinstance(loaded.documents.text_bytes.base, np.memmap) and loaded.documents.text_bytes.path is None
+        assert list(loaded.documents.texts()) == [chunks[-1]["text"]] + TEXTS[:2]
+        loaded.add_chunks(make_chunks(3, TEXTS[2:3]))
+        loaded.remove_doc(1)
+        loaded.compact()
+        assert list(loaded.documents.texts()) == TEXTS[:3]
+    print("\n✓ Chunk text served from a memory-mapped arena")
+
+
+def test_segmented_engine_recovers_and_merges():
+    rng = np.random.default_rng(23)
+    words = ["revenue", "tax", "profit", "cash", "dividend", "invoice", "margin", "salary"]
+    chunks = [
+        {
+            "text": " ".join(rng.choice(words, size=10)),
+            "doc_id": i // 20,
+            "chunk_index": i % 20,
+            "file_name": f"doc_{i // 20}.pdf",
+            "embedding": rng.normal(size=16).tolist()
+        }
+        for i in range(400)
+    ]
+    queries = ["revenue tax", "cash dividend", "salary"]
+    embeddings = rng.normal(size=(len(queries), 16)).tolist()
+    
+    def hits(engine):
+        return [
+            [(result["doc_id"], result["chunk_index"], round(result["score"], 5)) for result in results]
+            for results in engine.hybrid_search_batch(queries, embeddings, top_k=5)
+        ]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = SegmentedSearchEngine(tmp, flush_threshold=50, merge_factor=100, background=False)
+        reference = HybridSearchEngine()
+        for start in range(0, len(chunks), 20):
+            engine.add_chunks(chunks[start:start + 20])
+            reference.add_chunks(chunks[start:start + 20])
+        for doc_id in (3, 7, 19):
+            assert engine.remove_doc(doc_id) == reference.remove_doc(doc_id) == 20
+        
+        assert len(engine.segments) == 6
+        for query in queries:
+            assert engine.keyword_search(query, top_k=10) == reference.keyword_search(query, top_k=10)
+        assert engine.vector_search_batch(embeddings, top_k=10) == reference.vector_search_batch(embeddings, top_k=10)
+        assert hits(engine) == hits(reference)
+        
+        recovered = SegmentedSearchEngine(tmp, flush_threshold=50, merge_factor=100, background=False)
+        assert recovered.get_document_count() == 340
+        assert hits(recovered) == hits(reference)
+        
+        recovered.compact()
+        live = [chunk for chunk in chunks if chunk["doc_id"] not in (3, 7, 19)]
+        rebuilt = HybridSearchEngine()
+        rebuilt.add_chunks(live)
+        assert len(recovered.segments) == 1 and recovered.tombstone_ratio() == 0.0
+        assert hits(recovered) == hits(rebuilt)
+        recovered.close()
+        engine.close()
+        
+        merging = SegmentedSearchEngine(Path(tmp) / "merging", flush_threshold=20, merge_factor=2)
+        for start in range(0, len(chunks), 10):
+            merging.add_chunks(chunks[start:start + 10])
+        merging.flush()
+        assert len(merging.segments) < len(chunks) // 20
+        assert merging.get_document_count() == len(chunks)
+        merging.close()
+        assert SegmentedSearchEngine(Path(tmp) / "merging").get_document_count() == len(chunks)
+    print("\n✓ Segmented engine recovers from its write-ahead log and merges segments")
+
+
+def test_segmented_flush_survives_removals_and_failures():
+    chunks = make_chunks(0, TEXTS[:2]) + make_chunks(1, TEXTS[2:4]) + make_chunks(2, TEXTS[4:6])
+    save = HybridSearchEngine.save
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = SegmentedSearchEngine(tmp, flush_threshold=100)
+        engine.add_chunks(chunks)
+        
+        def failing_save(segment, directory):
+            raise OSError("disk full")
+        
+        HybridSearchEngine.save = failing_save
+        try:
+            try:
+                engine.flush()
+                raise AssertionError("flush should report the failed segment save")
+            except RuntimeError as e:
+                assert "disk full" in str(e)
+            assert len(engine._flush_queue) == 1
+            
+            def removing_save(segment, directory):
+                engine.remove_doc(1)
+                save(segment, directory)
+            
+            HybridSearchEngine.save = removing_save
+            engine.flush()
+        finally:
+            HybridSearchEngine.save = save
+        
+        name, segment = engine.segments[0]
+        assert not engine._flush_queue and engine._error is None
+        assert not load_array(Path(tmp) / name, "deleted", mmap=False).size
+        assert sorted(segment.doc_chunks) == [0, 2] and engine.get_document_count() == 4
+        engine.close()
+        
+        recovered = SegmentedSearchEngine(tmp)
+        assert recovered.document_ids() == [0, 2] and recovered.get_document_count() == 4
+        recovered.close()
+    print("\n✓ Segment flush saves a snapshot and retries after a failed save")
+
+
+def test_segmented_search_runs_outside_the_lock():
+    chunks = make_chunks(0, TEXTS[:3]) + make_chunks(1, TEXTS[3:])
+    vector_search_batch = HybridSearchEngine.vector_search_batch
+    entered = threading.Event()
+    release = threading.Event()
+    
+    def blocking_search(segment, *args, **kwargs):
+        entered.set()
+        release.wait(10)
+        return vector_search_batch(segment, *args, **kwargs)
+    
+    def hits(results):
+        return [(result["doc_id"], result["chunk_index"], round(result["score"], 5)) for result in results]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = SegmentedSearchEngine(tmp, flush_threshold=100)
+        engine.add_chunks(chunks)
+        query, embedding = "revenue sales profit", chunks[0]["embedding"]
+        expected = hits(engine.hybrid_search(query, embedding, top_k=4))
+        assert 0 in [doc_id for doc_id, _, _ in expected]
+        
+        results = []
+        HybridSearchEngine.vector_search_batch = blocking_search
+        try:
+            searching = threading.Thread(target=lambda: results.append(engine.hybrid_search(query, embedding, top_k=4)))
+            searching.start()
+            assert entered.wait(10)
+            
+            def ingest():
+                engine.add_chunks(make_chunks(2, TEXTS[:3]))
+                engine.remove_doc(0)
+            
+            ingesting = threading.Thread(target=ingest)
+            ingesting.start()
+            ingesting.join(5)
+            assert not ingesting.is_alive() and searching.is_alive()
+        finally:
+            release.set()
+            HybridSearchEngine.vector_search_batch = vector_search_batch
+        searching.join(10)
+        
+        assert hits(results[0]) == expected
+        assert 0 not in [doc_id for doc_id, _, _ in hits(engine.hybrid_search(query, embedding, top_k=4))]
+        assert engine.get_document_count() == 6
+        engine.close()
+    print("\n✓ Segmented search scores a snapshot while ingestion continues")
+
+
+if __name__ == "__main__":
+    test_incremental_add_and_remove()
+    test_remove_chunks_without_embeddings()
+    test_compaction_matches_full_rebuild()
+    test_compaction_replays_concurrent_changes()
+    test_vector_search_matches_cosine_ranking()
+    test_ivf_vector_index()
+    test_bm25_matches_brute_force()
+    test_batch_search_matches_single_queries()
+    test_quantized_vector_storage()
+    test_sharded_search_matches_single_engine()
+    test_bitmap_set_operations()
+    test_metadata_filters()
+    test_chunk_store_round_trip()
+    test_binary_index_round_trip()
+    test_memory_mapped_text_arena()
+    test_segmented_engine_recovers_and_merges()
+    test_segmented_flush_survives_removals_and_failures()
+    test_segmented_search_runs_outside_the_lock()
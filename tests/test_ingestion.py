@@ -1,9 +1,12 @@
+import shutil
 import sys
+import tempfile
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from backend.ingestion.document_processor import DocumentProcessor
+from backend.ingestion.provenance import ProvenanceIndex, join_with_offsets
 
 
 def test_document_processor():
@@ -38,6 +41,57 @@ def test_document_processor():
     print("3. Verify text extraction works correctly")
 
 
+def test_parse_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        report = Path(tmp) / "report.txt"
+        report.write_text("Quarterly revenue grew twelve percent.\n" * 50)
+        
+        processor = DocumentProcessor(cache_dir=str(Path(tmp) / "cache"))
+        parsed = []
+        parse = processor.txt_parser.parse
+        processor.txt_parser.parse = lambda file_path: parsed.append(file_path) or parse(file_path)
+        
+        first = processor.process(str(report))
+        assert processor.process(str(report)) == first
+        assert len(parsed) == 1
+        
+        copy = Path(tmp) / "copy.txt"
+        shutil.copy(report, copy)
+        copied = processor.process(str(copy))
+        assert len(parsed) == 1
+        assert copied["file_name"] == "copy.txt" and copied["file_path"] == str(copy)
+        
+        report.write_text("Quarterly revenue fell two percent.\n" * 50)
+        changed = processor.process(str(report))
+        assert len(parsed) == 2 and "fell" in changed["full_text"]
+        
+        restarted = DocumentProcessor(cache_dir=str(Path(tmp) / "cache"))
+        restarted.txt_parser.parse = None
+        assert restarted.process(str(report)) == changed
+        
+        stats = processor.cache.get_stats()
+        assert (stats["hits"], stats["misses"]) == (2, 2)
+        print(f"\n✓ Parse cache served {stats['hits']} of {stats['hits'] + stats['misses']} lookups")
+
+
+def test_provenance_index():
+    text, starts = join_with_offsets(["first page", "", "third page text"], "\n\n")
+    assert starts == [0, 12, 14] and text[starts[2]:] == "third page text"
+    
+    provenance = ProvenanceIndex(starts)
+    provenance.add_section("Overview", 0)
+    provenance.add_section("Summary", 0)
+    provenance.add_section("Results", starts[2])
+    assert [provenance.page_at(offset) for offset in (0, 9, 11, 12, 14, len(text))] == [1, 1, 1, 2, 3, 3]
+    assert provenance.section_titles == ["Summary", "Results"]
+    assert provenance.locate(5, 20) == {"page_start": 1, "page_end": 3, "section": "Summary"}
+    
+    restored = ProvenanceIndex.from_result({"provenance": provenance.to_dict()})
+    assert restored.locate(15, 16) == {"page_start": 3, "page_end": 3, "section": "Results"}
+    assert ProvenanceIndex.from_result({}).locate(0, 10) == {}
+    print("\n✓ Provenance index maps offsets to pages and sections")
+
+
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         file_path = sys.argv[1]
@@ -67,3 +121,5 @@ if __name__ == "__main__":
             print("\n--- END OF EXTRACTED TEXT ---")
     else:
         test_document_processor()
+        test_parse_cache()
+        test_provenance_index()
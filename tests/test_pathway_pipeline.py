@@ -1,10 +1,43 @@
+import asyncio
+import gc
+from concurrent.futures import ThreadPoolExecutor
+import importlib.util
+import re
 import sys
+import tempfile
+import threading
 from pathlib import Path
 import time
+from types import SimpleNamespace
+import zlib
+
+import numpy as np
+import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from backend.indexing.embedding_batcher import EmbeddingBatcher
+from backend.indexing.embedding_cache import EmbeddingCache
+from backend.indexing.embedding_pool import EmbeddingPool
+from backend.indexing.embeddings import EmbeddingGenerator, TextChunker, TokenTextChunker
+from backend.indexing.hybrid_search import HybridSearchEngine
 from backend.indexing.pathway_pipeline import PathwayDocumentPipeline
+from backend.indexing.sharded_search import ShardedSearchEngine
+from backend.ingestion.provenance import ProvenanceIndex, join_with_offsets
+
+
+PARITY_CORPUS = [
+    "Quarterly revenue grew twelve percent on strong product sales.",
+    "Operating expenses increased due to higher salaries and rent.",
+    "Net profit margin improved as cost of goods sold declined.",
+    "Sales tax liabilities were settled with the state authority in March.",
+    "Cash flow from operations funded the dividend payment.",
+    "Accounts receivable ageing shows most invoices paid within thirty days.",
+    "VAT",
+    "What was EBITDA in Q3 compared with the same quarter last year?",
+    "The board approved a share buyback of up to five million dollars, subject to market conditions and liquidity. " * 12,
+    "Depreciation on plant and equipment is recognised on a straight-line basis over the useful life of each asset.",
+]
 
 
 def test_pipeline():
@@ -92,5 +125,585 @@ def test_pipeline():
     print("\n✓ Pipeline ready for production use!")
 
 
+def test_remove_and_reindex_document():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / "documents"
+        docs_path.mkdir()
+        report = docs_path / "report.txt"
+        memo = docs_path / "memo.txt"
+        report.write_text("Quarterly revenue grew on strong product sales. " * 20)
+        memo.write_text("Office rent and salaries increased this year. " * 20)
+        
+        pipeline = PathwayDocumentPipeline(
+            documents_path=str(docs_path),
+            index_path=str(Path(tmp) / "index"),
+            chunk_size=40,
+            chunk_overlap=5
+        )
+        pipeline.index_all_documents()
+        report_id = pipeline._path_index[str(report.resolve())]
+        
+        report.write_text("Dividend payments were approved by the board. " * 20)
+        result = pipeline.reindex_document(str(report))
+        assert result["success"] and result["replaced"] and result["doc_id"] == report_id
+        assert len(pipeline.indexed_documents) == 2
+        
+        results = pipeline.search("dividend board", top_k=20)
+        assert results and all("revenue" not in r["text"] for r in results)
+        
+        result = pipeline.remove_document(str(memo))
+        assert result["success"] and result["chunks_removed"] > 0
+        pipeline.wait_for_compaction()
+        assert pipeline.search_engine.tombstone_ratio() == 0.0
+        assert all(r["file_name"] == "report.txt" for r in pipeline.search("rent salaries", top_k=20))
+        assert not pipeline.remove_document(str(memo))["success"]
+        
+        print(f"\n✓ Removed and re-indexed documents ({pipeline.search_engine.get_document_count()} live chunks)")
+
+
+def test_backfill_builds_ann_without_compaction():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / "documents"
+        docs_path.mkdir()
+        for i, topic in enumerate(["revenue growth", "sales tax filing", "office rent"]):
+            (docs_path / f"doc_{i}.txt").write_text(f"Notes about {topic} for the quarter. " * 30)
+        
+        pipeline = PathwayDocumentPipeline(
+            documents_path=str(docs_path),
+            index_path=str(Path(tmp) / "index"),
+            chunk_size=40,
+            chunk_overlap=5,
+            vector_index="ivf"
+        )
+        compactions = []
+        begin_compaction = pipeline.search_engine.begin_compaction
+        pipeline.search_engine.begin_compaction = lambda: compactions.append(1) or begin_compaction()
+        
+        pipeline.index_all_documents()
+        pipeline.wait_for_compaction()
+        assert not compactions
+        assert pipeline.search_engine.ann_index is not None
+        assert pipeline.search("sales tax", top_k=3)
+        
+        pipeline.index_all_documents()
+        pipeline.wait_for_compaction()
+        assert compactions
+        assert pipeline.search_engine.tombstone_ratio() == 0.0
+        print(f"\n✓ Backfill built the IVF index and compacted only after replacements")
+
+
+def test_compaction_does_not_block_search():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / "documents"
+        docs_path.mkdir()
+        for i, topic in enumerate(["revenue growth", "sales tax filing", "office rent", "dividend policy"]):
+            (docs_path / f"doc_{i}.txt").write_text(f"Notes about {topic} for the quarter. " * 30)
+        
+        pipeline = PathwayDocumentPipeline(
+            documents_path=str(docs_path),
+            index_path=str(Path(tmp) / "index"),
+            chunk_size=40,
+            chunk_overlap=5
+        )
+        pipeline.index_all_documents()
+        
+        started, release = threading.Event(), threading.Event()
+        compacted = HybridSearchEngine.compacted
+        
+        def blocked_rebuild(engine):
+            started.set()
+            release.wait(30)
+            return compacted(engine)
+        
+        HybridSearchEngine.compacted = blocked_rebuild
+        try:
+            pipeline.remove_document(str(docs_path / "doc_0.txt"))
+            assert started.wait(30)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                assert executor.submit(pipeline.search, "sales tax", 5).result(timeout=30)
+                assert executor.submit(pipeline.remove_document, str(docs_path / "doc_1.txt")).result(timeout=30)["success"]
+            release.set()
+            pipeline.wait_for_compaction()
+        finally:
+            release.set()
+            HybridSearchEngine.compacted = compacted
+        
+        results = pipeline.search("notes quarter", top_k=20)
+        assert results and {r["file_name"] for r in results} == {"doc_2.txt", "doc_3.txt"}
+        assert pipeline.search_engine.get_document_count() == sum(
+            doc["chunk_count"] for doc in pipeline.indexed_documents.values()
+        )
+        print(f"\n✓ Searches ran while the index was rebuilt ({pipeline.search_engine.tombstone_ratio():.0%} tombstones left)")
+
+
+def test_binary_index_persistence():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / "documents"
+        docs_path.mkdir()
+        for i, topic in enumerate(["revenue growth", "sales tax filing", "office rent"]):
+            (docs_path / f"doc_{i}.txt").write_text(f"Notes about {topic} for the quarter. " * 30)
+        
+        options = {"documents_path": str(docs_path), "index_path": str(Path(tmp) / "index"), "chunk_size": 40, "chunk_overlap": 5}
+        pipeline = PathwayDocumentPipeline(**options)
+        pipeline.index_all_documents()
+        pipeline.save_index()
+        expected = pipeline.search("sales tax", top_k=5)
+        
+        restored = PathwayDocumentPipeline(**options)
+        restored.embed_chunks = None
+        start_time = time.time()
+        assert restored.load_index()
+        print(f"\n✓ Loaded binary index in {(time.time() - start_time) * 1000:.1f}ms without re-embedding")
+        
+        assert restored.get_stats()["total_chunks"] == pipeline.get_stats()["total_chunks"]
+        assert restored.search("sales tax", top_k=5) == expected
+
+
+def test_segmented_index_survives_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / "documents"
+        docs_path.mkdir()
+        for i, topic in enumerate(["revenue growth", "sales tax filing", "office rent"]):
+            (docs_path / f"doc_{i}.txt").write_text(f"Notes about {topic} for the quarter. " * 30)
+        
+        options = {
+            "documents_path": str(docs_path),
+            "index_path": str(Path(tmp) / "index"),
+            "chunk_size": 40,
+            "chunk_overlap": 5,
+            "index_segments": True,
+            "compaction_threshold": 1.0
+        }
+        pipeline = PathwayDocumentPipeline(**options)
+        pipeline.index_all_documents()
+        pipeline.remove_document(str(docs_path / "doc_2.txt"))
+        expected = pipeline.search("sales tax", top_k=5)
+        pipeline.search_engine.close()
+        
+        restarted = PathwayDocumentPipeline(**options)
+        assert set(restarted.indexed_documents) == set(pipeline.indexed_documents)
+        assert restarted.search("sales tax", top_k=5) == expected
+        
+        result = restarted.index_document(str(docs_path / "doc_1.txt"))
+        assert result["replaced"]
+        print(f"\n✓ Segmented index recovered {restarted.get_stats()['total_chunks']} chunks after restart")
+
+
+def test_sharded_search_does_not_hold_pipeline_lock():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / "documents"
+        docs_path.mkdir()
+        for i, topic in enumerate(["revenue growth", "sales tax filing", "office rent"]):
+            (docs_path / f"doc_{i}.txt").write_text(f"Notes about {topic} for the quarter. " * 30)
+        
+        options = {"documents_path": str(docs_path), "chunk_size": 40, "chunk_overlap": 5}
+        single = PathwayDocumentPipeline(index_path=str(Path(tmp) / "single"), **options)
+        single.index_all_documents()
+        pipeline = PathwayDocumentPipeline(index_path=str(Path(tmp) / "index"), search_shards=2, **options)
+        pipeline.index_all_documents()
+        
+        def lock_is_free():
+            if not pipeline._lock.acquire(timeout=5):
+                return False
+            pipeline._lock.release()
+            return True
+        
+        free = []
+        scatter_gather = ShardedSearchEngine._scatter_gather
+        
+        def checked_scatter_gather(engine, *args, **kwargs):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                free.append(executor.submit(lock_is_free).result())
+            return scatter_gather(engine, *args, **kwargs)
+        
+        ShardedSearchEngine._scatter_gather = checked_scatter_gather
+        try:
+            results = pipeline.search("sales tax", top_k=5)
+            pipeline.search_batch(["office rent", "revenue"], top_k=3)
+        finally:
+            ShardedSearchEngine._scatter_gather = scatter_gather
+        assert free == [True, True]
+        
+        expected = single.search("sales tax", top_k=5)
+        assert [r["chunk_index"] for r in results] == [r["chunk_index"] for r in expected]
+        assert np.allclose([r["score"] for r in results], [r["score"] for r in expected])
+        
+        pipeline.save_index()
+        pipeline.search_engine.close()
+        restored = PathwayDocumentPipeline(index_path=str(Path(tmp) / "index"), search_shards=2, **options)
+        assert restored.load_index()
+        assert restored.search("sales tax", top_k=5) == results
+        restored.search_engine.close()
+        print("\n✓ Sharded queries fanned out without holding the pipeline lock")
+
+
+DISCLAIMER = (
+    "This report is provided for information only and does not constitute investment advice or an offer to buy "
+    "securities and past performance is not a reliable indicator of future results"
+)
+
+
+def test_segment_merge_does_not_block_search():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / "documents"
+        docs_path.mkdir()
+        for i, topic in enumerate(["revenue growth", "sales tax filing", "office rent"]):
+            (docs_path / f"doc_{i}.txt").write_text(f"Notes about {topic} for the quarter. " * 30)
+        
+        pipeline = PathwayDocumentPipeline(
+            documents_path=str(docs_path),
+            index_path=str(Path(tmp) / "index"),
+            chunk_size=40,
+            chunk_overlap=5,
+            index_segments=True
+        )
+        pipeline.index_all_documents()
+        pipeline.search_engine.flush()
+        
+        started, release = threading.Event(), threading.Event()
+        save = HybridSearchEngine.save
+        
+        def blocked_save(engine, directory):
+            started.set()
+            release.wait(30)
+            save(engine, directory)
+        
+        HybridSearchEngine.save = blocked_save
+        try:
+            pipeline.remove_document(str(docs_path / "doc_0.txt"))
+            assert started.wait(30)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                assert executor.submit(pipeline.search, "sales tax", 5).result(timeout=30)
+            release.set()
+            pipeline.wait_for_compaction()
+        finally:
+            release.set()
+            HybridSearchEngine.save = save
+        
+        assert pipeline.search_engine.tombstone_ratio() == 0.0
+        assert {r["file_name"] for r in pipeline.search("notes quarter", top_k=20)} == {"doc_1.txt", "doc_2.txt"}
+        pipeline.search_engine.close()
+        print("\n✓ Segment merges ran without holding the pipeline lock")
+
+
+def test_near_duplicate_chunks():
+    rng = np.random.default_rng(7)
+    vocabulary = [f"term{i}" for i in range(2000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / "documents"
+        docs_path.mkdir()
+        for i in range(3):
+            disclaimer = DISCLAIMER.replace("reliable", "dependable") if i == 2 else DISCLAIMER
+            body = " ".join(rng.choice(vocabulary, size=60, replace=False))
+            (docs_path / f"report_{i}.txt").write_text(f"{body} {disclaimer}")
+        
+        options = {"documents_path": str(docs_path), "index_path": str(Path(tmp) / "index"), "chunk_size": 30, "chunk_overlap": 0}
+        pipeline = PathwayDocumentPipeline(dedup_threshold=0.7, **options)
+        embedded = []
+        embed_chunks = pipeline.embed_chunks
+        pipeline.embed_chunks = lambda chunks: embedded.extend(chunks) or embed_chunks(chunks)
+        pipeline.index_all_documents()
+        
+        assert len(embedded) == pipeline.get_stats()["total_chunks"] == 7
+        stats = pipeline.get_stats()["near_duplicates"]
+        assert (stats["representatives"], stats["duplicates"]) == (7, 2)
+        
+        top = pipeline.search("investment advice past performance", top_k=1)[0]
+        sources = {top["file_name"]} | {ref["metadata"]["file_name"] for ref in top["duplicates"]}
+        assert sources == {"report_0.txt", "report_1.txt", "report_2.txt"}
+        assert all(ref["chunk_index"] == 2 and ref["start_char"] > 0 for ref in top["duplicates"])
+        for doc in pipeline.indexed_documents.values():
+            for filters in ({"file_name": doc["file_name"]}, {"doc_id": doc["doc_id"], "chunk_index": 2}):
+                hit = pipeline.search("investment advice past performance", top_k=1, filters=filters)[0]
+                assert hit["text"] == top["text"]
+                assert doc["file_name"] in {hit["file_name"]} | {ref["metadata"]["file_name"] for ref in hit["duplicates"]}
+            missed = pipeline.search("investment advice past performance", top_k=5, filters={"doc_id": doc["doc_id"], "chunk_index": 0})
+            assert all(hit["text"] != top["text"] for hit in missed)
+        
+        pipeline.remove_document(str(docs_path / top["file_name"]))
+        promoted = pipeline.search("investment advice past performance", top_k=1)[0]
+        assert promoted["file_name"] != top["file_name"] and len(promoted["duplicates"]) == 1
+        assert pipeline.get_stats()["total_chunks"] == 5
+        
+        pipeline.save_index()
+        restored = PathwayDocumentPipeline(dedup_threshold=0.7, **options)
+        assert restored.load_index()
+        assert restored.search("investment advice past performance", top_k=1) == [promoted]
+        print(f"\n✓ Collapsed {stats['duplicates']} near-duplicate chunks into their representative")
+
+
+def test_embedding_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(Path(tmp) / "cache.sqlite", "test-model", max_bytes=80)
+        cache.put_many([f"text {i}" for i in range(5)], [[i, 0, 0, 0] for i in range(5)])
+        assert cache.get_many(["text 0", "missing"])[1] is None
+        cache.put_many(["text 5", "text 6"], [[5, 0, 0, 0], [6, 0, 0, 0]])
+        assert [vector is not None for vector in cache.get_many([f"text {i}" for i in range(7)])] == [
+            True, False, False, False, True, True, True
+        ]
+        assert cache.key("text 0") != EmbeddingCache(Path(tmp) / "other.sqlite", "other-model").key("text 0")
+        
+        writes = cache._connection.total_changes
+        cache.get_many(["text 5", "text 6"])
+        assert cache._connection.total_changes == writes
+        cache.close()
+        cache.close()
+        reopened = EmbeddingCache(Path(tmp) / "cache.sqlite", "test-model", max_bytes=80, recency_interval=0)
+        assert reopened._clock == cache._clock
+        writes = reopened._connection.total_changes
+        reopened.get_many(["text 0"])
+        assert reopened._connection.total_changes > writes
+        
+        reopened.get_many(["text 6"])
+        reopened.recency_interval = 3600
+        reopened.get_many(["text 5"])
+        clock = reopened._clock
+        del reopened
+        gc.collect()
+        dropped = EmbeddingCache(Path(tmp) / "cache.sqlite", "test-model", max_bytes=80)
+        assert dropped._clock == clock
+        dropped.close()
+        
+        docs_path = Path(tmp) / "documents"
+        docs_path.mkdir()
+        (docs_path / "january.txt").write_text("Monthly revenue report with sales tax totals. " * 40)
+        (docs_path / "february.txt").write_text("Monthly revenue report with sales tax totals. " * 40)
+        
+        pipeline = PathwayDocumentPipeline(
+            documents_path=str(docs_path), index_path=str(Path(tmp) / "index"), chunk_size=35, chunk_overlap=0
+        )
+        embedded = []
+        generate_batch = pipeline.embedder.generate_batch
+        pipeline.embedder.generate_batch = lambda texts: embedded.extend(texts) or generate_batch(texts)
+        
+        pipeline.index_all_documents()
+        pipeline.reindex_document(str(docs_path / "january.txt"))
+        pipeline.wait_for_compaction()
+        stats = pipeline.get_stats()["embedding_cache"]
+        assert embedded == [pipeline.get_document_chunks(0)[0]["text"]]
+        assert (stats["hits"], stats["misses"]) == (16, 8)
+        pipeline.close()
+        assert not pipeline.embedding_cache._finalizer.alive
+        print(f"\n✓ Embedding cache hit rate {stats['hit_rate']:.0%} ({len(embedded)} chunks sent to the model)")
+
+
+def test_length_bucketed_embeddings():
+    embedder = EmbeddingGenerator(batch_size=4, max_batch_tokens=60)
+    texts = [" ".join(["revenue"] * (i * 7 % 23 + 1)) for i in range(11)]
+    
+    blocks = list(embedder.embed_iter(texts))
+    lengths = [embedder.estimate_tokens(texts[i]) for positions, _ in blocks for i in positions]
+    assert lengths == sorted(lengths, reverse=True)
+    for positions, block in blocks:
+        assert len(positions) <= 4
+        assert len(positions) == 1 or len(positions) * embedder.estimate_tokens(texts[positions[0]]) <= 60
+        assert block.dtype == np.float32 and block.flags["C_CONTIGUOUS"]
+    
+    embeddings = embedder.generate_batch(texts)
+    assert embeddings.shape == (len(texts), embedder.get_dimension())
+    assert np.allclose(embeddings, embedder.model.encode(texts, convert_to_numpy=True), atol=1e-6)
+    assert embedder.generate_batch([]).shape == (0, embedder.get_dimension())
+    print(f"\n✓ Embedded {len(texts)} texts in {len(blocks)} length-sorted batches")
+
+
+class WordTokenizer:
+    
+    def encode(self, text: str, add_special_tokens: bool = True):
+        matches = list(re.finditer(r"\w+|[^\w\s]", text))
+        ids = [zlib.crc32(match.group().lower().encode()) % 30000 + 1000 for match in matches]
+        offsets = [match.span() for match in matches]
+        if add_special_tokens:
+            ids, offsets = [101] + ids + [102], [(0, 0)] + offsets + [(0, 0)]
+        return SimpleNamespace(ids=ids, offsets=offsets, word_ids=[len(text[:end].split()) - 1 for _, end in offsets])
+
+
+def test_streaming_chunker():
+    text = "\n".join(f"Line {i}:  revenue\tgrew {i}% in  Q{i % 4 + 1}." for i in range(400))
+    words = text.split()
+    chunker = TextChunker(chunk_size=50, overlap=10)
+    
+    chunks = list(chunker.iter_chunks(text, {"file_name": "report.txt"}))
+    expected = [words[i:i + 50] for i in range(0, len(words), 40)]
+    assert [chunk["text"].split() for chunk in chunks] == expected
+    assert all(text[chunk["start_char"]:chunk["end_char"]] == chunk["text"] for chunk in chunks)
+    assert all(chunk["word_count"] == len(chunk["text"].split()) for chunk in chunks)
+    assert [chunk["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+    assert chunker.chunk_text(text, {"file_name": "report.txt"}) == chunks
+    
+    stream = chunker.iter_chunks(text)
+    first = next(stream)
+    assert first["start_char"] == 0 and first["end_char"] < len(text) // 10
+    assert chunker.chunk_text("  \n ") == [] and chunker.chunk_text("") == []
+    print(f"\n✓ Streamed {len(chunks)} chunks with character offsets")
+
+
+def test_page_provenance():
+    pages = [f"Page {page} covers {topic}. " * 30 for page, topic in enumerate(["revenue", "salaries", "dividends", "rent"], start=1)]
+    text, page_starts = join_with_offsets(pages, "\n\n")
+    provenance = ProvenanceIndex(page_starts)
+    provenance.add_section("Income", page_starts[0])
+    provenance.add_section("Distributions", page_starts[2])
+    parsed = {
+        "file_name": "report.pdf",
+        "file_type": "pdf",
+        "total_pages": len(pages),
+        "full_text": text,
+        "pages": [{"page_number": i + 1, "text": page, "char_count": len(page)} for i, page in enumerate(pages)],
+        "provenance": provenance.to_dict()
+    }
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / "documents"
+        docs_path.mkdir()
+        (docs_path / "report.pdf").write_bytes(b"%PDF")
+        
+        pipeline = PathwayDocumentPipeline(
+            documents_path=str(docs_path),
+            index_path=str(Path(tmp) / "index"),
+            chunk_size=40,
+            chunk_overlap=5
+        )
+        pipeline.processor.pdf_parser.parse = lambda file_path: dict(parsed)
+        assert pipeline.index_all_documents()["successful"] == 1
+        
+        chunks = pipeline.get_document_chunks(0)
+        for chunk in chunks:
+            first = text.count("\n\n", 0, chunk["start_char"]) + 1
+            last = text.count("\n\n", 0, chunk["end_char"]) + 1
+            assert (chunk["page_start"], chunk["page_end"]) == (first, last)
+            assert chunk["section"] == ("Income" if first <= 2 else "Distributions")
+        assert any(chunk["page_start"] < chunk["page_end"] for chunk in chunks)
+        
+        results = pipeline.search("dividends", top_k=3)
+        assert results and all(3 in (r["page_start"], r["page_end"]) for r in results)
+        print(f"\n✓ {len(chunks)} chunks located across {len(pages)} pages")
+
+
+def test_token_chunking():
+    embedder = EmbeddingGenerator()
+    embedder._tokenizer = WordTokenizer()
+    text = "Revenue rose 12%, while operating costs fell. " * 60
+    token_count = len(WordTokenizer().encode(text, add_special_tokens=False).ids)
+    
+    chunks = TokenTextChunker(embedder, chunk_size=40, overlap=8).chunk_text(text, {"file_name": "report.txt"})
+    assert all(chunk["token_count"] <= 40 for chunk in chunks)
+    assert chunks[0]["start_token"] == 0 and chunks[-1]["end_token"] == token_count
+    assert all(before["start_token"] < after["start_token"] <= before["end_token"] - 8 for before, after in zip(chunks, chunks[1:]))
+    assert all(set(chunk["text"].split()) <= set(text.split()) for chunk in chunks)
+    assert all(WordTokenizer().encode(chunk["text"], add_special_tokens=False).ids == chunk["token_ids"] for chunk in chunks)
+    assert all(text[chunk["start_char"]:chunk["end_char"]] == chunk["text"] for chunk in chunks)
+    assert TokenTextChunker(embedder).max_tokens == embedder.model.max_seq_length - 2
+    
+    if importlib.util.find_spec("transformers") is None:
+        print(f"\n✓ Token chunker split {token_count} tokens into {len(chunks)} chunks (transformers not installed, skipping model check)")
+        return
+    
+    embedder = EmbeddingGenerator()
+    chunks = TokenTextChunker(embedder, overlap=16).chunk_text(text * 4)
+    assert max(chunk["token_count"] for chunk in chunks) == embedder.max_chunk_tokens
+    reused = embedder.embed_token_ids([chunk["token_ids"] for chunk in chunks])
+    direct = embedder.generate_batch([chunk["text"] for chunk in chunks])
+    assert np.allclose(reused, direct, atol=1e-4)
+    print(f"\n✓ Token chunks of up to {embedder.max_chunk_tokens} tokens embedded from reused token ids")
+
+
+def test_query_embedding_batcher():
+    embedder = EmbeddingGenerator()
+    batch_sizes = []
+    generate_batch = embedder.generate_batch
+    embedder.generate_batch = lambda texts: batch_sizes.append(len(texts)) or generate_batch(texts)
+    
+    batcher = EmbeddingBatcher(embedder, max_batch_size=8, max_wait_ms=500)
+    batcher.embed("warm up")
+    start = time.perf_counter()
+    batcher.embed("single caller")
+    assert time.perf_counter() - start < 0.25
+    
+    queries = [f"quarterly revenue {i % 12}" for i in range(24)]
+    with ThreadPoolExecutor(max_workers=24) as pool:
+        embeddings = list(pool.map(batcher.embed, queries))
+    assert np.array_equal(np.array(embeddings), generate_batch(queries))
+    assert len(batch_sizes) < len(queries) and max(batch_sizes) <= 8
+    
+    async def embed_concurrently():
+        return await asyncio.gather(*(batcher.embed_async(query) for query in queries[:6]))
+    
+    assert np.array_equal(np.array(asyncio.run(embed_concurrently())), np.array(embeddings[:6]))
+    stats = batcher.get_stats()
+    batcher.close()
+    print(f"\n✓ Batched {stats['requests']} query embeddings into {stats['batches']} model calls")
+
+
+def test_embedding_worker_pool():
+    embedder = EmbeddingGenerator()
+    documents = [[f"invoice {doc} line {i} revenue" for i in range(size)] for doc, size in enumerate([7, 0, 3, 12, 1])]
+    
+    with EmbeddingPool(embedder.model_name, workers=2, batch_size=2, max_pending=3) as pool:
+        assert pool.dimension == embedder.get_dimension()
+        results = list(pool.map(enumerate(documents)))
+        assert [tag for tag, _ in results] == list(range(len(documents)))
+        for (_, embeddings), texts in zip(results, documents):
+            assert embeddings.shape == (len(texts), pool.dimension)
+            if texts:
+                assert np.allclose(embeddings, embedder.generate_batch(texts), atol=1e-6)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / "documents"
+        docs_path.mkdir()
+        for i, topic in enumerate(["revenue growth", "sales tax", "dividend payout", "rent expense"]):
+            (docs_path / f"report_{i}.txt").write_text(f"Quarterly {topic} summary for the board. " * (20 + 15 * i))
+        
+        indexes = {}
+        for workers in (0, 2):
+            pipeline = PathwayDocumentPipeline(
+                documents_path=str(docs_path), index_path=str(Path(tmp) / f"index_{workers}"),
+                chunk_size=30, chunk_overlap=5, embedding_workers=workers
+            )
+            result = pipeline.index_all_documents()
+            assert result["successful"] == 4
+            indexes[workers] = {
+                doc["file_name"]: [chunk["text"] for chunk in pipeline.get_document_chunks(doc["doc_id"])]
+                for doc in pipeline.indexed_documents.values()
+            }
+            assert [r["file_name"] for r in pipeline.search("sales tax summary", top_k=3)][0] == "report_1.txt"
+            pipeline.wait_for_compaction()
+        
+        assert indexes[0] == indexes[2]
+    print(f"\n✓ Worker pool embedded {sum(map(len, documents))} texts with ordered reassembly")
+
+
+def test_onnx_backend_parity():
+    for name in ("onnxruntime", "tokenizers", "optimum"):
+        pytest.importorskip(name, reason="install requirements-onnx.txt for the ONNX backend")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        reference = EmbeddingGenerator().generate_batch(PARITY_CORPUS)
+        onnx_embedder = EmbeddingGenerator(backend="onnx", onnx_dir=tmp)
+        quantized = onnx_embedder.generate_batch(PARITY_CORPUS)
+        assert onnx_embedder.fingerprint != EmbeddingGenerator().fingerprint
+        
+        cosine = (reference * quantized).sum(axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(quantized, axis=1)
+        )
+        assert cosine.min() >= 0.99, cosine
+        print(f"\n✓ ONNX int8 embeddings match torch (min cosine {cosine.min():.4f})")
+
+
 if __name__ == "__main__":
     test_pipeline()
+    test_remove_and_reindex_document()
+    test_backfill_builds_ann_without_compaction()
+    test_compaction_does_not_block_search()
+    test_binary_index_persistence()
+    test_segmented_index_survives_restart()
+    test_segment_merge_does_not_block_search()
+    test_sharded_search_does_not_hold_pipeline_lock()
+    test_embedding_cache()
+    test_query_embedding_batcher()
+    test_length_bucketed_embeddings()
+    test_embedding_worker_pool()
+    test_token_chunking()
+    test_streaming_chunker()
+    test_page_provenance()
+    test_near_duplicate_chunks()
+    test_onnx_backend_parity()
@@ -1,9 +1,16 @@
+import json
+import subprocess
 import sys
+import tempfile
 from pathlib import Path
+import time
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from backend.indexing.lru_cache import LRUCache
 from backend.indexing.rag_engine import RAGEngine
+from backend.synonyms.manager import SynonymManager
+from backend.synonyms.query_expander import QueryExpander
 
 
 def test_rag_engine():
@@ -127,5 +134,66 @@ def test_rag_engine():
     print("\n✓ RAG Engine ready for LLM integration!")
 
 
+def test_query_caches():
+    cache = LRUCache(max_entries=2, ttl_seconds=0.05)
+    for key in "abc":
+        cache.put(key, key.upper())
+    assert cache.get("a") is None and cache.get("c") == "C"
+    time.sleep(0.06)
+    assert cache.get("c") is None
+    assert (cache.evictions, cache.expirations) == (1, 1)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_path = Path(tmp) / "documents"
+        docs_path.mkdir()
+        (docs_path / "tax.txt").write_text("The company paid its quarterly sales tax and reported strong turnover. " * 10)
+        
+        engine = RAGEngine(documents_path=str(docs_path), index_path=str(Path(tmp) / "index"))
+        engine.synonym_manager = SynonymManager(str(Path(tmp) / "synonyms.json"))
+        engine.synonym_manager.add_term("sales_tax", ["VAT", "Sales Tax"])
+        engine.query_expander = QueryExpander(engine.synonym_manager)
+        engine.initialize()
+        
+        first = engine.query("How much VAT did we pay?")
+        second = engine.query("How much  VAT did we pay?")
+        assert first["results"] == second["results"]
+        stats = engine.get_stats()
+        assert (stats["pipeline"]["query_cache"]["hits"], stats["pipeline"]["query_cache"]["misses"]) == (1, 1)
+        assert (stats["expansion_cache"]["hits"], stats["expansion_cache"]["misses"]) == (0, 2)
+        
+        engine.query("How much VAT did we pay?")
+        assert engine.get_stats()["expansion_cache"]["hits"] == 1
+        
+        engine.synonym_manager.update_term("sales_tax", ["GST", "VAT"])
+        refreshed = engine.query("How much VAT did we pay?")
+        assert "GST" in refreshed["expanded_query"]
+        assert engine.get_stats()["expansion_cache"]["misses"] == 3
+        engine.pipeline.wait_for_compaction()
+    print("\n✓ Query embedding and expansion caches hit on repeats and reset on synonym changes")
+
+
+def test_lazy_startup():
+    script = """
+import json, sys, tempfile
+from backend.indexing.rag_engine import RAGEngine
+directory = tempfile.mkdtemp()
+engine = RAGEngine(documents_path=directory, index_path=directory)
+heavy = [name for name in ("sentence_transformers", "torch", "sklearn", "pathway", "fitz") if name in sys.modules]
+loaded = engine.pipeline.embedder.is_loaded
+report = engine.warmup()
+print(json.dumps({"heavy": heavy, "loaded": loaded, "warmed": engine.pipeline.embedder.is_loaded, "report": report}))
+"""
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=str(Path(__file__).parent.parent),
+        capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    startup = json.loads(output)
+    assert startup["heavy"] == [] and not startup["loaded"] and startup["warmed"]
+    assert set(startup["report"]["warmup"]) == {"embedding_model", "keyword_tokenizer", "ocr"}
+    print(f"\n✓ RAGEngine constructed in {startup['report']['init_total'] * 1000:.1f}ms without loading models")
+
+
 if __name__ == "__main__":
     test_rag_engine()
+    test_query_caches()
+    test_lazy_startup()